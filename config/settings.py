@@ -10,7 +10,9 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
+from urllib.parse import urlsplit
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -45,6 +47,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'members.profiling.ProfilingMiddleware',  # attivo solo con SGS_PROFILING=1
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -88,6 +91,98 @@ DATABASES = {
     }
 }
 
+# Archivio dei soci dimessi e dei documenti scaduti (members/archive.py):
+# con SGS_ARCHIVE_DB le righe archiviate vanno in un database SQLite a
+# parte (members/routers.py, da creare con `manage.py migrate --database
+# archive`); i tarball dei file (uno per anno) in SGS_ARCHIVE_ROOT. Si
+# archiviano i soci dimessi e i documenti scaduti (e sostituiti) da piu'
+# di SGS_ARCHIVE_YEARS anni.
+if os.environ.get('SGS_ARCHIVE_DB'):
+    DATABASES['archive'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ['SGS_ARCHIVE_DB'],
+    }
+DATABASE_ROUTERS = ['members.routers.ArchiveRouter']
+SGS_ARCHIVE_ROOT = os.environ.get('SGS_ARCHIVE_ROOT', BASE_DIR / 'archive')
+SGS_ARCHIVE_YEARS = int(os.environ.get('SGS_ARCHIVE_YEARS', 5))
+
+
+# Cache
+# Scelta da variabile d'ambiente SGS_CACHE_URL:
+#   (non impostata) / locmem://   memoria del processo (sviluppo, test)
+#   file:///var/cache/sgs         file su disco, condivisa tra i worker
+#   redis://127.0.0.1:6379/1      Redis o compatibile (Valkey, KeyDB...) in locale
+#   dummy://                      nessuna cache
+# Con piu' processi (gunicorn) serve file:// o redis://: con locmem
+# l'invalidazione arriverebbe solo al processo che ha salvato.
+
+def _cache_from_url(url):
+    scheme = urlsplit(url).scheme
+    if scheme == 'file':
+        return {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': urlsplit(url).path,
+        }
+    if scheme in ('redis', 'rediss', 'unix'):
+        return {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': url}
+    if scheme == 'dummy':
+        return {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+    return {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'sgs'}
+
+
+CACHES = {
+    'default': {
+        **_cache_from_url(os.environ.get('SGS_CACHE_URL', 'locmem://')),
+        'KEY_PREFIX': os.environ.get('SGS_CACHE_PREFIX', 'sgs'),
+    },
+}
+
+
+# Email (promemoria inviati dal worker, vedi members/notifications.py)
+# In locale i messaggi finiscono in console; con SGS_EMAIL_BACKEND=file
+# vengono scritti in SGS_EMAIL_FILE_PATH; con smtp si usano EMAIL_HOST ecc.
+_EMAIL_BACKENDS = {
+    'console': 'django.core.mail.backends.console.EmailBackend',
+    'file': 'django.core.mail.backends.filebased.EmailBackend',
+    'smtp': 'django.core.mail.backends.smtp.EmailBackend',
+    'dummy': 'django.core.mail.backends.dummy.EmailBackend',
+}
+EMAIL_BACKEND = _EMAIL_BACKENDS[os.environ.get('SGS_EMAIL_BACKEND', 'console')]
+EMAIL_FILE_PATH = os.environ.get('SGS_EMAIL_FILE_PATH', BASE_DIR / 'sent_emails')
+EMAIL_HOST = os.environ.get('SGS_EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.environ.get('SGS_EMAIL_PORT', 25))
+EMAIL_HOST_USER = os.environ.get('SGS_EMAIL_USER', '')
+EMAIL_HOST_PASSWORD = os.environ.get('SGS_EMAIL_PASSWORD', '')
+EMAIL_USE_TLS = os.environ.get('SGS_EMAIL_TLS', '') == '1'
+DEFAULT_FROM_EMAIL = os.environ.get('SGS_EMAIL_FROM', 'segreteria@localhost')
+
+# Promemoria: abbonamenti e certificati in scadenza entro N giorni,
+# rate scadute da non piu' di N giorni
+SGS_REMINDER_DAYS = int(os.environ.get('SGS_REMINDER_DAYS', 15))
+SGS_OVERDUE_DAYS = int(os.environ.get('SGS_OVERDUE_DAYS', 60))
+
+# Coda di lavori (members/jobs.py): i lavori completati o falliti si
+# eliminano dopo N giorni (mai prima delle finestre dei promemoria)
+SGS_JOB_RETENTION_DAYS = int(os.environ.get('SGS_JOB_RETENTION_DAYS', 90))
+
+
+# Profilazione delle richieste (members/profiling.py, `manage.py perf_report`)
+SGS_PROFILING = os.environ.get('SGS_PROFILING', '') == '1'
+SGS_PROFILING_SLOW_MS = int(os.environ.get('SGS_PROFILING_SLOW_MS', 500))
+SGS_PROFILING_LOG = os.environ.get('SGS_PROFILING_LOG', BASE_DIR / 'perf.log')
+
+
+# Download di documenti e foto (members/downloads.py): con SGS_SENDFILE
+# nginx / apache / lighttpd il file lo invia il server web
+# (X-Accel-Redirect verso la location interna SGS_SENDFILE_URL, alias di
+# MEDIA_ROOT, oppure X-Sendfile). Vuoto: lo invia Django.
+SGS_SENDFILE = os.environ.get('SGS_SENDFILE', '')
+SGS_SENDFILE_URL = os.environ.get('SGS_SENDFILE_URL', '/protected/')
+
+# Compressione dei documenti all'arrivo (members/compression.py): con
+# SGS_DOCUMENT_KEEP_ORIGINALS=1 si conserva anche il file caricato.
+SGS_DOCUMENT_KEEP_ORIGINALS = os.environ.get('SGS_DOCUMENT_KEEP_ORIGINALS', '') == '1'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
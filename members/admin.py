@@ -6,7 +6,7 @@ from .models import Member, MemberDocument
 from .forms import MemberCreationForm, MemberChangeForm
 from .models import Subscription  # Assumendo che Subscription sia nel file models.py
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import Sector, SportsBody, Instructor
+from .models import Sector, SportsBody, Instructor, Job, ArchivedDocument, ArchivedMember
 
 class MemberDocumentInline(admin.TabularInline):
     """
@@ -67,18 +67,11 @@ class SubscriptionAdmin(admin.ModelAdmin):
     # Mostra lo stato con badge colorato
     def status_badge(self, obj):
         from django.utils.html import format_html
-        from django.utils import timezone
-        today = timezone.now().date()
-
-        if obj.start_date > today:
-            color = 'secondary'
-            status = 'Non ancora attivo'
-        elif obj.end_date and obj.end_date < today:
-            color = 'danger'
-            status = 'Scaduto'
-        else:
-            color = 'success'
-            status = 'Attivo'
+        status = obj.status
+        color = {
+            'Attivo': 'success',
+            'Scaduto': 'danger',
+        }.get(status, 'secondary')
 
         return format_html(
             '<span class="badge bg-{}">{}</span>',
@@ -108,4 +101,83 @@ class InstructorAdmin(admin.ModelAdmin):
     list_display = ('last_name', 'first_name', 'is_active')
     list_filter = ('is_active',)
     search_fields = ('first_name', 'last_name')
-    filter_horizontal = ('sectors',)
\ No newline at end of file
+    filter_horizontal = ('sectors',)
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    """Coda dei lavori in background (vedi members/jobs.py)."""
+    list_display = ('id', 'task', 'status', 'attempts', 'run_at', 'locked_by', 'finished_at')
+    list_filter = ('status', 'task')
+    search_fields = ('task', 'idempotency_key')
+    readonly_fields = ('created_at', 'locked_at', 'locked_by', 'finished_at', 'last_error')
+    actions = ['requeue']
+
+    @admin.action(description="Rimetti in coda")
+    def requeue(self, request, queryset):
+        from django.utils import timezone
+        queryset.exclude(status=Job.Status.RUNNING).update(
+            status=Job.Status.QUEUED, attempts=0, run_at=timezone.now(), finished_at=None,
+        )
+
+
+@admin.register(ArchivedMember)
+class ArchivedMemberAdmin(admin.ModelAdmin):
+    """Soci dimessi tolti dalle tabelle di lavoro (vedi members/archive.py)."""
+    list_display = ('last_name', 'first_name', 'card_number', 'dismissed_on', 'archived_at', 'tarball')
+    list_filter = ('dismissed_on',)
+    search_fields = ('last_name', 'first_name', 'username', 'card_number', 'fiscal_code')
+    exclude = ('data',)
+    readonly_fields = (
+        'member_id', 'username', 'first_name', 'last_name', 'card_number', 'fiscal_code',
+        'dismissed_on', 'files', 'tarball', 'archived_at',
+    )
+    actions = ['restore_selected']
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.action(description="Ripristina i soci selezionati")
+    def restore_selected(self, request, queryset):
+        from django.contrib import messages
+        from .archive import ArchiveError, restore
+
+        restored = 0
+        for archived in queryset:
+            try:
+                restore(archived)
+                restored += 1
+            except ArchiveError as e:
+                self.message_user(request, str(e), messages.ERROR)
+        self.message_user(request, f"Soci ripristinati: {restored}.")
+
+
+@admin.register(ArchivedDocument)
+class ArchivedDocumentAdmin(admin.ModelAdmin):
+    """Documenti scaduti e sostituiti, tolti dalle tabelle di lavoro (vedi members/archive.py)."""
+    list_display = ('member_name', 'document_type', 'expiration_date', 'archived_at', 'tarball')
+    list_filter = ('document_type',)
+    search_fields = ('member_name',)
+    exclude = ('data',)
+    readonly_fields = (
+        'document_id', 'member_id', 'member_name', 'document_type', 'expiration_date',
+        'files', 'tarball', 'archived_at',
+    )
+    actions = ['restore_selected']
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.action(description="Ripristina i documenti selezionati")
+    def restore_selected(self, request, queryset):
+        from django.contrib import messages
+        from .archive import ArchiveError, restore_document
+
+        restored = 0
+        for archived in queryset:
+            try:
+                restore_document(archived)
+                restored += 1
+            except ArchiveError as e:
+                self.message_user(request, str(e), messages.ERROR)
+        self.message_user(request, f"Documenti ripristinati: {restored}.")
@@ -1,6 +1,24 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def ensure_search_index(sender, using, **kwargs):
+    """Reinstalla l'indice di ricerca se una migrazione ne ha perso i trigger."""
+    from django.db import connections, router
+    from .search import install_search_index, search_index_missing
+
+    if not router.allow_migrate(using, 'members', model_name='member'):
+        return  # database dell'archivio (members/routers.py)
+    connection = connections[using]
+    if search_index_missing(connection):
+        install_search_index(connection)
 
 
 class MembersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'members'
+
+    def ready(self):
+        from . import signals  # noqa: F401  (registra i receiver)
+        from . import compression, images, notifications  # noqa: F401  (registrano le attivita' della coda)
+        post_migrate.connect(ensure_search_index, sender=self)
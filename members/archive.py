@@ -0,0 +1,358 @@
+# members/archive.py
+# Archivio dei soci dimessi da tempo e dei documenti scaduti.
+#
+# I soci dimessi restavano nelle tabelle di lavoro con documenti,
+# abbonamenti e pagamenti, e ogni lista li attraversava. `manage.py
+# archive_members` sposta quelli dimessi da piu' di SGS_ARCHIVE_YEARS anni
+# (Member.dismissed_on; per i soci importati gia' dimessi, senza data, fa
+# fede l'ultima attivita') in ArchivedMember: una riga per socio con tutte
+# le sue righe serializzate. Dei soci attivi sposta in ArchivedDocument i
+# documenti scaduti da piu' di SGS_ARCHIVE_YEARS anni e gia' sostituiti da
+# uno piu' recente dello stesso tipo (l'ultimo certificato resta sempre,
+# anche scaduto: e' quello che dice lo stato del socio).
+# I file (documenti, originali conservati, foto) finiscono in un unico
+# tarball compresso per anno (di dimissione o di scadenza):
+#   SGS_ARCHIVE_ROOT/2019.tar.gz
+# Un tar.gz non si estende sul posto: a ogni esecuzione si riscrive quello
+# dell'anno (contenuto precedente piu' i file nuovi) e lo si rinomina,
+# prima di toccare il database. Nelle tabelle di lavoro resta solo la
+# popolazione attiva; `archive_members --restore ID` (o l'azione
+# nell'admin) rimette righe e file com'erano, stesse chiavi.
+#
+# Le statistiche giornaliere non si ricalcolano: la storia dei grafici
+# resta quella di prima (rebuild_daily_stats conta solo le tabelle di
+# lavoro: sui periodi recenti usarlo con --since). I file dei documenti
+# restano nell'archivio per checksum finche' gc_documents non li trova
+# orfani: lo stesso file puo' servire ad altri soci.
+# Non si archiviano staff e istruttori, ne' i genitori di soci attivi.
+
+import logging
+import os
+import tarfile
+import tempfile
+from pathlib import Path
+
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+from django.core import serializers
+from django.core.files import File, locks
+from django.core.files.storage import default_storage
+from django.core.serializers.base import DeserializationError
+from django.db import IntegrityError, transaction
+from django.db.models import DateField, Exists, Max, OuterRef, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from . import images
+from .models import ArchivedDocument, ArchivedMember, Member, MemberDocument
+from .routers import archive_db
+from .status import refresh_member_status
+from .storage import checksum_from_name, document_storage
+
+logger = logging.getLogger('members.archive')
+
+# righe del socio archiviate con lui (related_name), in ordine di ripristino
+RELATED = ('affiliations', 'subscriptions', 'payments', 'documents')
+FILE_FIELDS = ('file', 'original_file', 'photo')
+NEVER = Value('1900-01-01', output_field=DateField())
+
+
+class ArchiveError(Exception):
+    pass
+
+
+def archive_root():
+    return Path(getattr(settings, 'SGS_ARCHIVE_ROOT', Path(settings.BASE_DIR) / 'archive'))
+
+
+# ---------------------------------------------------------------------------
+#  CHI SI ARCHIVIA
+# ---------------------------------------------------------------------------
+def candidates(years=None, today=None):
+    """Soci dimessi da piu' di `years` anni, annotati con archive_date."""
+    if years is None:
+        years = getattr(settings, 'SGS_ARCHIVE_YEARS', 5)
+    cutoff = (today or timezone.now().date()) - relativedelta(years=years)
+    last_activity = Greatest(
+        Coalesce(Max('subscriptions__end_date'), NEVER),
+        Coalesce(Max('payments__payment_date'), NEVER),
+        Coalesce('registration_date', NEVER),
+    )  # non date_joined: per i soci importati e' la data dell'importazione
+    return (Member.objects
+            .filter(is_dismissed=True, role=Member.Role.MEMBER)
+            .exclude(dependents__is_dismissed=False)
+            .annotate(archive_date=Coalesce('dismissed_on', last_activity))
+            .filter(archive_date__lt=cutoff)
+            .order_by('pk'))
+
+
+def _rows(member):
+    rows = [member]
+    for related in RELATED:
+        rows.extend(getattr(member, related).order_by('pk'))
+    return rows
+
+
+def expired_documents(years=None, today=None):
+    """
+    Documenti dei soci attivi scaduti da piu' di `years` anni e sostituiti
+    da uno piu' recente dello stesso tipo.
+    """
+    if years is None:
+        years = getattr(settings, 'SGS_ARCHIVE_YEARS', 5)
+    cutoff = (today or timezone.now().date()) - relativedelta(years=years)
+    newer = MemberDocument.objects.filter(
+        member=OuterRef('member'), document_type=OuterRef('document_type'),
+        expiration_date__gt=OuterRef('expiration_date'),
+    )
+    return (MemberDocument.objects
+            .filter(expiration_date__lt=cutoff, member__is_dismissed=False)
+            .filter(Exists(newer))
+            .select_related('member')
+            .order_by('pk'))
+
+
+def _document_files(documents):
+    files = []
+    for document in documents:
+        for field in (document.file, document.original_file):
+            if field and (document_storage, field.name) not in files:
+                files.append((document_storage, field.name))
+    return files
+
+
+def _files(member):
+    """[(storage, nome)] dei file del socio."""
+    files = _document_files(member.documents.all())
+    if member.photo:
+        files.append((default_storage, member.photo.name))
+    return files
+
+
+# ---------------------------------------------------------------------------
+#  ARCHIVIAZIONE
+# ---------------------------------------------------------------------------
+def _write_tarball(year, files):
+    """
+    Aggiunge i file (nomi come nello storage) al tarball dell'anno: lo
+    riscrive su file temporaneo col contenuto precedente piu' i file nuovi
+    e lo rinomina, sotto lock perche' due esecuzioni non si perdano i file
+    a vicenda. I file dell'archivio per checksum gia' presenti non si
+    ripetono. Restituisce (nome relativo, nomi mancanti su disco).
+    """
+    root = archive_root()
+    root.mkdir(parents=True, exist_ok=True)
+    name = f'{year}.tar.gz'
+    missing = set()
+    with open(root / f'.{year}.lock', 'wb') as lock:
+        locks.lock(lock, locks.LOCK_EX)
+        fd, tmp = tempfile.mkstemp(dir=root, prefix='.archive-')
+        try:
+            with os.fdopen(fd, 'wb') as fh, tarfile.open(fileobj=fh, mode='w:gz') as tar:
+                present = set()
+                if (root / name).exists():
+                    with tarfile.open(root / name, 'r:gz') as old:
+                        for entry in old:
+                            tar.addfile(entry, old.extractfile(entry) if entry.isfile() else None)
+                            present.add(entry.name)
+                for storage, path in dict.fromkeys(files):
+                    if path in present and checksum_from_name(path):
+                        continue  # stesso nome, stesso contenuto
+                    try:
+                        tar.add(storage.path(path), arcname=path)  # le foto: vince l'ultima copia
+                    except FileNotFoundError:
+                        missing.add(path)
+            os.replace(tmp, root / name)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+    return name, missing
+
+
+def _archive_member(member, tarball, files):
+    data = {
+        'rows': serializers.serialize('python', _rows(member)),
+        # figli (gia' dimessi) da ricollegare al ripristino: la FK si azzera
+        'dependents': list(member.dependents.values_list('pk', flat=True)),
+    }
+    # riga d'archivio e cancellazione nella stessa transazione: se il socio
+    # non si cancella, l'archivio torna indietro. Con l'archivio su un altro
+    # database quello dell'archivio fa commit per primo; se poi cade il
+    # commit principale, al prossimo giro update_or_create riscrive la riga.
+    with transaction.atomic(), transaction.atomic(using=archive_db()):
+        archived, _ = ArchivedMember.objects.update_or_create(
+            member_id=member.pk,
+            defaults=dict(
+                username=member.username, first_name=member.first_name,
+                last_name=member.last_name, card_number=member.card_number or '',
+                fiscal_code=member.fiscal_code, dismissed_on=member.archive_date,
+                data=data, files=files, tarball=tarball,
+            ),
+        )
+        member._archiving = True  # niente ricalcoli di statistiche e stato (signals.py)
+        member.delete()
+    if member.photo and not Member.objects.filter(photo=member.photo.name).exists():
+        default_storage.delete(member.photo.name)
+    return archived
+
+
+def archive_members(years=None, limit=None, dry_run=False, today=None):
+    """
+    Archivia i candidati (al massimo `limit`). Restituisce
+    [(id socio, nome, anno, file mancanti)]; con dry_run solo l'elenco.
+    """
+    members = candidates(years, today)
+    if limit:
+        members = members[:limit]
+    by_year = {}
+    for member in members:
+        by_year.setdefault(member.archive_date.year, []).append(member)
+
+    done = []
+    for year, group in sorted(by_year.items()):
+        if dry_run:
+            done.extend((member.pk, str(member), year, set()) for member in group)
+            continue
+        files = {member.pk: _files(member) for member in group}
+        tarball, missing = _write_tarball(year, [f for member in group for f in files[member.pk]])
+        for member in group:
+            pk, names = member.pk, [name for _, name in files[member.pk]]
+            _archive_member(member, tarball, [name for name in names if name not in missing])
+            lost = missing.intersection(names)
+            if lost:
+                logger.warning("Socio %s archiviato senza i file mancanti: %s", pk, sorted(lost))
+            done.append((pk, str(member), year, lost))
+    return done
+
+
+def _archive_document(document, tarball, files):
+    with transaction.atomic(), transaction.atomic(using=archive_db()):
+        archived, _ = ArchivedDocument.objects.update_or_create(
+            document_id=document.pk,
+            defaults=dict(
+                member_id=document.member_id, member_name=str(document.member),
+                document_type=document.document_type, expiration_date=document.expiration_date,
+                data={'rows': serializers.serialize('python', [document])},
+                files=files, tarball=tarball,
+            ),
+        )
+        document.delete()
+    return archived
+
+
+def archive_documents(years=None, limit=None, dry_run=False, today=None):
+    """
+    Archivia i documenti scaduti e sostituiti (al massimo `limit`).
+    Restituisce [(id documento, descrizione, anno, file mancanti)].
+    """
+    documents = expired_documents(years, today)
+    if limit:
+        documents = documents[:limit]
+    by_year = {}
+    for document in documents:
+        by_year.setdefault(document.expiration_date.year, []).append(document)
+
+    done = []
+    for year, group in sorted(by_year.items()):
+        if dry_run:
+            done.extend((document.pk, str(document), year, set()) for document in group)
+            continue
+        tarball, missing = _write_tarball(year, _document_files(group))
+        for document in group:
+            pk, label = document.pk, str(document)
+            names = [name for _, name in _document_files([document])]
+            _archive_document(document, tarball, [name for name in names if name not in missing])
+            lost = missing.intersection(names)
+            if lost:
+                logger.warning("Documento %s archiviato senza i file mancanti: %s", pk, sorted(lost))
+            done.append((pk, label, year, lost))
+    return done
+
+
+# ---------------------------------------------------------------------------
+#  RIPRISTINO
+# ---------------------------------------------------------------------------
+def _restore_files(archived, photo):
+    """Rimette i file mancanti. Restituisce {nome archiviato: nome nello storage}."""
+    renamed = {}
+    if not archived.files:
+        return renamed
+    path = archive_root() / archived.tarball
+    if not path.exists():
+        raise ArchiveError(f"Tarball mancante: {path}")
+    with tarfile.open(path, 'r:gz') as tar:
+        for name in archived.files:
+            storage = default_storage if name == photo else document_storage
+            if storage.exists(name):
+                continue
+            try:
+                member = tar.extractfile(name)
+            except KeyError:
+                member = None
+            if member is None:
+                raise ArchiveError(f"{name} non e' nel tarball {archived.tarball}")
+            with member:
+                renamed[name] = storage.save(name, File(member, name=name))
+    return renamed
+
+
+def _rename_files(row, renamed):
+    for field in FILE_FIELDS:
+        name = row['fields'].get(field)
+        if renamed.get(name, name) != name:  # vecchio percorso: ora nell'archivio per checksum
+            row['fields'][field] = renamed[name]
+            if field == 'file':
+                row['fields']['checksum'] = checksum_from_name(renamed[name])
+
+
+def restore(archived):
+    """Rimette nelle tabelle di lavoro il socio archiviato. Restituisce il Member."""
+    if Member.objects.filter(pk=archived.member_id).exists():
+        raise ArchiveError(f"Il socio {archived.member_id} e' gia' presente.")
+    rows = archived.data['rows']
+    photo = rows[0]['fields'].get('photo') or ''
+
+    renamed = _restore_files(archived, photo)
+    for row in rows:
+        _rename_files(row, renamed)
+        if row['model'] == 'members.member':
+            row['fields']['photo_checksum'] = ''  # miniature forse gia' eliminate: si rifanno
+
+    try:
+        with transaction.atomic():
+            for obj in serializers.deserialize('python', rows):
+                obj.save()
+            Member.objects.filter(
+                pk__in=archived.data['dependents'], guardian__isnull=True,
+            ).update(guardian_id=archived.member_id)
+    except (IntegrityError, DeserializationError) as e:
+        raise ArchiveError(f"Ripristino del socio {archived.member_id} non riuscito: {e}") from e
+    archived.delete()
+
+    member = Member.objects.get(pk=archived.member_id)
+    refresh_member_status([member.pk])
+    if member.photo:
+        images.schedule(member)
+    return member
+
+
+def restore_document(archived):
+    """Rimette tra i documenti del socio quello archiviato. Restituisce il MemberDocument."""
+    if MemberDocument.objects.filter(pk=archived.document_id).exists():
+        raise ArchiveError(f"Il documento {archived.document_id} e' gia' presente.")
+    if not Member.objects.filter(pk=archived.member_id).exists():
+        raise ArchiveError(f"Il socio {archived.member_id} del documento non e' presente (archiviato?).")
+    rows = archived.data['rows']
+    renamed = _restore_files(archived, photo='')
+    for row in rows:
+        _rename_files(row, renamed)
+    try:
+        with transaction.atomic():
+            for obj in serializers.deserialize('python', rows):
+                obj.save()
+    except (IntegrityError, DeserializationError) as e:
+        raise ArchiveError(f"Ripristino del documento {archived.document_id} non riuscito: {e}") from e
+    archived.delete()
+    refresh_member_status([archived.member_id])
+    return MemberDocument.objects.get(pk=archived.document_id)
@@ -0,0 +1,146 @@
+# members/benchmarks.py
+# Benchmark delle pagine piu' pesanti a volumi crescenti di soci
+# (`manage.py run_benchmarks`). Per ogni volume si aggiungono soci
+# sintetici (members/synthetic.py) fino al totale richiesto, poi ogni
+# pagina viene chiamata `repeat` volte con cache vuota (caso peggiore:
+# i grafici vengono ricalcolati), misurando tempo e numero di query.
+# I risultati sono un JSON confrontabile tra una versione e l'altra.
+
+import json
+import platform
+import statistics
+import subprocess
+import time
+
+import django
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Member
+from .synthetic import SyntheticData
+
+# (nome, url name, argomenti, parametri GET)
+BENCHMARKS = (
+    ('dashboard', 'dashboard', (), {}),
+    ('dashboard_search', 'dashboard', (), {'q': 'rossi mar'}),
+    ('payment_all', 'members:payment_all', (), {}),
+    ('payment_all_overdue', 'members:payment_all', (), {'status': 'overdue'}),
+    ('payment_due', 'members:payment_due', (), {}),
+    ('subscription_status', 'members:subscription_status', (), {}),
+    ('medical_certificate_status', 'members:medical_certificate_status', (), {}),
+    ('chart_subscriptions', 'subscription_data', (), {}),
+    ('chart_by_category', 'subscription_category_data', (), {}),
+    ('chart_revenue', 'members:chart_data', ('revenue',), {}),
+)
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def environment():
+    """Metadati del run (per capire cosa si sta confrontando)."""
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=5,
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = ''
+    return {
+        'timestamp': timezone.now().isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'database_version': '.'.join(map(str, connection.Database.sqlite_version_info))
+        if connection.vendor == 'sqlite' else '',
+        'machine': platform.machine(),
+    }
+
+
+def office_client():
+    user, _ = Member.objects.get_or_create(
+        username='benchmark_office',
+        defaults={'role': Member.Role.STAFF, 'first_name': 'Bench', 'last_name': 'Office'},
+    )
+    client = Client()
+    client.force_login(user)
+    return client
+
+
+def time_page(client, url_name, args, params, repeat):
+    url = reverse(url_name, args=args)
+    timings, queries, status = [], 0, None
+    for _ in range(repeat):
+        cache.clear()
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = client.get(url, params)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            timings.append((time.perf_counter() - started) * 1000)
+        queries, status = len(captured), response.status_code
+    return {
+        'median_ms': round(statistics.median(timings), 2),
+        'p95_ms': round(_percentile(timings, 95), 2),
+        'min_ms': round(min(timings), 2),
+        'queries': queries,
+        'status': status,
+    }
+
+
+def run(sizes=DEFAULT_SIZES, repeat=5, seed=42, only=None, log=print):
+    """Esegue i benchmark per ogni volume; restituisce il documento dei risultati."""
+    generator = SyntheticData(seed=seed)
+    client = office_client()
+    results = []
+    for size in sorted(sizes):
+        missing = size - generator.existing()
+        if missing > 0:
+            log(f"Generazione di {missing} soci (totale {size})...")
+            generator.generate(missing)
+        for name, url_name, args, params in BENCHMARKS:
+            if only and name not in only:
+                continue
+            result = {'size': size, 'name': name, **time_page(client, url_name, args, params, repeat)}
+            log(f"{size:>7}  {name:<28} {result['median_ms']:>9.1f} ms  {result['queries']:>4} query")
+            results.append(result)
+    return {'environment': environment(), 'repeat': repeat, 'seed': seed, 'results': results}
+
+
+def compare(current, previous, threshold=0.2):
+    """
+    Confronta due documenti di risultati: righe (volume, pagina) la cui
+    mediana e' peggiorata oltre `threshold` (0.2 = +20%) o con piu' query.
+    """
+    before = {(r['size'], r['name']): r for r in previous['results']}
+    regressions = []
+    for r in current['results']:
+        old = before.get((r['size'], r['name']))
+        if old is None:
+            continue
+        ratio = r['median_ms'] / old['median_ms'] if old['median_ms'] else 1
+        if ratio > 1 + threshold or r['queries'] > old['queries']:
+            regressions.append({
+                **r, 'previous_ms': old['median_ms'], 'previous_queries': old['queries'],
+                'ratio': round(ratio, 2),
+            })
+    return regressions
+
+
+def load(path):
+    with open(path, encoding='utf-8') as fh:
+        return json.load(fh)
+
+
+def save(document, path):
+    with open(path, 'w', encoding='utf-8') as fh:
+        json.dump(document, fh, indent=2)
+        fh.write('\n')
@@ -0,0 +1,189 @@
+# members/charts.py
+# Serie dei grafici (dashboard ed endpoint JSON) con cache.
+#
+# Ogni serie e' un GROUP BY per giorno / settimana / mese (scelto in base
+# all'ampiezza dell'intervallo) sul rollup DailyStats: dieci anni sono al
+# piu' 3.650 righe per settore. Il risultato va in cache con chiave
+# (versione, serie, inizio, fine, raggruppamento). La versione si
+# incrementa a ogni aggiornamento del rollup o dei settori (vedi signals.py):
+# le chiavi vecchie non vengono piu' lette e scadono da sole.
+# La stessa versione, con l'istante della modifica, fornisce ETag e
+# Last-Modified agli endpoint: il browser riceve 304 se nulla e' cambiato.
+
+import hashlib
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import DateField, Max, Min, Sum
+from django.db.models.functions import Trunc
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import DailyStats
+
+CACHE_TIMEOUT = 24 * 60 * 60
+VERSION_KEY = 'charts:version'
+
+BUCKET_DAY = 'day'
+BUCKET_WEEK = 'week'
+BUCKET_MONTH = 'month'
+
+# Intervalli fino a 2 mesi per giorno, fino a un anno per settimana, oltre per mese
+DAY_LIMIT = 62
+WEEK_LIMIT = 366
+
+LABEL_FORMATS = {
+    BUCKET_DAY: '%d %b %Y',
+    BUCKET_WEEK: '%d %b %Y',
+    BUCKET_MONTH: '%b %Y',
+}
+
+
+def choose_bucket(start, end):
+    days = (end - start).days
+    if days <= DAY_LIMIT:
+        return BUCKET_DAY
+    if days <= WEEK_LIMIT:
+        return BUCKET_WEEK
+    return BUCKET_MONTH
+
+
+def parse_range(params):
+    """
+    (inizio, fine) dai parametri GET start_date / end_date. Accetta anche
+    il formato del selettore a intervallo: start_date="2024-01-01 to 2024-03-31".
+    """
+    start = (params.get('start_date') or '').strip()
+    end = (params.get('end_date') or '').strip()
+    if ' to ' in start:
+        start, _, end = start.partition(' to ')
+    return _safe_date(start), _safe_date(end)
+
+
+def _safe_date(value):
+    try:
+        return parse_date(value.strip()) if value else None
+    except ValueError:
+        return None
+
+
+# ---------------------------------------------------------------------------
+#  SERIE  (lette dal rollup DailyStats: una riga per giorno e settore)
+# ---------------------------------------------------------------------------
+class Series:
+    """
+    Somma di un campo di DailyStats raggruppata per periodo
+    (o, con by_sector=True, per settore nell'intervallo).
+    """
+
+    def __init__(self, name, field, by_sector=False):
+        self.name = name
+        self.field = field
+        self.by_sector = by_sector
+
+    def bounds(self):
+        """Primo e ultimo giorno con dati (serviti dall'indice su day)."""
+        agg = DailyStats.objects.aggregate(lo=Min('day'), hi=Max('day'))
+        return agg['lo'], agg['hi']
+
+    def queryset(self, start, end):
+        qs = DailyStats.objects.order_by()
+        if start:
+            qs = qs.filter(day__gte=start)
+        if end:
+            qs = qs.filter(day__lte=end)
+        return qs
+
+    def compute(self, start, end, bucket):
+        qs = self.queryset(start, end)
+        if self.by_sector:
+            rows = (
+                qs.values('sector__name').annotate(value=Sum(self.field))
+                .filter(value__gt=0).order_by('sector__name')
+            )
+            return {
+                'labels': [r['sector__name'] or '—' for r in rows],
+                'data': [_number(r['value']) for r in rows],
+            }
+        rows = (
+            qs.annotate(period=Trunc('day', bucket, output_field=DateField()))
+            .values('period')
+            .annotate(value=Sum(self.field))
+            .filter(value__gt=0)
+            .order_by('period')
+        )
+        fmt = LABEL_FORMATS[bucket]
+        return {
+            'labels': [r['period'].strftime(fmt) for r in rows],
+            'data': [_number(r['value']) for r in rows],
+        }
+
+
+def _number(value):
+    return float(value) if isinstance(value, Decimal) else value
+
+
+SERIES = {
+    series.name: series for series in (
+        Series('members', 'new_members'),
+        Series('subscriptions', 'new_subscriptions'),
+        Series('subscriptions_by_sector', 'new_subscriptions', by_sector=True),
+        Series('expirations', 'expirations'),
+        Series('revenue', 'revenue'),
+        Series('revenue_by_sector', 'revenue', by_sector=True),
+        Series('outstanding', 'outstanding'),
+    )
+}
+
+
+# ---------------------------------------------------------------------------
+#  CACHE E VERSIONE
+# ---------------------------------------------------------------------------
+def current_version():
+    """(versione, istante dell'ultima modifica). Creata al primo accesso."""
+    stamp = cache.get(VERSION_KEY)
+    if stamp is None:
+        stamp = (1, timezone.now().replace(microsecond=0))
+        cache.add(VERSION_KEY, stamp, None)
+        stamp = cache.get(VERSION_KEY, stamp)
+    return stamp
+
+
+def invalidate_charts():
+    """Rende obsolete tutte le serie in cache (chiamata dai signal)."""
+    version, _ = current_version()
+    cache.set(VERSION_KEY, (version + 1, timezone.now().replace(microsecond=0)), None)
+
+
+def chart_series(name, start=None, end=None, bucket=None):
+    """
+    Serie `name` per l'intervallo [start, end] (date o None = senza limite),
+    dalla cache se disponibile. `bucket` (day/week/month) se omesso si
+    sceglie dall'ampiezza dell'intervallo. Restituisce {'labels', 'data', 'bucket'}.
+    """
+    series = SERIES[name]
+    if bucket not in LABEL_FORMATS:
+        bucket = None
+    version, _ = current_version()
+    key = f'charts:{version}:{name}:{start or ""}:{end or ""}:{bucket or "auto"}'
+    result = cache.get(key)
+    if result is None:
+        if bucket is None:
+            lo, hi = (start, end) if start and end else series.bounds()
+            today = timezone.localdate()
+            bucket = choose_bucket(start or lo or today, end or hi or today)
+        result = series.compute(start, end, bucket)
+        result['bucket'] = bucket
+        cache.set(key, result, CACHE_TIMEOUT)
+    return result
+
+
+def series_etag(request, name, start=None, end=None, bucket=None):
+    """ETag di una serie: cambia con i parametri e con la versione."""
+    version, _ = current_version()
+    raw = f'{name}:{start or ""}:{end or ""}:{bucket or "auto"}:{version}'
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def series_last_modified(request, *args, **kwargs):
+    return current_version()[1]
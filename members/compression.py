@@ -0,0 +1,236 @@
+# members/compression.py
+# Compressione dei documenti dei soci all'arrivo.
+#
+# Certificati e documenti d'identita' arrivano come scansioni enormi e
+# restano per sempre. Fuori dalla richiesta (attivita' "documents.compress"
+# del worker, o `manage.py gc_documents --compress` per l'arretrato) ogni
+# file nuovo passa da qui una volta:
+#   - immagini: orientamento EXIF applicato, lato lungo ridotto a
+#     MAX_IMAGE_SIDE, ricodificate nello stesso formato (senza metadati);
+#   - PDF, con pypdf (pure-Python, in requirements.txt): immagini delle
+#     pagine ricampionate a PDF_IMAGE_DPI e ricodificate in JPEG, flussi di
+#     contenuto compressi, oggetti duplicati eliminati. Se pypdf manca i
+#     PDF restano come sono: lo dicono il log e document_storage_report.
+# Il risultato si tiene solo se fa risparmiare almeno MIN_SAVING e va
+# nell'archivio per checksum (members/storage.py) al posto del file
+# caricato. L'originale resta referenziato (original_file) solo con
+# SGS_DOCUMENT_KEEP_ORIGINALS, altrimenti diventa orfano e lo elimina
+# gc_documents. Le dimensioni prima e dopo restano sul documento
+# (original_size, size); i totali li riporta `manage.py document_storage_report`.
+# I PDF non vengono linearizzati ("fast web view"): nessuna libreria
+# pure-Python lo fa, e i download supportano comunque le richieste Range.
+
+import logging
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .filetypes import SNIFF_BYTES, sniff
+from .jobs import enqueue, task
+from .models import MemberDocument
+from .storage import checksum_from_name, document_storage, stored_files
+
+logger = logging.getLogger('members.compression')
+
+MAX_IMAGE_SIDE = 2480  # lato lungo di un A4 a 300 dpi: leggibile anche stampato
+PDF_IMAGE_DPI = 150
+PDF_JPEG_QUALITY = 75
+MIN_SAVING = 0.1  # sotto il 10% in meno si tiene il file com'e'
+IMAGE_FORMATS = {  # tipo rilevato -> (formato Pillow, opzioni)
+    'image/jpeg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+    'image/png': ('PNG', {'optimize': True}),
+    'image/webp': ('WEBP', {'quality': 85, 'method': 4}),
+    'image/tiff': ('TIFF', {'compression': 'tiff_adobe_deflate'}),
+}
+
+
+def pdf_available():
+    try:
+        import pypdf  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+# ---------------------------------------------------------------------------
+#  COMPRESSIONE DEI FILE
+# ---------------------------------------------------------------------------
+def compress_image(fileobj, content_type):
+    """Immagine ridotta e ricodificata nello stesso formato (None se a piu' pagine)."""
+    pil_format, options = IMAGE_FORMATS[content_type]
+    with Image.open(fileobj) as image:
+        if getattr(image, 'n_frames', 1) > 1:
+            return None  # TIFF a piu' pagine, animazioni: si lasciano come sono
+        image.draft(image.mode, (MAX_IMAGE_SIDE, MAX_IMAGE_SIDE))  # JPEG: decodifica gia' ridotta
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((MAX_IMAGE_SIDE, MAX_IMAGE_SIDE), Image.Resampling.LANCZOS)
+        if pil_format == 'JPEG' and image.mode not in ('RGB', 'L', 'CMYK'):
+            image = image.convert('RGB')
+        buffer = BytesIO()
+        image.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+def _downsample(image, page_inches):
+    """Ricampiona un'immagine di pagina oltre PDF_IMAGE_DPI (scansioni a pagina intera)."""
+    if image.indirect_reference is None:
+        return  # immagine inline: piccola per definizione
+    picture = image.image
+    if picture.mode not in ('RGB', 'L'):
+        return  # bianco e nero (CCITT/JBIG2, gia' compatti), trasparenze, CMYK
+    scale = PDF_IMAGE_DPI * page_inches / max(picture.size)
+    if scale > 0.75:
+        return  # gia' vicina alla risoluzione voluta (o un logo piccolo)
+    size = (max(1, round(picture.width * scale)), max(1, round(picture.height * scale)))
+    image.replace(picture.resize(size, Image.Resampling.LANCZOS), quality=PDF_JPEG_QUALITY)
+
+
+def compress_pdf(fileobj):
+    """PDF con immagini ricampionate e flussi compressi (None se cifrato)."""
+    from pypdf import PdfReader, PdfWriter
+
+    reader = PdfReader(fileobj)
+    if reader.is_encrypted:
+        return None
+    writer = PdfWriter(clone_from=reader)
+    for page in writer.pages:
+        page_inches = max(float(page.mediabox.width), float(page.mediabox.height)) / 72
+        for image in page.images:
+            _downsample(image, page_inches)
+        page.compress_content_streams()
+    writer.compress_identical_objects()
+    buffer = BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def compress(fileobj):
+    """Contenuto compresso di `fileobj`, o None se il tipo non si sa comprimere."""
+    head = fileobj.read(SNIFF_BYTES)
+    fileobj.seek(0)
+    content_type = sniff(head)
+    if content_type == 'application/pdf':
+        if not pdf_available():
+            logger.warning("PDF non compresso: manca il pacchetto 'pypdf'")
+            return None
+        return compress_pdf(fileobj)
+    if content_type in IMAGE_FORMATS:
+        return compress_image(fileobj, content_type)
+    return None  # HEIC (Pillow non lo legge) e tipi sconosciuti
+
+
+# ---------------------------------------------------------------------------
+#  DOCUMENTI
+# ---------------------------------------------------------------------------
+def compress_document(document, keep_original=None):
+    """
+    Comprime il file di `document` e aggiorna la riga solo se nel frattempo
+    il file non e' cambiato. Restituisce i byte risparmiati (0 se la
+    compressione non conviene o il file non si sa leggere).
+    """
+    if keep_original is None:
+        keep_original = getattr(settings, 'SGS_DOCUMENT_KEEP_ORIGINALS', False)
+    storage, name = document.file.storage, document.file.name
+    try:
+        size = storage.size(name)
+        with storage.open(name, 'rb') as fh:
+            data = compress(fh)
+    except FileNotFoundError:
+        logger.warning("Documento %s: file mancante (%s)", document.pk, name)
+        return 0
+    except Exception as e:  # file danneggiati: Pillow e pypdf sollevano eccezioni di ogni tipo
+        logger.warning("Documento %s non compresso (%s): %r", document.pk, name, e)
+        data = None
+
+    update = {'original_size': size, 'size': size, 'compressed_at': timezone.now()}
+    if data is not None and len(data) <= size * (1 - MIN_SAVING):
+        compressed = storage.save(name, ContentFile(data))
+        update.update(
+            file=compressed, checksum=checksum_from_name(compressed), size=len(data),
+            original_file=name if keep_original else '',
+        )
+    if not MemberDocument.objects.filter(pk=document.pk, file=name).update(**update):
+        return 0  # file sostituito: ci pensa il lavoro del nuovo
+    for field, value in update.items():
+        setattr(document, field, value)
+    return size - update['size']
+
+
+def schedule(document):
+    """Accoda la compressione del file di `document` (una volta per file)."""
+    return enqueue(
+        'documents.compress', {'document_id': document.pk, 'name': document.file.name},
+        key=f'document-compress:{document.pk}:{document.file.name}',
+    )
+
+
+@task('documents.compress')
+def compress_task(document_id, name):
+    document = MemberDocument.objects.filter(pk=document_id, file=name, compressed_at__isnull=True).first()
+    if document is not None:
+        compress_document(document)
+
+
+def compress_pending(keep_original=None):
+    """Comprime i documenti mai elaborati. Restituisce (documenti, byte risparmiati)."""
+    done = saved = 0
+    pending = MemberDocument.objects.filter(compressed_at__isnull=True).exclude(file='')
+    for document in pending.iterator():
+        saved += compress_document(document, keep_original)
+        done += 1
+    return done, saved
+
+
+# ---------------------------------------------------------------------------
+#  RESOCONTO (manage.py document_storage_report)
+# ---------------------------------------------------------------------------
+def storage_report(storage=document_storage):
+    """
+    Spazio occupato dai documenti: per tipo e in totale quanto pesavano
+    all'arrivo (`original`), quanto pesano ora (`stored`) e il risparmio;
+    poi lo spazio reale dopo la deduplica, gli originali conservati e
+    tutto cio' che c'e' sotto documents/ (orfani compresi).
+    """
+    documents = MemberDocument.objects.exclude(file='')
+    labels = dict(MemberDocument.DocumentType.choices)
+    rows = []
+    for row in (documents.order_by('document_type').values('document_type')
+                .annotate(documents=Count('pk'), compressed=Count('compressed_at'),
+                          original=Sum(Coalesce('original_size', 'size')), stored=Sum('size'))):
+        original, stored = row['original'] or 0, row['stored'] or 0
+        rows.append({
+            'type': labels.get(row['document_type'], row['document_type']),
+            'documents': row['documents'], 'compressed': row['compressed'],
+            'original': original, 'stored': stored, 'saved': original - stored,
+        })
+    totals = {
+        key: sum(row[key] for row in rows)
+        for key in ('documents', 'compressed', 'original', 'stored', 'saved')
+    }
+    files = dict(documents.values_list('file', 'size').iterator())
+    originals = dict(documents.exclude(original_file='')
+                     .values_list('original_file', 'original_size').iterator())
+    disk = 0
+    for name, _ in stored_files(storage):
+        try:
+            disk += storage.size(name)
+        except FileNotFoundError:
+            continue
+    return {
+        'types': rows, **totals,
+        'unique_files': len(files), 'unique_bytes': sum(size or 0 for size in files.values()),
+        'originals_kept': len(originals), 'originals_bytes': sum(size or 0 for size in originals.values()),
+        'disk_bytes': disk,
+    }
+
+
+def top_savings(limit):
+    """I `limit` documenti con il risparmio maggiore."""
+    return (MemberDocument.objects.filter(original_size__isnull=False, size__isnull=False)
+            .annotate(saved=F('original_size') - F('size')).filter(saved__gt=0)
+            .select_related('member').order_by('-saved')[:limit])
@@ -0,0 +1,81 @@
+# members/config_cache.py
+# Fotografia in cache delle tabelle di configurazione (settori, listino
+# pacchetti, insegnanti). I form la usano per le scelte invece di
+# interrogare il database a ogni richiesta.
+#
+# La chiave contiene un numero di versione: ogni modifica (da
+# Configurazione o dall'admin, vedi signals.py) incrementa la versione e
+# la fotografia successiva viene ricostruita con una query per tabella.
+
+from django.core.cache import cache
+
+from .models import Instructor, Package, Sector
+
+VERSION_KEY = 'config:version'
+CACHE_TIMEOUT = 24 * 60 * 60
+
+
+def _version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, 1, None)
+        version = cache.get(VERSION_KEY, 1)
+    return version
+
+
+def invalidate_config():
+    """Rende obsoleta la fotografia (chiamata dai signal)."""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:  # chiave assente o scaduta
+        cache.set(VERSION_KEY, 2, None)
+
+
+def _build():
+    sectors = [
+        {'id': pk, 'name': name, 'is_active': active}
+        for pk, name, active in Sector.objects.order_by('name').values_list('id', 'name', 'is_active')
+    ]
+    packages = [
+        {
+            'id': p.pk, 'name': p.name, 'label': str(p), 'price': p.price,
+            'package_type': p.package_type, 'sector_id': p.sector_id,
+            'sector_name': p.sector.name, 'is_active': p.is_active,
+        }
+        for p in Package.objects.select_related('sector')
+    ]
+    instructors = [
+        {
+            'id': i.pk, 'label': str(i), 'is_active': i.is_active,
+            'sector_ids': [s.pk for s in i.sectors.all()],
+        }
+        for i in Instructor.objects.prefetch_related('sectors')
+    ]
+    return {'sectors': sectors, 'packages': packages, 'instructors': instructors}
+
+
+def config_snapshot():
+    """{'sectors', 'packages', 'instructors'}: tutte le righe, con is_active."""
+    key = f'config:snapshot:{_version()}'
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = _build()
+        cache.set(key, snapshot, CACHE_TIMEOUT)
+    return snapshot
+
+
+def active(kind):
+    return [row for row in config_snapshot()[kind] if row['is_active']]
+
+
+def sector_choices(active_only=True):
+    rows = active('sectors') if active_only else config_snapshot()['sectors']
+    return [(row['id'], row['name']) for row in rows]
+
+
+def package_choices():
+    return [(row['id'], row['label']) for row in active('packages')]
+
+
+def instructor_choices():
+    return [(row['id'], row['label']) for row in active('instructors')]
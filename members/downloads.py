@@ -0,0 +1,162 @@
+# members/downloads.py
+# Invio dei file caricati (documenti dei soci, foto) dopo il controllo
+# dei permessi fatto dalla vista.
+#
+# Con SGS_SENDFILE impostato Django risponde solo con un header e il
+# trasferimento lo fa il server web (nessun worker Python occupato):
+#   nginx    -> X-Accel-Redirect: SGS_SENDFILE_URL + percorso relativo
+#               (location `internal` con alias su MEDIA_ROOT)
+#   apache   -> X-Sendfile: percorso assoluto (mod_xsendfile; lighttpd idem)
+# Altrimenti il file parte da Django, con supporto a richieste
+# condizionali (ETag / Last-Modified -> 304) e Range a intervallo singolo
+# (206 / 416), cosi' i PDF grandi si possono riprendere e sfogliare.
+# Il Content-Type e' quello riconosciuto dai primi byte del file
+# (members/filetypes.py), mai dal nome scelto da chi l'ha caricato: un
+# file di tipo sconosciuto parte come application/octet-stream e sempre
+# come allegato, e con nosniff il browser non prova a indovinarlo.
+#
+# Esempio nginx:
+#   location /protected/ { internal; alias /srv/sgs/media/; }
+
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+
+from .filetypes import extension, sniff_path
+
+SENDFILE_HEADERS = {'nginx': 'X-Accel-Redirect', 'apache': 'X-Sendfile', 'lighttpd': 'X-Sendfile'}
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range(header, size):
+    """
+    (inizio, fine) inclusivi per un header Range "bytes=a-b", "bytes=a-"
+    o "bytes=-n". None se assente o non gestito (piu' intervalli, altre
+    unita': si invia il file intero, come consentito da RFC 9110).
+    """
+    match = RANGE_RE.match((header or '').strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:  # ultimi n byte
+        length = int(last)
+        if not length or not size:
+            raise RangeNotSatisfiable
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or (last and int(last) < start):
+        raise RangeNotSatisfiable
+    return start, end
+
+
+def _if_range_matches(request, etag, mtime):
+    """If-Range: il Range vale solo se il file non e' cambiato."""
+    value = request.headers.get('If-Range')
+    if not value:
+        return True
+    if value.startswith('"'):
+        return value == etag
+    since = parse_http_date_safe(value)
+    return since is not None and int(mtime) <= since
+
+
+def _read(path, start, length):
+    with open(path, 'rb') as fh:
+        fh.seek(start)
+        while length > 0:
+            chunk = fh.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def _sendfile(name, path):
+    backend = getattr(settings, 'SGS_SENDFILE', '')
+    if backend == 'nginx':
+        prefix = getattr(settings, 'SGS_SENDFILE_URL', '/protected/')
+        return quote(prefix.rstrip('/') + '/' + name.lstrip('/'))
+    if backend in SENDFILE_HEADERS:
+        return path
+    return None
+
+
+def serve_file(request, name, storage, as_attachment=False, filename=None, checksum='', max_age=None):
+    """
+    Risposta per il file `name` di `storage` (su disco); 404 se manca.
+    Con il `checksum` del contenuto l'ETag e' lo SHA-256 (stabile anche
+    se il file viene copiato o ripristinato), altrimenti dimensione +
+    mtime. Con `max_age` (URL che cambia col contenuto) il browser lo
+    tiene in cache senza richiederlo.
+    """
+    if not name:
+        raise Http404("File non presente")
+    try:
+        path = storage.path(name)
+        stat = os.stat(path)
+        content_type = sniff_path(path)
+    except (NotImplementedError, OSError):
+        raise Http404("File non presente")
+    filename = _filename(filename or os.path.basename(name), content_type)
+    if not content_type:
+        content_type, as_attachment = 'application/octet-stream', True
+    etag = f'"{checksum}"' if checksum else f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+    disposition = content_disposition_header(as_attachment, filename)
+
+    target = _sendfile(name, path)
+    if target is not None:
+        # Range e richieste condizionali li gestisce il server web
+        response = HttpResponse(content_type=content_type)
+        response[SENDFILE_HEADERS[settings.SGS_SENDFILE]] = target
+    else:
+        response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+        if response is None:
+            response = _file_response(request, path, stat.st_size, etag, stat.st_mtime, content_type)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Accept-Ranges'] = 'bytes'
+    response['X-Content-Type-Options'] = 'nosniff'
+    response['Cache-Control'] = (
+        f'private, max-age={max_age}, immutable' if max_age else 'private, no-cache'
+    )
+    if response.status_code in (200, 206):
+        response['Content-Disposition'] = disposition
+    return response
+
+
+def _filename(filename, content_type):
+    """Nome proposto al browser, con l'estensione del tipo vero se riconosciuto."""
+    if not content_type or mimetypes.guess_type(filename)[0] == content_type:
+        return filename
+    return os.path.splitext(filename)[0] + extension(content_type)
+
+
+def _file_response(request, path, size, etag, mtime, content_type):
+    try:
+        byte_range = parse_range(request.headers.get('Range'), size)
+    except RangeNotSatisfiable:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+    if byte_range is None or request.method != 'GET' or not _if_range_matches(request, etag, mtime):
+        return FileResponse(open(path, 'rb'), content_type=content_type)
+    start, end = byte_range
+    response = StreamingHttpResponse(_read(path, start, end - start + 1), status=206, content_type=content_type)
+    response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Content-Length'] = str(end - start + 1)
+    return response
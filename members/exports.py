@@ -0,0 +1,268 @@
+# members/exports.py
+# Esportazioni CSV / XLSX per commercialista ed enti (CSEN, FIJLKAM).
+# Stessi filtri delle liste a video. Le righe escono da
+# values_list(...).iterator(chunk_size=...) e vengono scritte man mano:
+# memoria costante anche con centinaia di migliaia di pagamenti, e il
+# browser riceve i primi byte subito invece di attendere il file intero.
+
+import csv
+from datetime import date
+from decimal import Decimal
+
+from django.db.models import F, Q, Value
+from django.db.models.functions import Concat
+from django.utils import timezone
+
+from .models import Affiliation, Member, Payment, Subscription
+from .search import member_search_q
+
+CHUNK_SIZE = 2000          # righe lette dal database per volta
+FLUSH_BYTES = 64 * 1024    # dimensione dei blocchi inviati al client
+
+
+# ---------------------------------------------------------------------------
+#  FORMATTAZIONE (CSV all'italiana: ';', date gg/mm/aaaa, virgola decimale)
+# ---------------------------------------------------------------------------
+def _text(value):
+    return '' if value is None else str(value).strip()
+
+
+def _date(value):
+    return value.strftime('%d/%m/%Y') if value else ''
+
+
+def _money(value):
+    return '' if value is None else f"{value:.2f}".replace('.', ',')
+
+
+def _bool(value):
+    return 'Sì' if value else 'No'
+
+
+def _choices(choices):
+    labels = dict(choices)
+    return lambda value: str(labels.get(value, value or ''))
+
+
+class Dataset:
+    """
+    Un'esportazione: colonne (intestazione, campo, formato) e queryset
+    filtrato a partire dai parametri GET (o dalle opzioni del comando).
+    """
+
+    def __init__(self, name, title, columns, build):
+        self.name = name
+        self.title = title
+        self.columns = columns
+        self.build = build
+
+    @property
+    def header(self):
+        return [header for header, _, _ in self.columns]
+
+    def queryset(self, params, today=None):
+        return self.build(params, today or timezone.now().date())
+
+    def rows(self, params, today=None, typed=False):
+        """
+        Righe gia' formattate. Con typed=True date e importi restano
+        date/Decimal (per XLSX, dove devono essere celle numeriche).
+        """
+        formatters = [fmt for _, _, fmt in self.columns]
+        fields = [field for _, field, _ in self.columns]
+        values = self.queryset(params, today).values_list(*fields)
+        for row in values.iterator(chunk_size=CHUNK_SIZE):
+            yield [
+                value if typed and _is_typed(value) else fmt(value)
+                for fmt, value in zip(formatters, row)
+            ]
+
+
+def _is_typed(value):
+    return isinstance(value, (date, Decimal)) or (
+        isinstance(value, (int, float)) and not isinstance(value, bool)
+    )
+
+
+# ---------------------------------------------------------------------------
+#  FILTRI (gli stessi delle pagine a video)
+# ---------------------------------------------------------------------------
+def _param(params, name):
+    return (params.get(name) or '').strip()
+
+
+def _members(params, today):
+    members = Member.objects.annotate(
+        instructor_name=Concat('instructor__last_name', Value(' '), 'instructor__first_name'),
+    ).search(_param(params, 'q'))
+    status = _param(params, 'status')
+    if status == 'active':
+        members = members.filter(is_dismissed=False)
+    elif status == 'dismissed':
+        members = members.filter(is_dismissed=True)
+    sector = _param(params, 'sector')
+    if sector.isdigit():
+        members = members.filter(sector_id=sector)
+    return members.order_by('last_name', 'first_name', 'id')
+
+
+def _subscriptions(params, today):
+    subscriptions = Subscription.objects.search(_param(params, 'q'))
+    status = _param(params, 'status')
+    if status:
+        subscriptions = subscriptions.with_status(status, today)
+    return subscriptions.with_status_label(today).order_by(
+        F('end_date').desc(nulls_last=True), '-id',
+    )
+
+
+def _payments(params, today):
+    return (
+        Payment.objects
+        .search(_param(params, 'q'))
+        .with_state(_param(params, 'status'), today)
+        .annotate(net=F('amount') - F('discount'))
+        .order_by(
+            F('due_date').desc(nulls_last=True),
+            F('payment_date').desc(nulls_last=True),
+            '-id',
+        )
+    )
+
+
+def _affiliations(params, today):
+    affiliations = Affiliation.objects.filter(member_search_q(_param(params, 'q'), prefix='member__'))
+    body = _param(params, 'ente')
+    if body:
+        affiliations = affiliations.filter(Q(body__code__iexact=body) | Q(body__name__iexact=body))
+    year = _param(params, 'anno')
+    if year:
+        affiliations = affiliations.filter(affiliation_year=year)
+    return affiliations.order_by('body__name', 'member__last_name', 'member__first_name', 'id')
+
+
+MEMBER_COLUMNS = [
+    ("Tessera", 'card_number', _text),
+    ("Cognome", 'last_name', _text),
+    ("Nome", 'first_name', _text),
+    ("Codice fiscale", 'fiscal_code', _text),
+    ("Sesso", 'sex', _text),
+    ("Data di nascita", 'date_of_birth', _date),
+    ("Luogo di nascita", 'birth_place', _text),
+    ("Email", 'email', _text),
+    ("Cellulare", 'phone_number', _text),
+    ("Indirizzo", 'address', _text),
+    ("Comune", 'residence_city', _text),
+    ("Prov.", 'province', _text),
+    ("CAP", 'postal_code', _text),
+    ("Settore", 'sector__name', _text),
+    ("Insegnante", 'instructor_name', _text),
+    ("Data registrazione", 'registration_date', _date),
+    ("Dimesso", 'is_dismissed', _bool),
+]
+
+SUBSCRIPTION_COLUMNS = [
+    ("Tessera", 'member__card_number', _text),
+    ("Cognome", 'member__last_name', _text),
+    ("Nome", 'member__first_name', _text),
+    ("Tipo", 'subscription_type', _choices(Subscription.SubscriptionType.choices)),
+    ("Settore", 'sector__name', _text),
+    ("Pacchetto", 'package__name', _text),
+    ("Inizio", 'start_date', _date),
+    ("Fine", 'end_date', _date),
+    ("Stato", 'status_label', _text),
+]
+
+PAYMENT_COLUMNS = [
+    ("Tessera", 'member__card_number', _text),
+    ("Cognome", 'member__last_name', _text),
+    ("Nome", 'member__first_name', _text),
+    ("Tipo", 'payment_type', _choices(Payment.PaymentType.choices)),
+    ("Data pagamento", 'payment_date', _date),
+    ("Scadenza", 'due_date', _date),
+    ("Prossima scadenza", 'next_due_date', _date),
+    ("Quota", 'amount', _money),
+    ("Iscrizione", 'enrollment_amount', _money),
+    ("Sconto", 'discount', _money),
+    ("Netto", 'net', _money),
+    ("Modalità", 'payment_mode', _choices(Payment.PaymentMode.choices)),
+    ("Tariffa", 'fee_code', _text),
+    ("Pagato", 'is_paid', _bool),
+]
+
+AFFILIATION_COLUMNS = [
+    ("Ente", 'body__name', _text),
+    ("Sigla", 'body__code', _text),
+    ("Tessera", 'member__card_number', _text),
+    ("Cognome", 'member__last_name', _text),
+    ("Nome", 'member__first_name', _text),
+    ("Codice fiscale", 'member__fiscal_code', _text),
+    ("Data di nascita", 'member__date_of_birth', _date),
+    ("Tessera federale", 'federal_card', _text),
+    ("Scadenza tessera", 'federal_card_expiry', _date),
+    ("Licenza", 'federal_license', _text),
+    ("Anno", 'affiliation_year', _text),
+]
+
+DATASETS = {
+    dataset.name: dataset for dataset in (
+        Dataset('soci', "Soci", MEMBER_COLUMNS, _members),
+        Dataset('abbonamenti', "Abbonamenti", SUBSCRIPTION_COLUMNS, _subscriptions),
+        Dataset('pagamenti', "Pagamenti", PAYMENT_COLUMNS, _payments),
+        Dataset('affiliazioni', "Affiliazioni", AFFILIATION_COLUMNS, _affiliations),
+    )
+}
+
+FORMATS = ('csv', 'xlsx')
+
+
+# ---------------------------------------------------------------------------
+#  SCRITTURA
+# ---------------------------------------------------------------------------
+class _Echo:
+    """Pseudo-file per csv.writer: restituisce la riga invece di scriverla."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(dataset, params, today=None):
+    """
+    Genera il CSV a blocchi di ~64 KB. L'intestazione (con BOM, cosi'
+    Excel riconosce l'UTF-8) parte subito, prima della prima query.
+    """
+    writer = csv.writer(_Echo(), delimiter=';')
+    yield '\ufeff' + writer.writerow(dataset.header)
+    buffer, size = [], 0
+    for row in dataset.rows(params, today):
+        line = writer.writerow(row)
+        buffer.append(line)
+        size += len(line)
+        if size >= FLUSH_BYTES:
+            yield ''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def write_xlsx(dataset, params, fileobj, today=None):
+    """
+    Scrive l'XLSX su `fileobj` con openpyxl in modalita' write-only
+    (le righe non restano in memoria). openpyxl e' facoltativo.
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(dataset.title)
+    sheet.append(dataset.header)
+    for row in dataset.rows(params, today, typed=True):
+        sheet.append(row)
+    workbook.save(fileobj)
+
+
+def xlsx_available():
+    try:
+        import openpyxl  # noqa: F401
+    except ImportError:
+        return False
+    return True
@@ -0,0 +1,46 @@
+# members/filetypes.py
+# Tipo dei file caricati riconosciuto dai primi byte ("magic bytes"), mai
+# dal nome o dal Content-Type scelti dal client. Lo stesso tipo decide
+# cosa si accetta (uploads.py), l'estensione nell'archivio (storage.py)
+# e il Content-Type dei download (downloads.py): un file che inizia con
+# "%PDF-" ma si chiama x.html resta un PDF ovunque.
+
+SNIFF_BYTES = 16
+HEIF_BRANDS = (b'heic', b'heix', b'heif', b'mif1', b'msf1')
+
+# tipi riconosciuti -> estensione dei file nell'archivio
+EXTENSIONS = {
+    'application/pdf': '.pdf',
+    'image/jpeg': '.jpg',
+    'image/png': '.png',
+    'image/tiff': '.tif',
+    'image/webp': '.webp',
+    'image/heic': '.heic',
+}
+
+
+def sniff(head):
+    """Tipo MIME dai primi byte del file ('' se non riconosciuto)."""
+    if head.startswith(b'%PDF-'):
+        return 'application/pdf'
+    if head.startswith(b'\xff\xd8\xff'):
+        return 'image/jpeg'
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'image/png'
+    if head.startswith((b'II*\x00', b'MM\x00*')):
+        return 'image/tiff'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    if head[4:8] == b'ftyp' and head[8:12] in HEIF_BRANDS:
+        return 'image/heic'
+    return ''
+
+
+def sniff_path(path):
+    """Tipo MIME del file su disco `path` ('' se non riconosciuto)."""
+    with open(path, 'rb') as fh:
+        return sniff(fh.read(SNIFF_BYTES))
+
+
+def extension(content_type):
+    return EXTENSIONS.get(content_type, '')
@@ -1,14 +1,53 @@
 # members/forms.py
 from django import forms
 from django.contrib.auth.forms import UserCreationForm, UserChangeForm, ReadOnlyPasswordHashField
-from .models import Member, MemberDocument
+from django.core.exceptions import ValidationError
+from .models import DocumentUpload, Member, MemberDocument
 from django.forms import modelformset_factory
 from django import forms
 from .models import Subscription
 from datetime import date
+import os
 from .models import Sector, Instructor
 
 from .models import Payment, Package
+from .config_cache import config_snapshot, package_choices
+from .uploads import max_size, validate_document_file
+
+
+# ---------------------------------------------------------------------
+#  Campi a scelta con le opzioni lette dalla cache di configurazione
+#  (members/config_cache.py). Il queryset serve solo a validare il valore.
+# ---------------------------------------------------------------------
+class CachedModelChoiceField(forms.ModelChoiceField):
+
+    def __init__(self, queryset, choices_func, **kwargs):
+        # Le scelte si leggono alla creazione di ogni form (deepcopy del
+        # campo), non alla definizione della classe: niente query all'import.
+        self.choices_func = list
+        super().__init__(queryset, **kwargs)
+        self.choices_func = choices_func
+
+    def _get_choices(self):
+        choices = list(self.choices_func())
+        if self.empty_label is not None:
+            choices.insert(0, ('', self.empty_label))
+        return choices
+
+    choices = property(_get_choices, forms.ChoiceField.choices.fset)
+
+
+class CachedModelMultipleChoiceField(forms.ModelMultipleChoiceField):
+
+    def __init__(self, queryset, choices_func, **kwargs):
+        self.choices_func = list
+        super().__init__(queryset, **kwargs)
+        self.choices_func = choices_func
+
+    def _get_choices(self):
+        return list(self.choices_func())
+
+    choices = property(_get_choices, forms.ChoiceField.choices.fset)
 
 # =====================================================================
 #  FASE 3-LISTINO — Aggiungi a members/forms.py
@@ -104,6 +143,10 @@ class MemberDocumentForm(forms.ModelForm):
             ),
         }
 
+    def clean_file(self):
+        # tipo dai magic bytes e limite di dimensione (members/uploads.py)
+        return validate_document_file(self.cleaned_data.get('file'))
+
 
 class AdminMemberDocumentForm(forms.ModelForm):
     class Meta:
@@ -118,6 +161,28 @@ class AdminMemberDocumentForm(forms.ModelForm):
             ),
         }
 
+    def clean_file(self):
+        return validate_document_file(self.cleaned_data.get('file'))
+
+
+class DocumentUploadForm(forms.ModelForm):
+    """Avvio di un caricamento a blocchi (POST /members/uploads/)."""
+
+    class Meta:
+        model = DocumentUpload
+        fields = ['member', 'document_type', 'expiration_date', 'description', 'filename', 'size']
+
+    def clean_filename(self):
+        return os.path.basename(self.cleaned_data['filename'].replace('\\', '/'))
+
+    def clean_size(self):
+        size = self.cleaned_data['size']
+        if not size:
+            raise ValidationError("Il file e' vuoto.")
+        if size > max_size():
+            raise ValidationError("File troppo grande.")
+        return size
+
 # Formset per più documenti
 MemberDocumentFormSet = modelformset_factory(
     MemberDocument,
@@ -133,6 +198,11 @@ MemberDocumentFormSet = modelformset_factory(
 #  Tipo e settore vengono dedotti dal pacchetto nel save() del modello.
 # ---------------------------------------------------------------------
 class SubscriptionForm(forms.ModelForm):
+    package = CachedModelChoiceField(
+        Package.objects.filter(is_active=True).select_related('sector'), package_choices,
+        label="Pacchetto", required=True,
+    )
+
     class Meta:
         model = Subscription
         fields = ['package', 'start_date']
@@ -144,12 +214,12 @@ class SubscriptionForm(forms.ModelForm):
             'start_date': 'Data inizio',
         }
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.fields['package'].queryset = (
-            Package.objects.filter(is_active=True).select_related('sector')
-        )
-        self.fields['package'].required = True
+    def clean(self):
+        cleaned = super().clean()
+        # la data fine viene ricalcolata dal pacchetto al salvataggio (vedi
+        # subscription_edit): il controllo delle sovrapposizioni usa quella
+        self.instance.end_date = None
+        return cleaned
 
 
 # ---------------------------------------------------------------------
@@ -158,8 +228,8 @@ class SubscriptionForm(forms.ModelForm):
 #  prezzo del pacchetto. Lo sconto resta modificabile.
 # ---------------------------------------------------------------------
 class SubscriptionWithPaymentForm(forms.Form):
-    package = forms.ModelChoiceField(
-        queryset=Package.objects.filter(is_active=True).select_related('sector'),
+    package = CachedModelChoiceField(
+        Package.objects.filter(is_active=True).select_related('sector'), package_choices,
         label="Pacchetto", required=True,
     )
     start_date = forms.DateField(
@@ -180,12 +250,25 @@ class SubscriptionWithPaymentForm(forms.Form):
     )
     is_paid = forms.BooleanField(label="Pagato", required=False, initial=True)
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, member=None, **kwargs):
         super().__init__(*args, **kwargs)
+        self.member = member
         # Popola le scelte di modalita' dal modello (import locale: evita cicli)
         from .models import Payment
         self.fields['payment_mode'].choices = [('', '---')] + list(Payment.PaymentMode.choices)
 
+    def clean(self):
+        """Rifiuta un abbonamento sovrapposto a un altro dello stesso settore."""
+        cleaned = super().clean()
+        member = cleaned.get('member') or self.member
+        package, start_date = cleaned.get('package'), cleaned.get('start_date')
+        if member and package and start_date:
+            try:
+                Subscription(member=member, package=package, start_date=start_date).validate_overlap()
+            except ValidationError as error:
+                self.add_error(None, error)
+        return cleaned
+
 
 class SectorForm(forms.ModelForm):
     class Meta:
@@ -201,6 +284,11 @@ class SectorForm(forms.ModelForm):
 
 
 class InstructorForm(forms.ModelForm):
+    sectors = CachedModelMultipleChoiceField(
+        Sector.objects.all(), list, label='Settori/discipline', required=False,
+        widget=forms.CheckboxSelectMultiple(),
+    )
+
     class Meta:
         model = Instructor
         fields = ['first_name', 'last_name', 'sectors', 'is_active']
@@ -214,6 +302,17 @@ class InstructorForm(forms.ModelForm):
             'is_active': 'Attivo',
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Settori attivi, piu' quelli gia' assegnati (anche se disattivati)
+        assigned = {getattr(s, 'pk', s) for s in self.initial.get('sectors') or []}
+        field = self.fields['sectors']
+        field.choices_func = lambda: [
+            (row['id'], row['name']) for row in config_snapshot()['sectors']
+            if row['is_active'] or row['id'] in assigned
+        ]
+        field.widget.choices = field.choices
+
 class PaymentForm(forms.ModelForm):
     class Meta:
         model = Payment
@@ -244,7 +343,8 @@ class PaymentForm(forms.ModelForm):
         self.fields['subscription'].required = False
         self.fields['enrollment_amount'].required = False
         if member is not None:
-            self.fields['subscription'].queryset = member.subscriptions.all()
+            # __str__ dell'abbonamento usa il settore: una query sola per tutte le opzioni
+            self.fields['subscription'].queryset = member.subscriptions.select_related('sector')
 
 class SubscriptionWithPaymentAndMemberForm(SubscriptionWithPaymentForm):
     member = forms.ModelChoiceField(
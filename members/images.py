@@ -0,0 +1,114 @@
+# members/images.py
+# Miniature delle foto dei soci.
+#
+# La foto resta com'e' stata caricata; fuori dalla richiesta (attivita'
+# "images.photo_variants" del worker, o `manage.py build_photo_variants`)
+# se ne ricavano quadrati da THUMB_SIZES pixel in WebP e JPEG, salvati per
+# SHA-256 della foto:
+#   photos/variants/ab/ab12...ef/96.webp
+# Stessa foto -> stesse miniature, generate una volta. A miniature pronte
+# il checksum va in Member.photo_checksum e il tag {% member_avatar %}
+# (templatetags/member_images.py) emette srcset che puntano a
+# members:member_photo ?size=..&format=..: una pagina di 50 soci scarica
+# qualche KB per avatar invece delle foto originali. Senza miniature il
+# tag mostra le iniziali (mai la foto intera).
+
+import logging
+import os
+import shutil
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .jobs import enqueue, task
+from .models import Member
+from .storage import checksum_of
+
+logger = logging.getLogger('members.images')
+
+THUMB_SIZES = (48, 96, 192)
+FORMATS = {  # formato nell'URL -> (formato Pillow, estensione, opzioni)
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+VARIANTS_DIR = 'photos/variants'
+
+
+def variant_name(checksum, size, fmt):
+    return f'{VARIANTS_DIR}/{checksum[:2]}/{checksum}/{size}.{FORMATS[fmt][1]}'
+
+
+def build_variants(fileobj, checksum, storage=default_storage):
+    """Crea le miniature mancanti della foto `fileobj`. Restituisce i nomi creati."""
+    created = []
+    with Image.open(fileobj) as image:
+        # JPEG: decodifica gia' ridotta (molto piu' veloce sulle foto da fotocamera)
+        image.draft('RGB', (max(THUMB_SIZES) * 2, max(THUMB_SIZES) * 2))
+        image = ImageOps.exif_transpose(image)  # orientamento della fotocamera
+        if image.mode not in ('RGB', 'L'):
+            background = Image.new('RGB', image.size, 'white')  # trasparenza su bianco
+            background.paste(image.convert('RGBA'), mask=image.convert('RGBA').getchannel('A'))
+            image = background
+        for size in THUMB_SIZES:
+            thumb = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+            for fmt, (pil_format, _, options) in FORMATS.items():
+                name = variant_name(checksum, size, fmt)
+                if storage.exists(name):
+                    continue
+                buffer = BytesIO()
+                thumb.save(buffer, pil_format, **options)
+                created.append(storage.save(name, ContentFile(buffer.getvalue())))
+    return created
+
+
+def process_photo(member, storage=default_storage):
+    """
+    Miniature della foto attuale di `member`; segna photo_checksum solo
+    se nel frattempo la foto non e' cambiata. Restituisce il checksum
+    ('' se la foto manca o non e' un'immagine leggibile).
+    """
+    if not member.photo:
+        return ''
+    name = member.photo.name
+    try:
+        with member.photo.open('rb') as fh:
+            checksum = checksum_of(fh)
+            fh.seek(0)
+            build_variants(fh, checksum, storage)
+    except (FileNotFoundError, UnidentifiedImageError, Image.DecompressionBombError) as e:
+        logger.warning("Foto del socio %s non elaborata (%s): %s", member.pk, name, e)
+        return ''
+    Member.objects.filter(pk=member.pk, photo=name).update(photo_checksum=checksum)
+    member.photo_checksum = checksum
+    return checksum
+
+
+def schedule(member):
+    """Accoda le miniature della foto di `member` (una volta per file)."""
+    return enqueue(
+        'images.photo_variants', {'member_id': member.pk, 'photo': member.photo.name},
+        key=f'photo-variants:{member.pk}:{member.photo.name}',
+    )
+
+
+@task('images.photo_variants')
+def photo_variants(member_id, photo):
+    member = Member.objects.filter(pk=member_id, photo=photo).first()
+    if member is not None:  # foto cambiata: ci pensa il lavoro della nuova
+        process_photo(member)
+
+
+def prune_variants(storage=default_storage, dry_run=False):
+    """Elimina le miniature di foto che nessun socio usa piu'. Restituisce quante cartelle."""
+    used = set(Member.objects.exclude(photo_checksum='').values_list('photo_checksum', flat=True))
+    root = storage.path(VARIANTS_DIR)
+    removed = 0
+    for prefix in os.listdir(root) if os.path.isdir(root) else ():
+        for checksum in os.listdir(os.path.join(root, prefix)):
+            if checksum not in used:
+                if not dry_run:
+                    shutil.rmtree(os.path.join(root, prefix, checksum))
+                removed += 1
+    return removed
@@ -0,0 +1,609 @@
+# members/importers.py
+# Import in blocco dall'export del gestionale Access.
+#
+# Quattro archivi, importati in quest'ordine: soci, affiliazioni, quote,
+# certificati. Ogni file (CSV o XLSX) viene letto in streaming, le
+# righe sono convertite in oggetti del modello e scritte a blocchi con
+# bulk_create / bulk_update, un blocco per transazione. I riferimenti
+# (settore, ente, insegnante, genitore, socio) si risolvono con mappe in
+# memoria caricate una sola volta: nessuna query per riga.
+#
+# Dopo ogni blocco salvato si aggiorna il checkpoint (file JSON): se
+# l'import si interrompe, rilanciandolo riparte dalla riga successiva.
+# Rileggere righe gia' salvate (checkpoint perso, import rilanciato) non
+# duplica nulla: soci e affiliazioni si aggiornano per tessera / ente,
+# quote e certificati per chiave naturale (import_key, univoca). Per le
+# quote la chiave contiene il numero di ricevuta o, se manca, la riga del
+# foglio: due rate identiche restano due pagamenti.
+# Le righe scartate finiscono nel report degli errori (CSV) con il motivo.
+
+import csv
+import json
+import os
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+
+from .models import (
+    Affiliation, Instructor, Member, MemberDocument, Payment, Sector, SportsBody,
+)
+from .rollup import refresh_daily_stats
+from .status import refresh_member_status
+
+KINDS = ('soci', 'affiliazioni', 'quote', 'certificati')
+
+# Nomi di colonna accettati (dopo la normalizzazione: minuscolo, spazi -> _)
+COLUMNS = {
+    'card_number': ('tessera', 'n_tessera', 'numero_tessera', 'card_number'),
+    'last_name': ('cognome', 'last_name'),
+    'first_name': ('nome', 'first_name'),
+    'fiscal_code': ('codice_fiscale', 'cod_fiscale', 'cf', 'fiscal_code'),
+    'sex': ('sesso', 'sex'),
+    'date_of_birth': ('data_nascita', 'data_di_nascita', 'nato_il', 'date_of_birth'),
+    'birth_place': ('luogo_nascita', 'luogo_di_nascita', 'nato_a', 'birth_place'),
+    'phone_number': ('cellulare', 'cell', 'phone_number'),
+    'phone_home': ('telefono', 'telefono_casa', 'tel', 'phone_home'),
+    'email': ('email', 'e_mail', 'mail'),
+    'address': ('indirizzo', 'address'),
+    'residence_city': ('comune', 'citta', 'comune_residenza', 'residence_city'),
+    'province': ('provincia', 'prov', 'province'),
+    'postal_code': ('cap', 'postal_code'),
+    'registration_date': ('data_registrazione', 'data_iscrizione', 'registration_date'),
+    'is_dismissed': ('dimesso', 'cessato', 'is_dismissed'),
+    'sector': ('settore', 'disciplina', 'sector'),
+    'instructor': ('insegnante', 'istruttore', 'instructor'),
+    'guardian': ('tessera_genitore', 'genitore', 'tutore', 'guardian'),
+    'notes': ('note', 'notes'),
+    # affiliazioni
+    'body': ('ente', 'federazione', 'body'),
+    'federal_card': ('tessera_federale', 'federal_card'),
+    'federal_card_expiry': ('scadenza_tessera', 'scadenza_tessera_federale', 'federal_card_expiry'),
+    'federal_license': ('licenza', 'licenza_federale', 'federal_license'),
+    'affiliation_year': ('anno', 'anno_affiliazione', 'affiliation_year'),
+    # quote
+    'payment_type': ('tipo', 'tipo_quota', 'payment_type'),
+    'payment_date': ('data_pagamento', 'pagato_il', 'payment_date'),
+    'due_date': ('scadenza', 'data_scadenza', 'due_date'),
+    'next_due_date': ('prossima_scadenza', 'next_due_date'),
+    'amount': ('quota', 'importo', 'amount'),
+    'enrollment_amount': ('iscrizione', 'quota_iscrizione', 'enrollment_amount'),
+    'discount': ('sconto', 'discount'),
+    'payment_mode': ('modalita', 'modalità', 'pagamento', 'payment_mode'),
+    'fee_code': ('tariffa', 'fee_code'),
+    'is_paid': ('pagato', 'is_paid'),
+    'receipt': ('ricevuta', 'n_ricevuta', 'numero_ricevuta', 'receipt'),
+    # certificati
+    'document_type': ('tipo_documento', 'tipo', 'document_type'),
+    'expiration_date': ('scadenza', 'data_scadenza', 'expiration_date'),
+    'file': ('file', 'percorso', 'allegato'),
+    'description': ('descrizione', 'description'),
+}
+
+MEMBER_FIELDS = [
+    'first_name', 'last_name', 'email', 'fiscal_code', 'sex', 'date_of_birth',
+    'birth_place', 'phone_number', 'phone_home', 'address', 'residence_city',
+    'province', 'postal_code', 'registration_date', 'is_dismissed', 'sector_id',
+    'instructor_id', 'notes',
+]
+
+AFFILIATION_FIELDS = ['federal_card', 'federal_card_expiry', 'federal_license', 'affiliation_year']
+
+PAYMENT_FIELDS = [
+    'payment_type', 'payment_date', 'due_date', 'next_due_date', 'amount', 'enrollment_amount',
+    'discount', 'payment_mode', 'fee_code', 'is_paid',
+]
+
+DOCUMENT_FIELDS = ['document_type', 'expiration_date', 'file', 'description']
+
+DATE_FORMATS = ('%d/%m/%Y', '%Y-%m-%d', '%d-%m-%Y', '%d/%m/%y', '%d.%m.%Y')
+TRUE_VALUES = {'s', 'si', 'sì', 'y', 'yes', 'true', 'vero', '1', 'x', '-1'}
+FALSE_VALUES = {'n', 'no', 'false', 'falso', '0', ''}
+
+
+class ImporterError(Exception):
+    """Errore che blocca l'import (file illeggibile, dipendenza mancante)."""
+
+
+class RowError(ValueError):
+    """Riga non importabile: il messaggio finisce nel report degli errori."""
+
+
+# ---------------------------------------------------------------------------
+#  LETTURA IN STREAMING
+# ---------------------------------------------------------------------------
+def _normalize_header(name):
+    return str(name or '').strip().lower().replace(' ', '_').replace('.', '').replace('-', '_')
+
+
+def read_rows(path, delimiter=None, encoding='utf-8-sig'):
+    """
+    Restituisce (numero_riga, dict) per ogni riga dati del file.
+    La riga 1 e' l'intestazione. Non carica mai il file intero in memoria.
+    """
+    if path.lower().endswith(('.xlsx', '.xlsm')):
+        yield from _read_xlsx(path)
+        return
+    with open(path, newline='', encoding=encoding) as fh:
+        if delimiter is None:
+            sample = fh.readline()
+            fh.seek(0)
+            delimiter = ';' if sample.count(';') >= sample.count(',') else ','
+        reader = csv.reader(fh, delimiter=delimiter)
+        header = [_normalize_header(h) for h in next(reader, [])]
+        for number, values in enumerate(reader, start=2):
+            if not any(v.strip() for v in values):
+                continue
+            yield number, dict(zip(header, values))
+
+
+def _read_xlsx(path):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:  # dipendenza facoltativa
+        raise ImporterError("Per importare file .xlsx installare il pacchetto 'openpyxl'.")
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [_normalize_header(h) for h in next(rows, ())]
+        for number, values in enumerate(rows, start=2):
+            if not any(v not in (None, '') for v in values):
+                continue
+            yield number, dict(zip(header, values))
+    finally:
+        workbook.close()
+
+
+# ---------------------------------------------------------------------------
+#  CONVERSIONE DEI VALORI
+# ---------------------------------------------------------------------------
+def get(row, field, required=False):
+    """Valore (ripulito) della colonna `field`, cercata tra i suoi alias."""
+    for alias in COLUMNS[field]:
+        if alias in row:
+            value = row[alias]
+            if isinstance(value, str):
+                value = value.strip()
+            if value not in (None, ''):
+                return value
+    if required:
+        raise RowError(f"Campo obbligatorio mancante: {COLUMNS[field][0]}")
+    return None
+
+
+def text(row, field, max_length=None, required=False):
+    value = get(row, field, required)
+    if value is None:
+        return ''
+    value = str(value)
+    if max_length and len(value) > max_length:
+        raise RowError(f"{COLUMNS[field][0]}: valore troppo lungo ({len(value)} > {max_length})")
+    return value
+
+
+def parse_date(row, field, required=False):
+    value = get(row, field, required)
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    value = str(value).split(' ')[0]  # Access: "31/12/2023 0.00.00"
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    raise RowError(f"{COLUMNS[field][0]}: data non valida '{value}'")
+
+
+def parse_decimal(row, field, default=None):
+    value = get(row, field)
+    if value is None:
+        return default
+    if isinstance(value, (int, float, Decimal)):
+        return Decimal(str(value)).quantize(Decimal('0.01'))
+    cleaned = str(value).replace('€', '').replace(' ', '')
+    if ',' in cleaned:  # formato italiano: 1.234,50
+        cleaned = cleaned.replace('.', '').replace(',', '.')
+    try:
+        return Decimal(cleaned).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        raise RowError(f"{COLUMNS[field][0]}: importo non valido '{value}'")
+
+
+def parse_bool(row, field, default=False):
+    value = get(row, field)
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return value
+    value = str(value).strip().lower()
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    raise RowError(f"{COLUMNS[field][0]}: valore si/no non valido '{value}'")
+
+
+def parse_choice(row, field, choices, default=None):
+    """Accetta sia il codice (es. 'MONTHLY') sia l'etichetta ('Mensile')."""
+    value = get(row, field)
+    if value is None:
+        if default is None:
+            raise RowError(f"Campo obbligatorio mancante: {COLUMNS[field][0]}")
+        return default
+    wanted = str(value).strip().lower()
+    for code, label in choices:
+        if wanted in (str(code).lower(), str(label).lower()):
+            return code
+    raise RowError(f"{COLUMNS[field][0]}: valore non riconosciuto '{value}'")
+
+
+# ---------------------------------------------------------------------------
+#  CHECKPOINT E REPORT ERRORI
+# ---------------------------------------------------------------------------
+class Checkpoint:
+    """Ultima riga salvata per ciascun file, persistita su JSON."""
+
+    def __init__(self, path):
+        self.path = path
+        self.data = {'positions': {}, 'pending_guardians': []}
+        if path and os.path.exists(path):
+            with open(path, encoding='utf-8') as fh:
+                self.data.update(json.load(fh))
+
+    @staticmethod
+    def key(kind, source):
+        return f"{kind}:{os.path.abspath(source)}"
+
+    def position(self, kind, source):
+        return self.data['positions'].get(self.key(kind, source), 0)
+
+    def advance(self, kind, source, row_number):
+        self.data['positions'][self.key(kind, source)] = row_number
+        self.save()
+
+    def save(self):
+        if not self.path:
+            return
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as fh:
+            json.dump(self.data, fh)
+        os.replace(tmp, self.path)
+
+
+class ErrorReport:
+    """CSV con una riga per ogni record scartato."""
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self._fh = None
+        self._writer = None
+
+    def add(self, kind, row_number, message, row):
+        self.count += 1
+        if not self.path:
+            return
+        if self._writer is None:
+            new = not os.path.exists(self.path)
+            self._fh = open(self.path, 'a', newline='', encoding='utf-8')
+            self._writer = csv.writer(self._fh, delimiter=';')
+            if new:
+                self._writer.writerow(['archivio', 'riga', 'errore', 'dati'])
+        self._writer.writerow([kind, row_number, message, json.dumps(row, default=str)])
+
+    def close(self):
+        if self._fh:
+            self._fh.close()
+
+
+# ---------------------------------------------------------------------------
+#  MOTORE DI IMPORT
+# ---------------------------------------------------------------------------
+class AccessImporter:
+    """
+    Importa gli archivi Access. Uso tipico (vedi manage.py import_access):
+
+        importer = AccessImporter(batch_size=1000, checkpoint='import.json')
+        importer.run('soci', 'soci.csv')
+        importer.run('quote', 'quote.xlsx')
+        importer.finish()
+    """
+
+    def __init__(self, batch_size=1000, checkpoint=None, errors=None,
+                 create_missing=False, delimiter=None, encoding='utf-8-sig'):
+        self.batch_size = batch_size
+        self.checkpoint = Checkpoint(checkpoint)
+        self.errors = ErrorReport(errors)
+        self.create_missing = create_missing
+        self.delimiter = delimiter
+        self.encoding = encoding
+        self.stats = {kind: {'scritti': 0, 'scartati': 0, 'saltati': 0} for kind in KINDS}
+        self.touched_members = set()
+        self._load_lookups()
+
+    def _load_lookups(self):
+        self.sectors = {n.upper(): pk for pk, n in Sector.objects.values_list('pk', 'name')}
+        self.bodies = {}
+        for pk, name, code in SportsBody.objects.values_list('pk', 'name', 'code'):
+            self.bodies[name.upper()] = pk
+            if code:
+                self.bodies[code.upper()] = pk
+        self.instructors = {}
+        for pk, first, last in Instructor.objects.values_list('pk', 'first_name', 'last_name'):
+            self.instructors[f"{last} {first}".strip().upper()] = pk
+            self.instructors[f"{first} {last}".strip().upper()] = pk
+        self.members_by_card = dict(
+            Member.objects.exclude(card_number=None).values_list('card_number', 'pk')
+        )
+        self.usernames = set(Member.objects.values_list('username', flat=True).iterator())
+
+    # --- riferimenti --------------------------------------------------------
+    def _member_id(self, row):
+        card = text(row, 'card_number', required=True)
+        member_id = self.members_by_card.get(card)
+        if member_id is None:
+            raise RowError(f"Socio con tessera '{card}' inesistente")
+        return member_id
+
+    def _sector_id(self, name):
+        if not name:
+            return None
+        key = name.upper()
+        if key not in self.sectors:
+            if not self.create_missing:
+                raise RowError(f"Settore '{name}' non configurato")
+            self.sectors[key] = Sector.objects.create(name=name).pk
+        return self.sectors[key]
+
+    def _body_id(self, name):
+        key = name.upper()
+        if key not in self.bodies:
+            if not self.create_missing:
+                raise RowError(f"Ente '{name}' non configurato")
+            self.bodies[key] = SportsBody.objects.create(name=name, code=name[:20]).pk
+        return self.bodies[key]
+
+    def _instructor_id(self, name):
+        if not name:
+            return None
+        key = ' '.join(name.split()).upper()
+        if key not in self.instructors:
+            if not self.create_missing:
+                raise RowError(f"Insegnante '{name}' non configurato")
+            last, _, first = name.partition(' ')
+            self.instructors[key] = Instructor.objects.create(
+                first_name=first or last, last_name=last if first else '',
+            ).pk
+        return self.instructors[key]
+
+    # --- conversione riga -> oggetto ------------------------------------------
+    def parse_soci(self, row, number):
+        card = text(row, 'card_number', max_length=30, required=True)
+        sex = text(row, 'sex').upper()[:1]
+        if sex and sex not in Member.Sex.values:
+            raise RowError(f"sesso: valore non valido '{sex}'")
+        member = Member(
+            card_number=card,
+            last_name=text(row, 'last_name', 150, required=True),
+            first_name=text(row, 'first_name', 150, required=True),
+            email=text(row, 'email', 254),
+            fiscal_code=text(row, 'fiscal_code', 16).upper(),
+            sex=sex,
+            date_of_birth=parse_date(row, 'date_of_birth'),
+            birth_place=text(row, 'birth_place', 120),
+            phone_number=text(row, 'phone_number', 20),
+            phone_home=text(row, 'phone_home', 20),
+            address=text(row, 'address', 255),
+            residence_city=text(row, 'residence_city', 120),
+            province=text(row, 'province', 2).upper(),
+            postal_code=text(row, 'postal_code', 5),
+            registration_date=parse_date(row, 'registration_date'),
+            is_dismissed=parse_bool(row, 'is_dismissed'),
+            sector_id=self._sector_id(text(row, 'sector')),
+            instructor_id=self._instructor_id(text(row, 'instructor')),
+            notes=text(row, 'notes'),
+        )
+        member._guardian_card = text(row, 'guardian')
+        return member
+
+    def parse_affiliazioni(self, row, number):
+        return Affiliation(
+            member_id=self._member_id(row),
+            body_id=self._body_id(text(row, 'body', required=True)),
+            federal_card=text(row, 'federal_card', 50),
+            federal_card_expiry=parse_date(row, 'federal_card_expiry'),
+            federal_license=text(row, 'federal_license', 50),
+            affiliation_year=text(row, 'affiliation_year', 20),
+        )
+
+    def parse_quote(self, row, number):
+        payment = Payment(
+            member_id=self._member_id(row),
+            payment_type=parse_choice(row, 'payment_type', Payment.PaymentType.choices),
+            payment_date=parse_date(row, 'payment_date'),
+            due_date=parse_date(row, 'due_date'),
+            next_due_date=parse_date(row, 'next_due_date'),
+            amount=parse_decimal(row, 'amount', Decimal('0')),
+            enrollment_amount=parse_decimal(row, 'enrollment_amount'),
+            discount=parse_decimal(row, 'discount', Decimal('0')),
+            payment_mode=self._payment_mode(row),
+            fee_code=text(row, 'fee_code', 5).upper(),
+            is_paid=parse_bool(row, 'is_paid', default=True),
+        )
+        if not payment.next_due_date:
+            payment.next_due_date = payment.compute_next_due_date()
+        # socio + ricevuta; senza ricevuta socio + tipo + scadenza (o data
+        # di pagamento) + importo + riga: stesso foglio riletto, stesse chiavi
+        receipt = text(row, 'receipt', 30)
+        if receipt:
+            payment.import_key = f"{payment.member_id}|ricevuta|{receipt}"
+        else:
+            payment.import_key = '|'.join(str(v) for v in (
+                payment.member_id, payment.payment_type,
+                payment.due_date or payment.payment_date or '', payment.amount, number,
+            ))
+        return payment
+
+    def _payment_mode(self, row):
+        value = text(row, 'payment_mode')
+        if not value:
+            return ''
+        if value.upper() in ('POS', 'BONIFICO'):
+            return Payment.PaymentMode.BANK
+        return parse_choice(row, 'payment_mode', Payment.PaymentMode.choices)
+
+    def parse_certificati(self, row, number):
+        document = MemberDocument(
+            member_id=self._member_id(row),
+            document_type=parse_choice(
+                row, 'document_type', MemberDocument.DocumentType.choices,
+                default=MemberDocument.DocumentType.MEDICAL_CERTIFICATE,
+            ),
+            expiration_date=parse_date(row, 'expiration_date'),
+            file=text(row, 'file', 100),
+            description=text(row, 'description'),
+        )
+        # socio + tipo + scadenza
+        document.import_key = f"{document.member_id}|{document.document_type}|{document.expiration_date or ''}"
+        return document
+
+    # --- scrittura a blocchi --------------------------------------------------
+    def write_soci(self, members):
+        # in un blocco vince l'ultima riga con la stessa tessera
+        by_card = {m.card_number: m for m in members}
+        existing = dict(
+            Member.objects.filter(card_number__in=list(by_card))
+            .values_list('card_number', 'pk')
+        )
+        to_update, to_create = [], []
+        for card, member in by_card.items():
+            if card in existing:
+                member.pk = existing[card]
+                to_update.append(member)
+            else:
+                member.username = self._username(card)
+                member.password = make_password(None)
+                to_create.append(member)
+        if to_update:
+            Member.objects.bulk_update(to_update, MEMBER_FIELDS, batch_size=self.batch_size)
+        if to_create:
+            Member.objects.bulk_create(to_create, batch_size=self.batch_size)
+
+        pending = []
+        for member in by_card.values():
+            self.members_by_card[member.card_number] = member.pk
+            self.touched_members.add(member.pk)
+            if member._guardian_card:
+                pending.append([member.card_number, member._guardian_card])
+        self.checkpoint.data['pending_guardians'].extend(pending)
+        return len(by_card)
+
+    def _username(self, card):
+        base = card.replace('/', '-').replace(' ', '').lower()[:140]
+        username, n = base, 1
+        while username in self.usernames:
+            n += 1
+            username = f"{base}-{n}"
+        self.usernames.add(username)
+        return username
+
+    def write_affiliazioni(self, affiliations):
+        Affiliation.objects.bulk_create(
+            affiliations, batch_size=self.batch_size,
+            update_conflicts=True, unique_fields=['member', 'body'],
+            update_fields=AFFILIATION_FIELDS,
+        )
+        return len(affiliations)
+
+    def write_quote(self, payments):
+        # in un blocco vince l'ultima riga con la stessa chiave
+        payments = list({p.import_key: p for p in payments}.values())
+        Payment.objects.bulk_create(
+            payments, batch_size=self.batch_size,
+            update_conflicts=True, unique_fields=['import_key'], update_fields=PAYMENT_FIELDS,
+        )
+        self.touched_members.update(p.member_id for p in payments)
+        return len(payments)
+
+    def write_certificati(self, documents):
+        documents = list({d.import_key: d for d in documents}.values())
+        MemberDocument.objects.bulk_create(
+            documents, batch_size=self.batch_size,
+            update_conflicts=True, unique_fields=['import_key'], update_fields=DOCUMENT_FIELDS,
+        )
+        self.touched_members.update(d.member_id for d in documents)
+        return len(documents)
+
+    def link_guardians(self):
+        """
+        Collega i minori al genitore. Fatto a fine import (non riga per riga),
+        cosi' il vincolo Access "prima il genitore" non conta piu'.
+        """
+        pending = self.checkpoint.data['pending_guardians']
+        if not pending:
+            return 0
+        to_update = []
+        for card, guardian_card in pending:
+            member_id = self.members_by_card.get(card)
+            guardian_id = self.members_by_card.get(guardian_card)
+            if member_id is None:
+                continue
+            if guardian_id is None or guardian_id == member_id:
+                self.errors.add('soci', '-', f"Genitore con tessera '{guardian_card}' inesistente",
+                                {'tessera': card, 'tessera_genitore': guardian_card})
+                continue
+            to_update.append(Member(pk=member_id, guardian_id=guardian_id))
+        with transaction.atomic():
+            Member.objects.bulk_update(to_update, ['guardian_id'], batch_size=self.batch_size)
+        self.checkpoint.data['pending_guardians'] = []
+        self.checkpoint.save()
+        return len(to_update)
+
+    # --- ciclo principale ---------------------------------------------------
+    def run(self, kind, source):
+        """Importa un archivio. Restituisce le statistiche di quell'archivio."""
+        if kind not in KINDS:
+            raise ValueError(f"Archivio sconosciuto: {kind}")
+        parse = getattr(self, f'parse_{kind}')
+        write = getattr(self, f'write_{kind}')
+        stats = self.stats[kind]
+        start_after = self.checkpoint.position(kind, source)
+
+        batch, last_row = [], start_after
+        for number, row in read_rows(source, self.delimiter, self.encoding):
+            if number <= start_after:
+                stats['saltati'] += 1
+                continue
+            last_row = number
+            try:
+                batch.append(parse(row, number))
+            except RowError as exc:
+                stats['scartati'] += 1
+                self.errors.add(kind, number, str(exc), row)
+            if len(batch) >= self.batch_size:
+                self._flush(kind, source, write, batch, last_row)
+                batch = []
+        self._flush(kind, source, write, batch, last_row)
+        return stats
+
+    def _flush(self, kind, source, write, batch, last_row):
+        if batch:
+            with transaction.atomic():
+                self.stats[kind]['scritti'] += write(batch)
+        if last_row > self.checkpoint.position(kind, source):
+            self.checkpoint.advance(kind, source, last_row)
+
+    def finish(self):
+        """Collega i genitori e ricalcola lo stato dei soci toccati."""
+        linked = self.link_guardians()
+        refresh_daily_stats()  # bulk_create non invia i signal (invalida anche i grafici)
+        touched = sorted(self.touched_members)
+        for i in range(0, len(touched), self.batch_size):
+            refresh_member_status(touched[i:i + self.batch_size], batch_size=self.batch_size)
+        self.errors.close()
+        return linked
@@ -0,0 +1,188 @@
+# members/jobs.py
+# Coda di lavori su database, eseguita da `manage.py run_worker`.
+#
+# Le view (e i comandi) accodano con enqueue() e rispondono subito; il
+# worker prende i lavori pronti uno alla volta:
+#   - presa in carico con un UPDATE condizionato (status='QUEUED'): con
+#     piu' worker in parallelo ogni lavoro viene eseguito da uno solo,
+#     su qualunque database;
+#   - errore -> nuovo tentativo con attesa crescente (1, 2, 4... minuti)
+#     fino a max_attempts, poi FAILED con il traceback in last_error;
+#   - un lavoro RUNNING da piu' di LOCK_TIMEOUT (worker terminato a meta')
+#     torna in coda;
+#   - idempotency_key (unica) evita di accodare due volte lo stesso lavoro;
+#   - i lavori DONE e FAILED si eliminano dopo SGS_JOB_RETENTION_DAYS giorni
+#     (purge_finished, una volta al giorno da run_worker): la tabella resta
+#     grande quanto la coda recente.
+# L'esecuzione e' "almeno una volta": un'attivita' deve poter essere
+# ripetuta senza danni (le notifiche ricontrollano lo stato prima di inviare).
+
+import logging
+import os
+import socket
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+
+LOCK_TIMEOUT = timedelta(minutes=30)
+MAX_BACKOFF = timedelta(hours=6)
+CLAIM_BATCH = 20
+
+
+def task(name):
+    """Registra una funzione come attivita' eseguibile dalla coda."""
+    def register(func):
+        TASKS[name] = func
+        return func
+    return register
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+# ---------------------------------------------------------------------------
+#  ACCODAMENTO
+# ---------------------------------------------------------------------------
+def enqueue(task_name, payload=None, key=None, run_at=None, max_attempts=5):
+    """
+    Accoda un lavoro e lo restituisce. Se esiste gia' un lavoro con la
+    stessa `key` non ne crea un altro e restituisce quello esistente.
+    """
+    if task_name not in TASKS:
+        raise KeyError(f"Attività sconosciuta: {task_name}")
+    job = Job(
+        task=task_name, payload=payload or {}, idempotency_key=key,
+        run_at=run_at or timezone.now(), max_attempts=max_attempts,
+    )
+    if key is None:
+        job.save()
+        return job
+    try:
+        with transaction.atomic():
+            job.save()
+    except IntegrityError:
+        return Job.objects.get(idempotency_key=key)
+    return job
+
+
+def enqueue_many(jobs, batch_size=1000):
+    """
+    Accoda in blocco (lista di Job non salvati). I lavori con una chiave
+    gia' presente vengono ignorati: rilanciare lo stesso smistamento non
+    duplica nulla.
+    """
+    return Job.objects.bulk_create(jobs, batch_size=batch_size, ignore_conflicts=True)
+
+
+# ---------------------------------------------------------------------------
+#  ESECUZIONE
+# ---------------------------------------------------------------------------
+def requeue_stale(now=None):
+    """Rimette in coda i lavori rimasti RUNNING oltre LOCK_TIMEOUT."""
+    now = now or timezone.now()
+    stale = Job.objects.filter(status=Job.Status.RUNNING, locked_at__lt=now - LOCK_TIMEOUT)
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.Status.FAILED, finished_at=now, last_error="Worker interrotto (timeout).",
+    )
+    requeued = stale.update(status=Job.Status.QUEUED, locked_by='', locked_at=None)
+    return requeued + failed
+
+
+def claim(worker, now=None):
+    """
+    Prende in carico il prossimo lavoro pronto (o None). L'UPDATE riesce
+    solo se il lavoro e' ancora QUEUED: se un altro worker e' arrivato
+    prima si passa al candidato successivo.
+    """
+    now = now or timezone.now()
+    candidates = (
+        Job.objects.filter(status=Job.Status.QUEUED, run_at__lte=now)
+        .order_by('run_at', 'id').values_list('pk', flat=True)[:CLAIM_BATCH]
+    )
+    for pk in candidates:
+        taken = Job.objects.filter(pk=pk, status=Job.Status.QUEUED).update(
+            status=Job.Status.RUNNING, locked_by=worker, locked_at=now,
+            attempts=F('attempts') + 1,
+        )
+        if taken:
+            return Job.objects.get(pk=pk)
+    return None
+
+
+def retention_days():
+    return getattr(settings, 'SGS_JOB_RETENTION_DAYS', 90)
+
+
+def purge_finished(older_than, now=None, batch_size=1000):
+    """
+    Elimina i lavori DONE e FAILED terminati da piu' di `older_than`, a
+    blocchi (transazioni brevi). Restituisce il numero di lavori eliminati.
+    Con loro spariscono le chiavi di idempotenza: `older_than` deve essere
+    piu' lungo del periodo in cui la stessa chiave puo' essere riaccodata.
+    """
+    now = now or timezone.now()
+    finished = Job.objects.filter(
+        status__in=[Job.Status.DONE, Job.Status.FAILED], finished_at__lt=now - older_than,
+    )
+    purged = 0
+    while True:
+        pks = list(finished.values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return purged
+        purged += Job.objects.filter(pk__in=pks).delete()[0]
+
+
+def backoff(attempts):
+    """Attesa prima del tentativo successivo: 1, 2, 4, 8... minuti."""
+    return min(timedelta(minutes=2 ** (attempts - 1)), MAX_BACKOFF)
+
+
+def run_job(job, worker):
+    """Esegue un lavoro preso in carico e ne registra l'esito."""
+    mine = Job.objects.filter(pk=job.pk, locked_by=worker, status=Job.Status.RUNNING)
+    func = TASKS.get(job.task)
+    try:
+        if func is None:
+            raise KeyError(f"Attività sconosciuta: {job.task}")
+        func(**job.payload)
+    except Exception:
+        now = timezone.now()
+        error = traceback.format_exc()
+        logger.warning("Lavoro %s (%s) fallito al tentativo %s", job.pk, job.task, job.attempts)
+        if job.attempts >= job.max_attempts or func is None:
+            mine.update(status=Job.Status.FAILED, finished_at=now, last_error=error)
+        else:
+            mine.update(
+                status=Job.Status.QUEUED, run_at=now + backoff(job.attempts),
+                locked_by='', locked_at=None, last_error=error,
+            )
+        return False
+    mine.update(status=Job.Status.DONE, finished_at=timezone.now(), last_error='')
+    return True
+
+
+def run_pending(worker=None, limit=None):
+    """
+    Esegue i lavori pronti finche' ce ne sono (al massimo `limit`).
+    Restituisce il numero di lavori eseguiti.
+    """
+    worker = worker or worker_name()
+    done = 0
+    while limit is None or done < limit:
+        job = claim(worker)
+        if job is None:
+            break
+        run_job(job, worker)
+        done += 1
+    return done
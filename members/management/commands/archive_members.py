@@ -0,0 +1,75 @@
+# members/management/commands/archive_members.py
+# Archivio dei soci dimessi e dei documenti scaduti (members/archive.py),
+# da cron una volta l'anno:
+#   python manage.py archive_members                  # dimessi / scaduti da piu' di SGS_ARCHIVE_YEARS anni
+#   python manage.py archive_members --years 3 --dry-run
+#   python manage.py archive_members --restore 123 456   # rimette i soci con questi ID
+#   python manage.py archive_members --restore-document 789
+
+from django.core.management.base import BaseCommand, CommandError
+
+from members.archive import ArchiveError, archive_documents, archive_members, restore, restore_document
+from members.models import ArchivedDocument, ArchivedMember
+
+
+class Command(BaseCommand):
+    help = "Sposta nell'archivio i soci dimessi e i documenti scaduti da anni (o li ripristina)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--years', type=int, help="Dimessi da piu' di N anni (default SGS_ARCHIVE_YEARS).")
+        parser.add_argument('--limit', type=int, help="Al massimo N soci (e N documenti) per esecuzione.")
+        parser.add_argument('--dry-run', action='store_true', help="Elenca senza archiviare.")
+        parser.add_argument(
+            '--restore', type=int, nargs='+', metavar='ID',
+            help="Ripristina i soci archiviati con questi ID socio.",
+        )
+        parser.add_argument(
+            '--restore-document', type=int, nargs='+', metavar='ID',
+            help="Ripristina i documenti archiviati con questi ID documento.",
+        )
+
+    def handle(self, *args, **options):
+        if options['restore']:
+            return self.restore(options['restore'])
+        if options['restore_document']:
+            return self.restore_documents(options['restore_document'])
+
+        kwargs = {'years': options['years'], 'limit': options['limit'], 'dry_run': options['dry_run']}
+        verb = "Da archiviare" if options['dry_run'] else "Archiviati"
+        done = archive_members(**kwargs)
+        for pk, name, year, missing in done:
+            note = f" (file mancanti: {len(missing)})" if missing else ""
+            self.stdout.write(f"  {pk:>6}  {name}  dimesso nel {year}{note}")
+        self.stdout.write(self.style.SUCCESS(f"{verb}: {len(done)} soci."))
+
+        done = archive_documents(**kwargs)
+        for pk, name, year, missing in done:
+            note = f" (file mancanti: {len(missing)})" if missing else ""
+            self.stdout.write(f"  {pk:>6}  {name}  scaduto nel {year}{note}")
+        self.stdout.write(self.style.SUCCESS(f"{verb}: {len(done)} documenti scaduti."))
+
+    def restore(self, member_ids):
+        archived = {a.member_id: a for a in ArchivedMember.objects.filter(member_id__in=member_ids)}
+        unknown = [str(pk) for pk in member_ids if pk not in archived]
+        if unknown:
+            raise CommandError(f"Soci non presenti nell'archivio: {', '.join(unknown)}.")
+        for pk in member_ids:
+            try:
+                member = restore(archived[pk])
+            except ArchiveError as e:
+                raise CommandError(str(e))
+            self.stdout.write(f"  {member.pk:>6}  {member}")
+        self.stdout.write(self.style.SUCCESS(f"Ripristinati: {len(member_ids)} soci."))
+
+    def restore_documents(self, document_ids):
+        archived = {a.document_id: a for a in ArchivedDocument.objects.filter(document_id__in=document_ids)}
+        unknown = [str(pk) for pk in document_ids if pk not in archived]
+        if unknown:
+            raise CommandError(f"Documenti non presenti nell'archivio: {', '.join(unknown)}.")
+        for pk in document_ids:
+            try:
+                document = restore_document(archived[pk])
+            except ArchiveError as e:
+                raise CommandError(str(e))
+            self.stdout.write(f"  {document.pk:>6}  {document}")
+        self.stdout.write(self.style.SUCCESS(f"Ripristinati: {len(document_ids)} documenti."))
@@ -0,0 +1,32 @@
+# members/management/commands/build_photo_variants.py
+# Miniature delle foto dei soci (members/images.py) senza passare dal worker:
+#   python manage.py build_photo_variants            # solo le foto senza miniature
+#   python manage.py build_photo_variants --all      # tutte (es. cambiate le dimensioni)
+#   python manage.py build_photo_variants --prune    # elimina le miniature di foto non piu' usate
+
+from django.core.management.base import BaseCommand
+
+from members.images import process_photo, prune_variants
+from members.models import Member
+
+
+class Command(BaseCommand):
+    help = "Genera le miniature WebP/JPEG delle foto dei soci."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="Rielabora anche le foto gia' pronte.")
+        parser.add_argument('--prune', action='store_true', help="Elimina le miniature orfane.")
+
+    def handle(self, *args, **options):
+        members = Member.objects.exclude(photo='').exclude(photo__isnull=True)
+        if not options['all']:
+            members = members.filter(photo_checksum='')
+        done = failed = 0
+        for member in members.iterator():
+            if process_photo(member):
+                done += 1
+            else:
+                failed += 1
+        self.stdout.write(self.style.SUCCESS(f"Foto elaborate: {done}, non leggibili: {failed}."))
+        if options['prune']:
+            self.stdout.write(f"Miniature orfane eliminate: {prune_variants()}.")
@@ -0,0 +1,60 @@
+# members/management/commands/document_storage_report.py
+# Spazio occupato dai documenti dei soci e risparmio della compressione
+# all'arrivo (members/compression.py):
+#   python manage.py document_storage_report            # totali per tipo
+#   python manage.py document_storage_report --top 20   # piu' i 20 documenti che hanno risparmiato di piu'
+
+from django.core.management.base import BaseCommand
+from django.template.defaultfilters import filesizeformat
+
+from members.compression import pdf_available, storage_report, top_savings
+
+
+def _percent(part, whole):
+    return f"{part * 100 / whole:.0f}%" if whole else "-"
+
+
+class Command(BaseCommand):
+    help = "Riporta lo spazio dei documenti prima e dopo la compressione."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=0, help="Elenca i N documenti col risparmio maggiore.")
+
+    def handle(self, *args, **options):
+        report = storage_report()
+        line = "{:<22} {:>9} {:>9} {:>11} {:>11} {:>11} {:>5}"
+        self.stdout.write(line.format("Tipo", "Documenti", "Elaborati", "All'arrivo", "Ora", "Risparmio", ""))
+        for row in report['types'] + [dict(report, type="Totale")]:
+            self.stdout.write(line.format(
+                row['type'][:22], row['documents'], row['compressed'],
+                filesizeformat(row['original']), filesizeformat(row['stored']),
+                filesizeformat(row['saved']), _percent(row['saved'], row['original']),
+            ))
+
+        self.stdout.write("")
+        self.stdout.write(
+            f"File distinti nell'archivio: {report['unique_files']}, "
+            f"{filesizeformat(report['unique_bytes'])} "
+            f"(deduplica: -{filesizeformat(report['stored'] - report['unique_bytes'])})."
+        )
+        self.stdout.write(
+            f"Originali conservati: {report['originals_kept']}, {filesizeformat(report['originals_bytes'])}."
+        )
+        self.stdout.write(f"Occupato sotto documents/ (orfani compresi): {filesizeformat(report['disk_bytes'])}.")
+        if not pdf_available():
+            self.stdout.write(self.style.WARNING(
+                "Pacchetto 'pypdf' non installato: i PDF non vengono compressi (pip install -r requirements.txt)."
+            ))
+        pending = report['documents'] - report['compressed']
+        if pending:
+            self.stdout.write(self.style.WARNING(
+                f"{pending} documenti non ancora elaborati: worker fermo? (gc_documents --compress)"
+            ))
+
+        if options['top']:
+            self.stdout.write("")
+            for document in top_savings(options['top']):
+                self.stdout.write(
+                    f"  {document.pk:>6}  {document.member}  {document.filename}: "
+                    f"{filesizeformat(document.original_size)} -> {filesizeformat(document.size)}"
+                )
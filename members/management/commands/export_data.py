@@ -0,0 +1,44 @@
+# members/management/commands/export_data.py
+# Esportazione da riga di comando (es. invio mensile a commercialista / enti):
+#   python manage.py export_data pagamenti --status unpaid -o insoluti.csv
+#   python manage.py export_data affiliazioni --ente CSEN --format xlsx -o csen.xlsx
+
+from django.core.management.base import BaseCommand, CommandError
+
+from members.exports import DATASETS, FORMATS, iter_csv, write_xlsx, xlsx_available
+
+
+class Command(BaseCommand):
+    help = "Esporta soci, abbonamenti, pagamenti o affiliazioni in CSV / XLSX."
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=sorted(DATASETS))
+        parser.add_argument('--format', choices=FORMATS, default='csv')
+        parser.add_argument('-o', '--output', help="File di destinazione (CSV: default stdout).")
+        parser.add_argument('--q', default='', help="Ricerca libera, come nelle liste.")
+        parser.add_argument('--status', default='', help="Filtro di stato, come nelle liste.")
+        parser.add_argument('--sector', default='', help="Soci: id del settore.")
+        parser.add_argument('--ente', default='', help="Affiliazioni: sigla o nome dell'ente.")
+        parser.add_argument('--anno', default='', help="Affiliazioni: anno (es. 2024/2025).")
+
+    def handle(self, *args, **options):
+        export = DATASETS[options['dataset']]
+        params = {key: options[key] for key in ('q', 'status', 'sector', 'ente', 'anno')}
+        output = options['output']
+
+        if options['format'] == 'xlsx':
+            if not output:
+                raise CommandError("Per il formato xlsx indicare --output.")
+            if not xlsx_available():
+                raise CommandError("Per il formato xlsx installare il pacchetto 'openpyxl'.")
+            with open(output, 'wb') as fh:
+                write_xlsx(export, params, fh)
+        elif output:
+            with open(output, 'w', encoding='utf-8', newline='') as fh:
+                fh.writelines(iter_csv(export, params))
+        else:
+            for chunk in iter_csv(export, params):
+                self.stdout.write(chunk, ending='')
+
+        if output:
+            self.stderr.write(self.style.SUCCESS(f"Esportazione {export.name} salvata in {output}"))
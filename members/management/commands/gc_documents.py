@@ -0,0 +1,62 @@
+# members/management/commands/gc_documents.py
+# Manutenzione dell'archivio documenti (members/storage.py), da cron:
+#   python manage.py gc_documents                 # elimina i file orfani e
+#                                                 # i caricamenti a blocchi abbandonati
+#   python manage.py gc_documents --dry-run       # solo elenco
+#   python manage.py gc_documents --adopt-legacy  # sposta i vecchi upload nell'archivio
+#   python manage.py gc_documents --verify        # ricontrolla i checksum
+#   python manage.py gc_documents --compress      # comprime i documenti non ancora
+#                                                 # elaborati (members/compression.py)
+
+from django.core.management.base import BaseCommand, CommandError
+from django.template.defaultfilters import filesizeformat
+
+from members.compression import compress_pending
+from members.storage import adopt_legacy, collect_garbage, verify_documents
+from members.uploads import expire_uploads
+
+
+class Command(BaseCommand):
+    help = "Elimina i file dei documenti non piu' referenziati e verifica i checksum."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Elenca senza eliminare.")
+        parser.add_argument(
+            '--grace-hours', type=float, default=24,
+            help="Non toccare i file modificati nelle ultime N ore (default 24).",
+        )
+        parser.add_argument(
+            '--adopt-legacy', action='store_true',
+            help="Sposta prima nell'archivio i documenti caricati nei vecchi percorsi.",
+        )
+        parser.add_argument('--verify', action='store_true', help="Ricalcola i checksum dei documenti.")
+        parser.add_argument(
+            '--compress', action='store_true',
+            help="Comprime prima i documenti non ancora elaborati dal worker.",
+        )
+
+    def handle(self, *args, **options):
+        if options['adopt_legacy'] and not options['dry_run']:
+            adopted = adopt_legacy()
+            self.stdout.write(f"Documenti spostati nell'archivio: {adopted}.")
+        if options['compress'] and not options['dry_run']:
+            done, saved = compress_pending()
+            self.stdout.write(f"Documenti compressi: {done}, risparmiati {filesizeformat(saved)}.")
+
+        expired = expire_uploads(grace_seconds=options['grace_hours'] * 3600, dry_run=options['dry_run'])
+        if expired:
+            self.stdout.write(f"Caricamenti a blocchi scaduti: {expired}.")
+        removed = collect_garbage(grace_seconds=options['grace_hours'] * 3600, dry_run=options['dry_run'])
+        for name, size in removed:
+            self.stdout.write(f"  {name} ({filesizeformat(size)})")
+        verb = "Da eliminare" if options['dry_run'] else "Eliminati"
+        freed = filesizeformat(sum(size for _, size in removed))
+        self.stdout.write(self.style.SUCCESS(f"{verb}: {len(removed)} file orfani, {freed}."))
+
+        if options['verify']:
+            problems = verify_documents()
+            for pk, name, problem in problems:
+                self.stderr.write(f"  documento {pk}: {name}: {problem}")
+            if problems:
+                raise CommandError(f"{len(problems)} documenti con file mancante o alterato.")
+            self.stdout.write(self.style.SUCCESS("Checksum verificati."))
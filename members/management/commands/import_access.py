@@ -0,0 +1,67 @@
+# members/management/commands/import_access.py
+# Import dell'export del gestionale Access (CSV o XLSX):
+#   python manage.py import_access --soci soci.csv --quote quote.csv \
+#       --checkpoint import.json --errors scarti.csv
+# Se si interrompe, rilanciare lo stesso comando: riparte dal checkpoint.
+
+from django.core.management.base import BaseCommand, CommandError
+
+from members.importers import KINDS, AccessImporter, ImporterError
+
+
+class Command(BaseCommand):
+    help = "Importa soci, affiliazioni, quote e certificati dall'export Access."
+
+    def add_arguments(self, parser):
+        for kind in KINDS:
+            parser.add_argument(f'--{kind}', metavar='FILE', help=f"File {kind} (.csv o .xlsx).")
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help="Righe per transazione (default 1000).",
+        )
+        parser.add_argument(
+            '--checkpoint', metavar='FILE',
+            help="File JSON con l'avanzamento, per riprendere un import interrotto.",
+        )
+        parser.add_argument(
+            '--errors', metavar='FILE', default='import_access_scarti.csv',
+            help="Report CSV delle righe scartate (default import_access_scarti.csv).",
+        )
+        parser.add_argument(
+            '--create-missing', action='store_true',
+            help="Crea settori, enti e insegnanti non ancora configurati.",
+        )
+        parser.add_argument('--delimiter', help="Separatore CSV (default: rilevato, ';' o ',').")
+        parser.add_argument('--encoding', default='utf-8-sig', help="Codifica dei CSV (es. cp1252).")
+
+    def handle(self, *args, **options):
+        sources = [(kind, options[kind]) for kind in KINDS if options[kind]]
+        if not sources:
+            raise CommandError("Indicare almeno un file: " + ", ".join(f"--{k}" for k in KINDS))
+
+        importer = AccessImporter(
+            batch_size=options['batch_size'],
+            checkpoint=options['checkpoint'],
+            errors=options['errors'],
+            create_missing=options['create_missing'],
+            delimiter=options['delimiter'],
+            encoding=options['encoding'],
+        )
+        try:
+            for kind, path in sources:
+                stats = importer.run(kind, path)
+                self.stdout.write(
+                    f"{kind}: {stats['scritti']} scritti, {stats['scartati']} scartati, "
+                    f"{stats['saltati']} gia' importati"
+                )
+            linked = importer.finish()
+        except (ImporterError, OSError) as exc:
+            raise CommandError(str(exc))
+
+        if linked:
+            self.stdout.write(f"Genitori collegati: {linked}")
+        if importer.errors.count:
+            self.stdout.write(self.style.WARNING(
+                f"{importer.errors.count} righe scartate: vedi {options['errors']}"
+            ))
+        self.stdout.write(self.style.SUCCESS("Import completato."))
@@ -0,0 +1,92 @@
+# members/management/commands/perf_report.py
+# Riepilogo del log delle richieste lente (members/profiling.py):
+#   python manage.py perf_report
+#   python manage.py perf_report --log /var/log/sgs/perf.log --sort queries --limit 20
+# Per ogni URL: richieste, p50 / p95 / p99 del tempo totale, query medie
+# e massime, tempo SQL e template medi, richieste con sospetto N+1.
+
+import glob
+import json
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+from members.profiling import log_path
+
+SORT_KEYS = ('p95', 'p99', 'p50', 'count', 'queries')
+
+
+def percentile(values, pct):
+    """Percentile "nearest rank" di una lista gia' ordinata."""
+    if not values:
+        return 0
+    rank = max(1, -(-len(values) * pct // 100))  # arrotondato per eccesso
+    return values[int(rank) - 1]
+
+
+def read_records(path):
+    """Righe del log e dei file ruotati (perf.log, perf.log.1, ...)."""
+    files = sorted(glob.glob(f'{glob.escape(path)}.*'), reverse=True) + [path]
+    for name in files:
+        try:
+            with open(name, encoding='utf-8') as fh:
+                for line in fh:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue  # riga troncata da una rotazione
+        except FileNotFoundError:
+            continue
+
+
+def summarize(records):
+    groups = defaultdict(list)
+    for record in records:
+        groups[record.get('url_name') or record.get('path', '?')].append(record)
+    rows = []
+    for name, items in groups.items():
+        wall = sorted(r['wall_ms'] for r in items)
+        queries = [r['queries'] for r in items]
+        rows.append({
+            'url': name,
+            'count': len(items),
+            'p50': percentile(wall, 50),
+            'p95': percentile(wall, 95),
+            'p99': percentile(wall, 99),
+            'queries': sum(queries) / len(items),
+            'max_queries': max(queries),
+            'sql_ms': sum(r['sql_ms'] for r in items) / len(items),
+            'template_ms': sum(r.get('template_ms', 0) for r in items) / len(items),
+            'n_plus_one': sum(1 for r in items if r.get('n_plus_one')),
+        })
+    return rows
+
+
+class Command(BaseCommand):
+    help = "Riepiloga per URL il log delle richieste lente (p50/p95/p99, query, N+1)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--log', help="File di log (default SGS_PROFILING_LOG).")
+        parser.add_argument('--sort', choices=SORT_KEYS, default='p95', help="Ordinamento (default p95).")
+        parser.add_argument('--limit', type=int, default=0, help="Numero massimo di URL mostrati.")
+
+    def handle(self, *args, **options):
+        path = options['log'] or log_path()
+        rows = summarize(read_records(path))
+        if not rows:
+            raise CommandError(f"Nessuna richiesta registrata in {path}.")
+        rows.sort(key=lambda r: r[options['sort']], reverse=True)
+        if options['limit']:
+            rows = rows[:options['limit']]
+
+        width = max(len(r['url']) for r in rows)
+        self.stdout.write(
+            f"{'URL':<{width}}  {'N':>5}  {'p50 ms':>8}  {'p95 ms':>8}  {'p99 ms':>8}  "
+            f"{'query':>6}  {'max':>5}  {'SQL ms':>8}  {'tpl ms':>8}  {'N+1':>4}"
+        )
+        for r in rows:
+            self.stdout.write(
+                f"{r['url']:<{width}}  {r['count']:>5}  {r['p50']:>8.1f}  {r['p95']:>8.1f}  "
+                f"{r['p99']:>8.1f}  {r['queries']:>6.1f}  {r['max_queries']:>5}  "
+                f"{r['sql_ms']:>8.1f}  {r['template_ms']:>8.1f}  {r['n_plus_one']:>4}"
+            )
@@ -0,0 +1,32 @@
+# members/management/commands/rebuild_daily_stats.py
+# Ricostruzione del rollup DailyStats (es. dopo un import o una correzione
+# manuale del database):
+#   python manage.py rebuild_daily_stats
+#   python manage.py rebuild_daily_stats --since 2024-01-01 --until 2024-12-31
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from members.rollup import refresh_daily_stats
+
+
+class Command(BaseCommand):
+    help = "Ricostruisce le statistiche giornaliere (DailyStats) usate dai grafici."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help="Primo giorno da ricalcolare (AAAA-MM-GG).")
+        parser.add_argument('--until', help="Ultimo giorno da ricalcolare (AAAA-MM-GG).")
+
+    def handle(self, *args, **options):
+        since, until = options['since'], options['until']
+        if not since and not until:
+            written = refresh_daily_stats()
+        else:
+            since, until = parse_date(since or ''), parse_date(until or '')
+            if not since or not until or since > until:
+                raise CommandError("Indicare --since e --until come AAAA-MM-GG, con since <= until.")
+            days = {since + timedelta(days=i) for i in range((until - since).days + 1)}
+            written = refresh_daily_stats(days)
+        self.stdout.write(self.style.SUCCESS(f"Statistiche giornaliere: {written} righe scritte."))
@@ -0,0 +1,23 @@
+# members/management/commands/refresh_member_status.py
+# Ricalcolo notturno di MemberStatus (es. da cron alle 02:00):
+#   python manage.py refresh_member_status
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from members.status import refresh_member_status
+
+
+class Command(BaseCommand):
+    help = "Ricalcola la fotografia dello stato di tutti i soci (MemberStatus)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help="Righe per ciascun upsert (default 1000).",
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            written = refresh_member_status(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Stato aggiornato per {written} soci."))
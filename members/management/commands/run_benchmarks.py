@@ -0,0 +1,75 @@
+# members/management/commands/run_benchmarks.py
+# Benchmark ripetibili (members/benchmarks.py) su un database temporaneo
+# e una cache locale al processo (ogni misura la svuota): dati e cache
+# reali non vengono toccati.
+#   python manage.py run_benchmarks                          # 1k, 10k, 100k soci
+#   python manage.py run_benchmarks --sizes 1000,10000 --output bench/v1.4.json
+#   python manage.py run_benchmarks --compare bench/v1.3.json --threshold 0.25
+# Con --compare il comando fallisce se una pagina e' piu' lenta della
+# soglia o fa piu' query rispetto al run precedente (utile in CI).
+
+import os
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import setup_databases, teardown_databases
+
+from members import benchmarks
+
+
+class Command(BaseCommand):
+    help = "Misura le pagine principali a 1k/10k/100k soci sintetici e salva i risultati in JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', default=','.join(map(str, benchmarks.DEFAULT_SIZES)),
+            help="Volumi di soci, separati da virgola (default 1000,10000,100000).",
+        )
+        parser.add_argument('--repeat', type=int, default=5, help="Ripetizioni per pagina (default 5).")
+        parser.add_argument('--seed', type=int, default=42, help="Seme dei dati sintetici.")
+        parser.add_argument('--only', help="Solo questi benchmark (nomi separati da virgola).")
+        parser.add_argument('--output', default='benchmarks.json', help="File JSON dei risultati.")
+        parser.add_argument('--compare', help="Risultati precedenti con cui confrontare.")
+        parser.add_argument(
+            '--threshold', type=float, default=0.2,
+            help="Peggioramento tollerato della mediana (default 0.2 = +20%%).",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',') if size.strip()]
+        except ValueError:
+            raise CommandError("--sizes: numeri interi separati da virgola.")
+        only = set(options['only'].split(',')) if options['only'] else None
+
+        local_cache = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        with tempfile.TemporaryDirectory() as tmp, override_settings(CACHES=local_cache):
+            if connection.vendor == 'sqlite':
+                # su file come in produzione (il database di test sarebbe in memoria)
+                connection.settings_dict.setdefault('TEST', {})['NAME'] = os.path.join(tmp, 'bench.sqlite3')
+            databases = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+            try:
+                document = benchmarks.run(
+                    sizes, repeat=options['repeat'], seed=options['seed'], only=only,
+                    log=self.stdout.write,
+                )
+            finally:
+                teardown_databases(databases, verbosity=0)
+
+        benchmarks.save(document, options['output'])
+        self.stdout.write(self.style.SUCCESS(f"Risultati salvati in {options['output']}."))
+
+        if options['compare']:
+            regressions = benchmarks.compare(
+                document, benchmarks.load(options['compare']), options['threshold'],
+            )
+            for r in regressions:
+                self.stdout.write(self.style.WARNING(
+                    f"{r['size']:>7}  {r['name']:<28} {r['previous_ms']:.1f} -> {r['median_ms']:.1f} ms "
+                    f"(x{r['ratio']}), query {r['previous_queries']} -> {r['queries']}"
+                ))
+            if regressions:
+                raise CommandError(f"{len(regressions)} regressioni rispetto a {options['compare']}.")
+            self.stdout.write(self.style.SUCCESS("Nessuna regressione."))
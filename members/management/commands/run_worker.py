@@ -0,0 +1,75 @@
+# members/management/commands/run_worker.py
+# Worker della coda di lavori (members/jobs.py). Da lasciare in esecuzione
+# accanto al server web (systemd, supervisor...); se ne possono avviare piu'
+# d'uno. Una volta al giorno accoda anche lo smistamento dei promemoria ed
+# elimina i lavori terminati da piu' di SGS_JOB_RETENTION_DAYS giorni.
+#   python manage.py run_worker
+#   python manage.py run_worker --once          # svuota la coda ed esce (cron)
+#   python manage.py run_worker --no-reminders  # solo la coda
+
+import signal
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from members.jobs import purge_finished, requeue_stale, retention_days, run_pending, worker_name
+from members.notifications import overdue_days, reminder_days, schedule_reminders
+
+
+class Command(BaseCommand):
+    help = "Esegue i lavori in coda (promemoria email, report) fuori dalle richieste web."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Esegue i lavori pronti ed esce.")
+        parser.add_argument(
+            '--sleep', type=float, default=5,
+            help="Secondi di attesa quando la coda e' vuota (default 5).",
+        )
+        parser.add_argument(
+            '--no-reminders', action='store_true',
+            help="Non accoda lo smistamento giornaliero dei promemoria.",
+        )
+
+    def handle(self, *args, **options):
+        worker = worker_name()
+        self.stopping = False
+        previous = {sig: signal.signal(sig, self.stop) for sig in (signal.SIGTERM, signal.SIGINT)}
+        scheduled_on = purged_on = None
+        total = 0
+        self.stdout.write(f"Worker {worker} avviato.")
+
+        while not self.stopping:
+            close_old_connections()
+            requeue_stale()
+            today = timezone.localdate()
+            if not options['no_reminders'] and scheduled_on != today:
+                schedule_reminders(today)
+                scheduled_on = today
+            if purged_on != today:
+                self.purge()
+                purged_on = today
+            # un lavoro alla volta: SIGTERM attende solo quello in corso
+            done = run_pending(worker, limit=1)
+            total += done
+            if options['once'] and not done:
+                break
+            if not done:
+                time.sleep(options['sleep'])
+
+        for sig, handler in previous.items():
+            signal.signal(sig, handler)
+        self.stdout.write(self.style.SUCCESS(f"Worker {worker} terminato: {total} lavori eseguiti."))
+
+    def purge(self):
+        # le chiavi dei promemoria devono sopravvivere alla loro finestra,
+        # altrimenti lo stesso promemoria partirebbe due volte
+        keep = max(retention_days(), reminder_days(), overdue_days()) + 1
+        purged = purge_finished(timedelta(days=keep))
+        if purged:
+            self.stdout.write(f"Eliminati {purged} lavori terminati da piu' di {keep} giorni.")
+
+    def stop(self, signum, frame):
+        self.stopping = True
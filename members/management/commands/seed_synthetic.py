@@ -0,0 +1,32 @@
+# members/management/commands/seed_synthetic.py
+# Popola il database con soci sintetici (members/synthetic.py), per prove
+# di carico in locale. NON usare sul database di produzione.
+#   python manage.py seed_synthetic --members 10000
+#   python manage.py seed_synthetic --members 100000 --years 5 --seed 7
+# Lanciato di nuovo aggiunge altri soci dopo quelli gia' presenti.
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from members.synthetic import SyntheticData
+
+
+class Command(BaseCommand):
+    help = "Genera soci sintetici con abbonamenti, pagamenti, documenti e affiliazioni."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--members', type=int, default=1000, help="Soci da aggiungere (default 1000).")
+        parser.add_argument('--years', type=int, default=3, help="Anni di storico (default 3).")
+        parser.add_argument('--seed', type=int, default=42, help="Seme casuale (default 42).")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Soci per transazione.")
+
+    def handle(self, *args, **options):
+        generator = SyntheticData(
+            seed=options['seed'], years=options['years'], batch_size=options['batch_size'],
+        )
+        started = time.perf_counter()
+        totals = generator.generate(options['members'])
+        elapsed = time.perf_counter() - started
+        summary = ", ".join(f"{value} {key}" for key, value in totals.items())
+        self.stdout.write(self.style.SUCCESS(f"Creati {summary} in {elapsed:.1f} s."))
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0004_package'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subscription',
+            name='package',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='subscriptions', to='members.package', verbose_name='Pacchetto'),
+        ),
+        migrations.AlterField(
+            model_name='payment',
+            name='subscription',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='payments', to='members.subscription', verbose_name='Abbonamento'),
+        ),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:59
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def populate_member_status(apps, schema_editor):
+    """Prima compilazione della fotografia (poi ci pensano signal e cron)."""
+    from django.db.models import Count, F, Max, Min, Q, Sum
+
+    Member = apps.get_model('members', 'Member')
+    MemberStatus = apps.get_model('members', 'MemberStatus')
+    today = timezone.now().date()
+    rows = Member.objects.annotate(
+        n_certs=Count('documents', filter=Q(documents__document_type='MEDICAL_CERTIFICATE'), distinct=True),
+        cert_expiry=Max('documents__expiration_date', filter=Q(documents__document_type='MEDICAL_CERTIFICATE')),
+    ).values('pk', 'n_certs', 'cert_expiry')
+    subs = {
+        r['member']: r for r in apps.get_model('members', 'Subscription').objects
+        .values('member')
+        .annotate(
+            n=Count('pk'),
+            running=Count('pk', filter=Q(start_date__lte=today) & (Q(end_date__isnull=True) | Q(end_date__gte=today))),
+            next_end=Min('end_date', filter=Q(end_date__gte=today)),
+        )
+    }
+    unpaid = {
+        r['member']: r['total'] for r in apps.get_model('members', 'Payment').objects
+        .filter(is_paid=False).values('member')
+        .annotate(total=Sum(F('amount') - F('discount')))
+    }
+    MemberStatus.objects.bulk_create([
+        MemberStatus(
+            member_id=r['pk'],
+            has_certificate=r['n_certs'] > 0,
+            certificate_expiry=r['cert_expiry'],
+            has_subscriptions=r['pk'] in subs,
+            active_subscriptions=subs.get(r['pk'], {}).get('running', 0),
+            next_subscription_end=subs.get(r['pk'], {}).get('next_end'),
+            unpaid_balance=unpaid.get(r['pk']) or 0,
+            computed_on=today,
+        )
+        for r in rows
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0005_subscription_package_alter_payment_subscription'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MemberStatus',
+            fields=[
+                ('member', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='status_snapshot', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Socio')),
+                ('has_certificate', models.BooleanField(default=False, verbose_name='Certificato presente')),
+                ('certificate_expiry', models.DateField(blank=True, null=True, verbose_name='Scadenza ultimo certificato')),
+                ('has_subscriptions', models.BooleanField(default=False, verbose_name='Ha abbonamenti')),
+                ('active_subscriptions', models.PositiveIntegerField(default=0, verbose_name='Abbonamenti attivi')),
+                ('next_subscription_end', models.DateField(blank=True, null=True, verbose_name='Prossima scadenza abbonamento')),
+                ('unpaid_balance', models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='Saldo insoluto €')),
+                ('computed_on', models.DateField(blank=True, null=True, verbose_name='Calcolato il')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Aggiornato il')),
+            ],
+            options={
+                'verbose_name': 'Stato socio',
+                'verbose_name_plural': 'Stato soci',
+                'indexes': [models.Index(fields=['has_certificate', 'certificate_expiry'], name='memberstatus_cert_idx'), models.Index(fields=['next_subscription_end'], name='memberstatus_next_end_idx'), models.Index(fields=['active_subscriptions'], name='memberstatus_active_subs_idx'), models.Index(fields=['unpaid_balance'], name='memberstatus_unpaid_idx')],
+            },
+        ),
+        migrations.RunPython(populate_member_status, migrations.RunPython.noop),
+    ]
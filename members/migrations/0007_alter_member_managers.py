@@ -0,0 +1,20 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:01
+
+import members.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0006_memberstatus'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='member',
+            managers=[
+                ('objects', members.models.MemberManager()),
+            ],
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('members', '0007_alter_member_managers'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='memberstatus',
+            name='memberstatus_cert_idx',
+        ),
+        migrations.AddIndex(
+            model_name='member',
+            index=models.Index(fields=['last_name', 'first_name', 'id'], name='member_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='member',
+            index=models.Index(fields=['is_active'], name='member_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='member',
+            index=models.Index(fields=['date_joined'], name='member_joined_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='memberdocument',
+            index=models.Index(fields=['member', 'document_type', '-expiration_date', '-id'], name='memberdoc_member_type_exp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='memberstatus',
+            index=models.Index(fields=['has_certificate', 'certificate_expiry', 'has_subscriptions'], name='memberstatus_cert_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['due_date', 'payment_date'], name='payment_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['is_paid', 'due_date', 'payment_date'], name='payment_paid_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['member', 'due_date', 'payment_date'], name='payment_member_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(condition=models.Q(('is_paid', False)), fields=['due_date', 'payment_date'], name='payment_unpaid_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(fields=['member', 'start_date', 'end_date'], name='sub_member_period_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(fields=['end_date', 'id'], name='sub_end_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(fields=['start_date'], name='sub_start_date_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Indice di ricerca soci: FTS5 + trigger su SQLite, pg_trgm su PostgreSQL.
+# Le istruzioni stanno in members/search.py (riusate da post_migrate).
+
+from django.db import migrations
+
+
+def install(apps, schema_editor):
+    from members.search import install_search_index
+    install_search_index(schema_editor.connection)
+
+
+def uninstall(apps, schema_editor):
+    from members.search import drop_search_index
+    drop_search_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0009_payment_totals_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_daily_stats(apps, schema_editor):
+    """Prima compilazione del rollup (poi ci pensano i signal)."""
+    from members.rollup import refresh_daily_stats
+    refresh_daily_stats(apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0010_member_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='Giorno')),
+                ('new_members', models.PositiveIntegerField(default=0, verbose_name='Nuovi soci')),
+                ('new_subscriptions', models.PositiveIntegerField(default=0, verbose_name='Nuovi abbonamenti')),
+                ('expirations', models.PositiveIntegerField(default=0, verbose_name='Abbonamenti in scadenza')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Incassato €')),
+                ('outstanding', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Da incassare €')),
+            ],
+            options={
+                'verbose_name': 'Statistica giornaliera',
+                'verbose_name_plural': 'Statistiche giornaliere',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['is_paid', 'payment_date'], name='payment_paid_on_idx'),
+        ),
+        migrations.AddField(
+            model_name='dailystats',
+            name='sector',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='daily_stats', to='members.sector', verbose_name='Settore'),
+        ),
+        migrations.AddIndex(
+            model_name='dailystats',
+            index=models.Index(fields=['day', 'sector'], name='dailystats_day_sector_idx'),
+        ),
+        migrations.RunPython(populate_daily_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:24
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0011_dailystats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task', models.CharField(max_length=100, verbose_name='Attività')),
+                ('payload', models.JSONField(blank=True, default=dict, verbose_name='Parametri')),
+                ('idempotency_key', models.CharField(blank=True, max_length=200, null=True, unique=True, verbose_name='Chiave di idempotenza')),
+                ('status', models.CharField(choices=[('QUEUED', 'In coda'), ('RUNNING', 'In esecuzione'), ('DONE', 'Completato'), ('FAILED', 'Fallito')], default='QUEUED', max_length=10, verbose_name='Stato')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Tentativi')),
+                ('max_attempts', models.PositiveSmallIntegerField(default=5, verbose_name='Tentativi massimi')),
+                ('run_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Da eseguire dal')),
+                ('locked_by', models.CharField(blank=True, max_length=100, verbose_name='Worker')),
+                ('locked_at', models.DateTimeField(blank=True, null=True, verbose_name='Preso in carico il')),
+                ('last_error', models.TextField(blank=True, verbose_name='Ultimo errore')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Creato il')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Terminato il')),
+            ],
+            options={
+                'verbose_name': 'Lavoro in coda',
+                'verbose_name_plural': 'Lavori in coda',
+                'ordering': ['run_at', 'id'],
+                'indexes': [models.Index(fields=['status', 'run_at', 'id'], name='job_ready_idx')],
+            },
+        ),
+    ]
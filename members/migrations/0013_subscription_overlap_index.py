@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0012_job_queue'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(fields=['member', 'sector', 'start_date', 'end_date'], name='sub_member_sector_period_idx'),
+        ),
+    ]
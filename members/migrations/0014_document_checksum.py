@@ -0,0 +1,35 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:38
+
+import members.models
+import members.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0013_subscription_overlap_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='memberdocument',
+            name='checksum',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64, verbose_name='SHA-256'),
+        ),
+        migrations.AddField(
+            model_name='memberdocument',
+            name='original_name',
+            field=models.CharField(blank=True, editable=False, max_length=255, verbose_name='Nome originale'),
+        ),
+        migrations.AddField(
+            model_name='memberdocument',
+            name='size',
+            field=models.PositiveBigIntegerField(blank=True, editable=False, null=True, verbose_name='Dimensione (byte)'),
+        ),
+        migrations.AlterField(
+            model_name='memberdocument',
+            name='file',
+            field=models.FileField(storage=members.storage.get_document_storage, upload_to=members.models.member_document_upload_path, verbose_name='File'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:40
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0014_document_checksum'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentUpload',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('document_type', models.CharField(choices=[('MEDICAL_CERTIFICATE', 'Certificato Medico'), ('IDENTITY_CARD', "Carta d'Identità"), ('CONTRACT', 'Contratto'), ('OTHER', 'Altro')], default='OTHER', max_length=50, verbose_name='Tipo di documento')),
+                ('expiration_date', models.DateField(blank=True, null=True, verbose_name='Data di Scadenza')),
+                ('description', models.TextField(blank=True, verbose_name='Descrizione')),
+                ('filename', models.CharField(max_length=255, verbose_name='Nome file')),
+                ('size', models.PositiveBigIntegerField(verbose_name='Dimensione dichiarata (byte)')),
+                ('received', models.PositiveBigIntegerField(default=0, verbose_name='Byte ricevuti')),
+                ('content_type', models.CharField(blank=True, max_length=100, verbose_name='Tipo rilevato')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Iniziato il')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Ultimo blocco il')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Caricato da')),
+                ('document', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='upload', to='members.memberdocument', verbose_name='Documento')),
+                ('member', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pending_uploads', to=settings.AUTH_USER_MODEL, verbose_name='Socio')),
+            ],
+            options={
+                'verbose_name': 'Caricamento documento',
+                'verbose_name_plural': 'Caricamenti documenti',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
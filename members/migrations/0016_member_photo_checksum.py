@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0015_document_upload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='member',
+            name='photo_checksum',
+            field=models.CharField(blank=True, editable=False, max_length=64, verbose_name='SHA-256 foto'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:47
+
+import members.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0016_member_photo_checksum'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='memberdocument',
+            name='compressed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Elaborato il'),
+        ),
+        migrations.AddField(
+            model_name='memberdocument',
+            name='original_file',
+            field=models.FileField(blank=True, editable=False, storage=members.storage.get_document_storage, upload_to='', verbose_name='File originale'),
+        ),
+        migrations.AddField(
+            model_name='memberdocument',
+            name='original_size',
+            field=models.PositiveBigIntegerField(blank=True, editable=False, null=True, verbose_name='Dimensione originale (byte)'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:52
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0017_document_compression'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='member',
+            name='dismissed_on',
+            field=models.DateField(blank=True, null=True, verbose_name='Data dimissione'),
+        ),
+        migrations.CreateModel(
+            name='ArchivedMember',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('member_id', models.BigIntegerField(unique=True, verbose_name='ID socio')),
+                ('username', models.CharField(max_length=150, verbose_name='Username')),
+                ('first_name', models.CharField(blank=True, max_length=150, verbose_name='Nome')),
+                ('last_name', models.CharField(blank=True, max_length=150, verbose_name='Cognome')),
+                ('card_number', models.CharField(blank=True, max_length=30, verbose_name='Numero tessera')),
+                ('fiscal_code', models.CharField(blank=True, max_length=16, verbose_name='Codice fiscale')),
+                ('dismissed_on', models.DateField(blank=True, null=True, verbose_name='Dimesso il')),
+                ('data', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name='Righe archiviate')),
+                ('files', models.JSONField(blank=True, default=list, verbose_name='File nel tarball')),
+                ('tarball', models.CharField(blank=True, max_length=255, verbose_name='Tarball')),
+                ('archived_at', models.DateTimeField(auto_now_add=True, verbose_name='Archiviato il')),
+            ],
+            options={
+                'verbose_name': 'Socio archiviato',
+                'verbose_name_plural': 'Soci archiviati',
+                'ordering': ['last_name', 'first_name'],
+                'indexes': [models.Index(fields=['last_name', 'first_name'], name='archived_member_name_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 20:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0018_member_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='memberdocument',
+            name='import_key',
+            field=models.CharField(blank=True, editable=False, max_length=100, null=True, unique=True, verbose_name='Chiave di import'),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='import_key',
+            field=models.CharField(blank=True, editable=False, max_length=100, null=True, unique=True, verbose_name='Chiave di import'),
+        ),
+    ]
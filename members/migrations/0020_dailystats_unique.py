@@ -0,0 +1,21 @@
+# Generated by Django 5.2.7 on 2026-10-18 20:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0019_import_natural_keys'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='dailystats',
+            constraint=models.UniqueConstraint(condition=models.Q(('sector__isnull', False)), fields=('day', 'sector'), name='dailystats_day_sector_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailystats',
+            constraint=models.UniqueConstraint(condition=models.Q(('sector__isnull', True)), fields=('day',), name='dailystats_day_nosector_uniq'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-18 20:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0020_dailystats_unique'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='dailystats',
+            name='sector',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='members.sector', verbose_name='Settore'),
+        ),
+    ]
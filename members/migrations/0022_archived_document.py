@@ -0,0 +1,34 @@
+# Generated by Django 5.2.7 on 2026-10-18 20:20
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0021_dailystats_sector_cascade'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('document_id', models.BigIntegerField(unique=True, verbose_name='ID documento')),
+                ('member_id', models.BigIntegerField(db_index=True, verbose_name='ID socio')),
+                ('member_name', models.CharField(blank=True, max_length=300, verbose_name='Socio')),
+                ('document_type', models.CharField(choices=[('MEDICAL_CERTIFICATE', 'Certificato Medico'), ('IDENTITY_CARD', "Carta d'Identità"), ('CONTRACT', 'Contratto'), ('OTHER', 'Altro')], max_length=50, verbose_name='Tipo documento')),
+                ('expiration_date', models.DateField(blank=True, null=True, verbose_name='Data di Scadenza')),
+                ('data', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name='Righe archiviate')),
+                ('files', models.JSONField(blank=True, default=list, verbose_name='File nel tarball')),
+                ('tarball', models.CharField(blank=True, max_length=255, verbose_name='Tarball')),
+                ('archived_at', models.DateTimeField(auto_now_add=True, verbose_name='Archiviato il')),
+            ],
+            options={
+                'verbose_name': 'Documento archiviato',
+                'verbose_name_plural': 'Documenti archiviati',
+                'ordering': ['-expiration_date'],
+            },
+        ),
+    ]
@@ -1,10 +1,19 @@
 # members/models.py
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.db.models import F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
 from django.utils.translation import gettext_lazy as _
 from django.utils import timezone
 from dateutil.relativedelta import relativedelta
+
+from .search import member_search_q, search_ranked
+from .storage import checksum_from_name, get_document_storage
+from decimal import Decimal
 import os
+import uuid
 
 
 def member_document_upload_path(instance, filename):
@@ -85,6 +94,57 @@ class Instructor(models.Model):
 # ---------------------------------------------------------------------------
 #  SOCIO / UTENTE
 # ---------------------------------------------------------------------------
+class MemberQuerySet(models.QuerySet):
+
+    def search(self, q):
+        """Ricerca soci (vedi members/search.py). Con q vuota non filtra."""
+        return self.filter(member_search_q(q))
+
+    def search_ranked(self, q):
+        """Come search(), ordinata per rilevanza e poi per nome."""
+        return search_ranked(self, q)
+
+    def with_latest_certificate(self):
+        """
+        Annota ogni socio con l'ultimo certificato medico (quello con la
+        scadenza piu' lontana; a parita', il piu' recente):
+        latest_certificate_id e latest_certificate_expiry.
+        Una subquery correlata per riga, servita dall'indice
+        (member, document_type, expiration_date).
+        """
+        latest = (
+            MemberDocument.objects
+            .filter(member=OuterRef('pk'),
+                    document_type=MemberDocument.DocumentType.MEDICAL_CERTIFICATE)
+            .order_by(F('expiration_date').desc(nulls_last=True), '-id')
+        )
+        return self.annotate(
+            latest_certificate_id=Subquery(latest.values('id')[:1]),
+            latest_certificate_expiry=Subquery(latest.values('expiration_date')[:1]),
+        )
+
+    def with_certificate_status(self, status, today=None):
+        """
+        Filtra per stato del certificato ('Attivo' / 'Scaduto' / 'Assente').
+        Richiede with_latest_certificate().
+        """
+        today = today or timezone.now().date()
+        if status == "Attivo":
+            return self.filter(latest_certificate_id__isnull=False).filter(
+                Q(latest_certificate_expiry__isnull=True) |
+                Q(latest_certificate_expiry__gte=today)
+            )
+        if status == "Scaduto":
+            return self.filter(latest_certificate_expiry__lt=today)
+        if status == "Assente":
+            return self.filter(latest_certificate_id__isnull=True)
+        return self
+
+
+class MemberManager(UserManager.from_queryset(MemberQuerySet)):
+    pass
+
+
 class Member(AbstractUser):
     """
     Modello utente personalizzato per il socio della palestra/A.S.D.
@@ -129,11 +189,15 @@ class Member(AbstractUser):
     postal_code = models.CharField(_("CAP"), max_length=5, blank=True)
 
     photo = models.ImageField(_("Foto"), upload_to="member_photos/", null=True, blank=True)
+    # SHA-256 della foto, valorizzato quando le miniature sono pronte (members/images.py)
+    photo_checksum = models.CharField(_("SHA-256 foto"), max_length=64, blank=True, editable=False)
     notes = models.TextField(_("Note"), blank=True)
 
     # Stato associativo
     registration_date = models.DateField(_("Data registrazione"), null=True, blank=True)
     is_dismissed = models.BooleanField(_("Dimesso / Cessato"), default=False)
+    # valorizzata da save(); vuota per i soci importati gia' dimessi
+    dismissed_on = models.DateField(_("Data dimissione"), null=True, blank=True)
 
     # Disciplina
     sector = models.ForeignKey(
@@ -151,10 +215,19 @@ class Member(AbstractUser):
         related_name="dependents", verbose_name=_("Genitore / tutore"),
     )
 
+    objects = MemberManager()
+
     class Meta:
         verbose_name = _("Socio")
         verbose_name_plural = _("Soci")
         ordering = ["last_name", "first_name"]
+        indexes = [
+            # elenco soci ordinato per nome e paginazione a cursore
+            models.Index(fields=["last_name", "first_name", "id"], name="member_name_idx"),
+            # contatori e grafico iscrizioni della dashboard
+            models.Index(fields=["is_active"], name="member_active_idx"),
+            models.Index(fields=["date_joined"], name="member_joined_idx"),
+        ]
 
     def __str__(self):
         if self.first_name and self.last_name:
@@ -192,6 +265,15 @@ class Member(AbstractUser):
         else:  # INSTRUCTOR / MEMBER
             self.is_staff = False
             self.is_superuser = False
+        # Foto nuova o tolta: le miniature vecchie non valgono piu' (le
+        # nuove le prepara il worker, vedi signals.py e images.py)
+        if not self.photo or not self.photo._committed:
+            self.photo_checksum = ''
+        # Data di dimissione: serve all'archiviazione (members/archive.py)
+        if not self.is_dismissed:
+            self.dismissed_on = None
+        elif self.dismissed_on is None:
+            self.dismissed_on = timezone.now().date()
         super().save(*args, **kwargs)
 
 
@@ -249,29 +331,248 @@ class MemberDocument(models.Model):
         max_length=50, choices=DocumentType.choices,
         default=DocumentType.OTHER, verbose_name=_("Tipo di documento"),
     )
-    file = models.FileField(upload_to=member_document_upload_path, verbose_name=_("File"))
+    file = models.FileField(
+        upload_to=member_document_upload_path, storage=get_document_storage, verbose_name=_("File"),
+    )
+    # valorizzati al salvataggio di un nuovo file (members/storage.py)
+    checksum = models.CharField(_("SHA-256"), max_length=64, blank=True, editable=False, db_index=True)
+    size = models.PositiveBigIntegerField(_("Dimensione (byte)"), null=True, blank=True, editable=False)
+    original_name = models.CharField(_("Nome originale"), max_length=255, blank=True, editable=False)
+    # compressione all'arrivo (members/compression.py): dimensione prima
+    # della compressione e, se conservato, il file originale
+    original_size = models.PositiveBigIntegerField(
+        _("Dimensione originale (byte)"), null=True, blank=True, editable=False,
+    )
+    original_file = models.FileField(
+        _("File originale"), storage=get_document_storage, blank=True, editable=False,
+    )
+    compressed_at = models.DateTimeField(_("Elaborato il"), null=True, blank=True, editable=False)
     expiration_date = models.DateField(_("Data di Scadenza"), null=True, blank=True)
     is_active = models.BooleanField(default=True, verbose_name=_("Attivo"))
     description = models.TextField(verbose_name=_("Descrizione"), blank=True)
     uploaded_at = models.DateTimeField(auto_now_add=True, verbose_name=_("Data di caricamento"))
+    # chiave naturale dei certificati importati da Access (come Payment.import_key)
+    import_key = models.CharField(
+        _("Chiave di import"), max_length=100, unique=True, null=True, blank=True, editable=False,
+    )
 
     class Meta:
         verbose_name = _("Documento Socio")
         verbose_name_plural = _("Documenti Soci")
         ordering = ['-uploaded_at']
+        indexes = [
+            # ultimo certificato del socio (MemberQuerySet.with_latest_certificate)
+            models.Index(
+                fields=["member", "document_type", "-expiration_date", "-id"],
+                name="memberdoc_member_type_exp_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"Documento '{self.get_document_type_display()}' per {self.member}"
 
+    def save(self, *args, **kwargs):
+        # Nuovo file: lo si scrive subito nell'archivio, che lo rinomina col
+        # suo SHA-256 (o riusa il file identico gia' presente).
+        if self.file and not self.file._committed:
+            self.original_name = os.path.basename(self.file.name)[:255]
+            self.size = self.file.size
+            self.file.save(self.file.name, self.file.file, save=False)
+            self.checksum = checksum_from_name(self.file.name)
+            self.original_size, self.original_file, self.compressed_at = None, '', None
+        super().save(*args, **kwargs)
+
     @property
     def filename(self):
-        return os.path.basename(self.file.name)
+        return self.original_name or os.path.basename(self.file.name)
+
+    @property
+    def saved_bytes(self):
+        """Byte risparmiati dalla compressione (0 se non elaborato)."""
+        if self.original_size is None or self.size is None:
+            return 0
+        return max(self.original_size - self.size, 0)
 
     @property
     def is_expired(self):
         return bool(self.expiration_date and self.expiration_date < timezone.now().date())
 
 
+class DocumentUpload(models.Model):
+    """
+    Caricamento a blocchi di un documento (members/uploads.py). I byte
+    ricevuti finora stanno in documents/uploads/<id>.part; a file completo
+    diventano un MemberDocument. Un caricamento interrotto riprende da
+    `received`; quelli abbandonati li elimina `manage.py gc_documents`.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    member = models.ForeignKey(
+        Member, on_delete=models.CASCADE,
+        related_name="pending_uploads", verbose_name=_("Socio"),
+    )
+    created_by = models.ForeignKey(
+        Member, on_delete=models.SET_NULL, null=True, blank=True,
+        related_name="+", verbose_name=_("Caricato da"),
+    )
+    document_type = models.CharField(
+        max_length=50, choices=MemberDocument.DocumentType.choices,
+        default=MemberDocument.DocumentType.OTHER, verbose_name=_("Tipo di documento"),
+    )
+    expiration_date = models.DateField(_("Data di Scadenza"), null=True, blank=True)
+    description = models.TextField(verbose_name=_("Descrizione"), blank=True)
+    filename = models.CharField(_("Nome file"), max_length=255)
+    size = models.PositiveBigIntegerField(_("Dimensione dichiarata (byte)"))
+    received = models.PositiveBigIntegerField(_("Byte ricevuti"), default=0)
+    content_type = models.CharField(_("Tipo rilevato"), max_length=100, blank=True)
+    document = models.OneToOneField(
+        MemberDocument, on_delete=models.SET_NULL, null=True, blank=True,
+        related_name="upload", verbose_name=_("Documento"),
+    )
+    created_at = models.DateTimeField(_("Iniziato il"), auto_now_add=True)
+    updated_at = models.DateTimeField(_("Ultimo blocco il"), auto_now=True)
+
+    class Meta:
+        verbose_name = _("Caricamento documento")
+        verbose_name_plural = _("Caricamenti documenti")
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"{self.filename} ({self.received}/{self.size} byte)"
+
+    @property
+    def part_name(self):
+        """Nome (relativo a MEDIA_ROOT) del file parziale."""
+        return f"documents/uploads/{self.pk}.part"
+
+    @property
+    def is_complete(self):
+        return self.document_id is not None
+
+
+class SubscriptionQuerySet(models.QuerySet):
+    """
+    Filtri di stato espressi come intervalli di date (WHERE lato database),
+    coerenti con Subscription.status:
+    - Scaduto: fine passata;
+    - Non ancora attivo: inizio futuro (e non scaduto);
+    - Attivo: tutto il resto.
+    """
+    STATUS_ACTIVE = "Attivo"
+    STATUS_EXPIRED = "Scaduto"
+    STATUS_NOT_STARTED = "Non ancora attivo"
+
+    @staticmethod
+    def status_q(status, today=None):
+        today = today or timezone.now().date()
+        not_expired = Q(end_date__isnull=True) | Q(end_date__gte=today)
+        if status == SubscriptionQuerySet.STATUS_EXPIRED:
+            return Q(end_date__lt=today)
+        if status == SubscriptionQuerySet.STATUS_NOT_STARTED:
+            return Q(start_date__gt=today) & not_expired
+        if status == SubscriptionQuerySet.STATUS_ACTIVE:
+            return Q(start_date__lte=today) & not_expired
+        return Q()
+
+    def with_status(self, status, today=None):
+        return self.filter(self.status_q(status, today))
+
+    def with_status_label(self, today=None):
+        """Annota `status_label` (Attivo / Scaduto / Non ancora attivo) in SQL."""
+        return self.annotate(status_label=models.Case(
+            models.When(self.status_q(self.STATUS_EXPIRED, today), then=models.Value(self.STATUS_EXPIRED)),
+            models.When(self.status_q(self.STATUS_NOT_STARTED, today), then=models.Value(self.STATUS_NOT_STARTED)),
+            default=models.Value(self.STATUS_ACTIVE),
+            output_field=models.CharField(),
+        ))
+
+    def search(self, q):
+        """Abbonamenti dei soci che corrispondono alla ricerca `q`."""
+        return self.filter(member_search_q(q, prefix='member__'))
+
+    def active(self, today=None):
+        return self.with_status(self.STATUS_ACTIVE, today)
+
+    def expired(self, today=None):
+        return self.with_status(self.STATUS_EXPIRED, today)
+
+    def not_started(self, today=None):
+        return self.with_status(self.STATUS_NOT_STARTED, today)
+
+    def not_renewed(self):
+        """
+        Abbonamenti non ancora rinnovati: il socio non ne ha un altro nello
+        stesso settore (o anch'esso senza settore) che finisce dopo.
+        La subquery scorre sub_member_period_idx del solo socio.
+        """
+        later = self.model.objects.annotate(
+            same_sector=Coalesce('sector', 0),
+        ).filter(
+            member=OuterRef('member'), end_date__gt=OuterRef('end_date'),
+            same_sector=Coalesce(OuterRef('sector'), 0),
+        )
+        return self.exclude(models.Exists(later))
+
+    def overlapping(self, member_id, sector_id, start, end):
+        """
+        Abbonamenti del socio nello stesso settore (None = senza settore) il
+        cui periodo [inizio, fine] tocca [start, end]; end None = senza fine.
+        Range query su sub_member_sector_period_idx.
+        """
+        overlaps = self.filter(member_id=member_id, sector_id=sector_id)
+        if end:
+            overlaps = overlaps.filter(start_date__lte=end)
+        return overlaps.filter(Q(end_date__isnull=True) | Q(end_date__gte=start))
+
+    def overlaps_in_batch(self, candidates):
+        """
+        Controllo di un blocco di abbonamenti non salvati (import, rinnovi)
+        in un solo passaggio: una query per i periodi esistenti dei soci
+        coinvolti, poi il confronto in memoria. Restituisce gli indici dei
+        candidati che si sovrappongono a un abbonamento esistente o a un
+        candidato precedente della stessa lista.
+        """
+        if not candidates:
+            return set()
+        first_start = min(c.start_date for c in candidates)
+        periods = {}
+        existing = self.filter(
+            Q(end_date__isnull=True) | Q(end_date__gte=first_start),
+            member_id__in={c.member_id for c in candidates},
+        ).values_list('member_id', 'sector_id', 'start_date', 'end_date')
+        for member_id, sector_id, start, end in existing:
+            periods.setdefault((member_id, sector_id), []).append((start, end))
+
+        clashes = set()
+        for index, c in enumerate(candidates):
+            same = periods.setdefault((c.member_id, c.sector_id), [])
+            if any(_periods_touch(c.start_date, c.end_date, start, end) for start, end in same):
+                clashes.add(index)
+            else:
+                same.append((c.start_date, c.end_date))
+        return clashes
+
+    def with_payment_state(self):
+        """
+        Annota lo stato del pagamento collegato (uno-a-uno) con un LEFT JOIN,
+        cosi' le liste non fanno una query per riga:
+        payment_is_paid, payment_net_amount, payment_paid_on.
+        Senza pagamento collegato i tre valori sono NULL.
+        """
+        return self.annotate(
+            payment_is_paid=F('payments__is_paid'),
+            payment_net_amount=models.ExpressionWrapper(
+                F('payments__amount') - F('payments__discount'),
+                output_field=models.DecimalField(max_digits=8, decimal_places=2),
+            ),
+            payment_paid_on=F('payments__payment_date'),
+        )
+
+
+def _periods_touch(start_a, end_a, start_b, end_b):
+    """Periodi con estremi inclusi (fine None = senza fine) con almeno un giorno in comune."""
+    return (end_b is None or start_a <= end_b) and (end_a is None or start_b <= end_a)
+
+
 # ---------------------------------------------------------------------------
 #  ABBONAMENTO / ISCRIZIONE A UNA DISCIPLINA  -- come prima, con settore FK
 # ---------------------------------------------------------------------------
@@ -310,10 +611,24 @@ class Subscription(models.Model):
         null=True, blank=True,   # nullable per non rompere i record esistenti
     )
 
+    objects = SubscriptionQuerySet.as_manager()
+
     class Meta:
         verbose_name = _("Abbonamento")
         verbose_name_plural = _("Abbonamenti")
         ordering = ['-end_date']
+        indexes = [
+            # abbonamenti del socio per periodo (stato, MemberStatus)
+            models.Index(fields=["member", "start_date", "end_date"], name="sub_member_period_idx"),
+            # sovrapposizioni nello stesso settore (Subscription.clean, rinnovi)
+            models.Index(
+                fields=["member", "sector", "start_date", "end_date"], name="sub_member_sector_period_idx",
+            ),
+            # scadenze, contatori dashboard e paginazione di subscription_status
+            models.Index(fields=["end_date", "id"], name="sub_end_date_idx"),
+            # grafici per data inizio
+            models.Index(fields=["start_date"], name="sub_start_date_idx"),
+        ]
 
     def __str__(self):
         sector = self.sector.name if self.sector else "—"
@@ -323,10 +638,10 @@ class Subscription(models.Model):
     def status(self):
         today = timezone.now().date()
         if self.end_date and self.end_date < today:
-            return "Scaduto"
+            return SubscriptionQuerySet.STATUS_EXPIRED
         elif self.start_date > today:
-            return "Non ancora attivo"
-        return "Attivo"
+            return SubscriptionQuerySet.STATUS_NOT_STARTED
+        return SubscriptionQuerySet.STATUS_ACTIVE
 
     def save(self, *args, **kwargs):
         # Se c'è un pacchetto, eredita settore e tipo da lì.
@@ -337,33 +652,97 @@ class Subscription(models.Model):
 
         # Calcolo data fine: dal pacchetto se presente, altrimenti come prima.
         if self.start_date and not self.end_date:
-            delta = None
-            if self.package_id and self.package.duration:
-                delta = self.package.duration
-            else:
-                from dateutil.relativedelta import relativedelta
-                delta = {
-                    self.SubscriptionType.MONTHLY: relativedelta(months=1),
-                    self.SubscriptionType.QUARTERLY: relativedelta(months=3),
-                    self.SubscriptionType.FOURMONTH: relativedelta(months=4),
-                    self.SubscriptionType.SEMESTRAL: relativedelta(months=6),
-                    self.SubscriptionType.ANNUAL: relativedelta(years=1),
-                }.get(self.subscription_type)
-            if delta:
-                self.end_date = self.start_date + delta
+            self.end_date = self.compute_end_date()
         super().save(*args, **kwargs)
 
-    # 3) AGGIUNGI questa property a Subscription (comoda nei template):
+    def compute_end_date(self):
+        """Data fine dedotta dal pacchetto (o dal tipo) e dalla data inizio."""
+        delta = None
+        if self.package_id and self.package.duration:
+            delta = self.package.duration
+        else:
+            from dateutil.relativedelta import relativedelta
+            delta = {
+                self.SubscriptionType.MONTHLY: relativedelta(months=1),
+                self.SubscriptionType.QUARTERLY: relativedelta(months=3),
+                self.SubscriptionType.FOURMONTH: relativedelta(months=4),
+                self.SubscriptionType.SEMESTRAL: relativedelta(months=6),
+                self.SubscriptionType.ANNUAL: relativedelta(years=1),
+            }.get(self.subscription_type)
+        return self.start_date + delta if delta else None
+
+    def clean(self):
+        super().clean()
+        self.validate_overlap()
+
+    def validate_overlap(self):
+        """
+        ValidationError (sulla data inizio) se il periodo si sovrappone a un
+        altro abbonamento del socio nello stesso settore. Settore e data fine
+        sono quelli che save() assegnerebbe.
+        """
+        if not (self.member_id and self.start_date):
+            return
+        sector_id = self.sector_id or (self.package.sector_id if self.package_id else None)
+        end = self.end_date or self.compute_end_date()
+        other = (
+            Subscription.objects.overlapping(self.member_id, sector_id, self.start_date, end)
+            .exclude(pk=self.pk).order_by('start_date').first()
+        )
+        if other is not None:
+            until = other.end_date.strftime('%d/%m/%Y') if other.end_date else "senza scadenza"
+            raise ValidationError({'start_date': _(
+                "Il socio ha già un abbonamento nello stesso settore dal %(start)s al %(end)s."
+            ) % {'start': other.start_date.strftime('%d/%m/%Y'), 'end': until}})
+
     @property
     def is_paid(self):
         """True se esiste un pagamento collegato e segnato come pagato."""
-        p = self.payments.first()
+        if hasattr(self, 'payment_is_paid'):  # annotato da with_payment_state()
+            return bool(self.payment_is_paid)
+        p = self.payment
         return bool(p and p.is_paid)
 
     @property
     def payment(self):
         """Il pagamento collegato (uno solo), o None."""
-        return self.payments.first()
+        try:
+            return self.payments
+        except Subscription.payments.RelatedObjectDoesNotExist:
+            return None
+
+
+class PaymentQuerySet(models.QuerySet):
+    STATE_PAID = 'paid'
+    STATE_UNPAID = 'unpaid'
+    STATE_OVERDUE = 'overdue'
+
+    def search(self, q):
+        """Pagamenti dei soci che corrispondono alla ricerca `q`."""
+        return self.filter(member_search_q(q, prefix='member__'))
+
+    def with_state(self, state, today=None):
+        """Filtro della lista pagamenti: paid / unpaid / overdue (vuoto = tutti)."""
+        if state == self.STATE_PAID:
+            return self.filter(is_paid=True)
+        if state == self.STATE_UNPAID:
+            return self.filter(is_paid=False)
+        if state == self.STATE_OVERDUE:
+            return self.filter(is_paid=False, due_date__lt=today or timezone.now().date())
+        return self
+
+    def totals(self):
+        """
+        Totali netti (quota - sconto) pagati e da pagare, calcolati con una
+        sola query di aggregazione sul filtro corrente.
+        """
+        net = F('amount') - F('discount')
+        money = models.DecimalField(max_digits=12, decimal_places=2)
+        zero = models.Value(Decimal('0'), output_field=money)
+        return self.order_by().aggregate(
+            paid=Coalesce(Sum(net, filter=Q(is_paid=True), output_field=money), zero),
+            unpaid=Coalesce(Sum(net, filter=Q(is_paid=False), output_field=money), zero),
+        )
 
 
 # ---------------------------------------------------------------------------
@@ -415,11 +794,35 @@ class Payment(models.Model):
     )
     fee_code = models.CharField(_("Tariffa"), max_length=5, blank=True)  # A / B / C ...
     is_paid = models.BooleanField(_("Pagato"), default=True)
+    # chiave naturale delle quote importate da Access (members/importers.py):
+    # rilanciare l'import aggiorna invece di duplicare. Vuota per le altre.
+    import_key = models.CharField(
+        _("Chiave di import"), max_length=100, unique=True, null=True, blank=True, editable=False,
+    )
+
+    objects = PaymentQuerySet.as_manager()
 
     class Meta:
         verbose_name = _("Pagamento")
         verbose_name_plural = _("Pagamenti")
         ordering = ["-due_date", "-payment_date"]
+        indexes = [
+            # payment_all senza filtri: ordinamento per scadenza gia' pronto
+            models.Index(fields=["due_date", "payment_date"], name="payment_due_idx"),
+            # filtri pagato/non pagato di payment_all, ordinati per scadenza
+            models.Index(fields=["is_paid", "due_date", "payment_date"], name="payment_paid_due_idx"),
+            # totali incassato / da incassare: la somma legge solo l'indice
+            models.Index(fields=["is_paid", "amount", "discount"], name="payment_totals_idx"),
+            # storico del socio (payment_list)
+            models.Index(fields=["member", "due_date", "payment_date"], name="payment_member_due_idx"),
+            # insoluti per scadenza (payment_due): indice parziale, piccolo
+            models.Index(
+                fields=["due_date", "payment_date"], name="payment_unpaid_due_idx",
+                condition=Q(is_paid=False),
+            ),
+            # incassato per giorno (rollup DailyStats)
+            models.Index(fields=["is_paid", "payment_date"], name="payment_paid_on_idx"),
+        ]
 
     def __str__(self):
         return f"{self.get_payment_type_display()} {self.amount}€ - {self.member}"
@@ -440,35 +843,47 @@ class Payment(models.Model):
         if self.subscription_id:
             sub = self.subscription
             # tipo dedotto dall'abbonamento
-            mapping = {
-                'MONTHLY': self.PaymentType.MONTHLY,
-                'QUARTERLY': self.PaymentType.QUARTERLY,
-                'FOURMONTH': self.PaymentType.FOURMONTH,
-                'SEMESTRAL': self.PaymentType.QUARTERLY,  # fallback ragionevole
-                'ANNUAL': self.PaymentType.ENROLLMENT,
-            }
             if not self.payment_type:
-                self.payment_type = mapping.get(sub.subscription_type, self.payment_type)
+                self.payment_type = self.type_for_subscription(sub.subscription_type) or self.payment_type
             # importo bloccato dal prezzo del pacchetto (lo sconto resta a parte)
             if sub.package_id and (self.amount is None or self.amount == 0):
                 self.amount = sub.package.price
 
         # Calcolo prossima scadenza (come da Fase 3a)
         if not self.next_due_date:
-            base = self.due_date or self.payment_date
-            if base:
-                from dateutil.relativedelta import relativedelta
-                deltas = {
-                    self.PaymentType.MONTHLY: relativedelta(months=1),
-                    self.PaymentType.QUARTERLY: relativedelta(months=3),
-                    self.PaymentType.FOURMONTH: relativedelta(months=4),
-                    self.PaymentType.ENROLLMENT: relativedelta(years=1),
-                }
-                delta = deltas.get(self.payment_type)
-                if delta:
-                    self.next_due_date = base + delta
+            self.next_due_date = self.compute_next_due_date()
         super().save(*args, **kwargs)
 
+    @classmethod
+    def type_for_subscription(cls, subscription_type):
+        """Tipo di rata corrispondente al tipo di abbonamento (o None)."""
+        return {
+            'MONTHLY': cls.PaymentType.MONTHLY,
+            'QUARTERLY': cls.PaymentType.QUARTERLY,
+            'FOURMONTH': cls.PaymentType.FOURMONTH,
+            'SEMESTRAL': cls.PaymentType.QUARTERLY,  # fallback ragionevole
+            'ANNUAL': cls.PaymentType.ENROLLMENT,
+        }.get(subscription_type)
+
+    def compute_next_due_date(self):
+        """
+        Prossima scadenza dedotta dal tipo di rata, a partire dalla scadenza
+        (o dalla data di pagamento). Usata anche dagli import in blocco,
+        che non passano da save().
+        """
+        base = self.due_date or self.payment_date
+        if not base:
+            return None
+        from dateutil.relativedelta import relativedelta
+        deltas = {
+            self.PaymentType.MONTHLY: relativedelta(months=1),
+            self.PaymentType.QUARTERLY: relativedelta(months=3),
+            self.PaymentType.FOURMONTH: relativedelta(months=4),
+            self.PaymentType.ENROLLMENT: relativedelta(years=1),
+        }
+        delta = deltas.get(self.payment_type)
+        return base + delta if delta else None
+
 
 class Package(models.Model):
     """
@@ -515,3 +930,222 @@ class Package(models.Model):
             self.PackageType.SEMESTRAL: relativedelta(months=6),
             self.PackageType.ANNUAL: relativedelta(years=1),
         }.get(self.package_type)
+
+
+# ---------------------------------------------------------------------------
+#  FOTOGRAFIA DELLO STATO DEL SOCIO  (denormalizzata, aggiornata dai signal)
+# ---------------------------------------------------------------------------
+class MemberStatus(models.Model):
+    """
+    Stato corrente del socio, precalcolato: ultimo certificato medico,
+    abbonamenti attivi, prossima scadenza e saldo insoluto.
+    Aggiornato dai signal su salvataggio/eliminazione di documenti,
+    abbonamenti e pagamenti (vedi members/signals.py) e ricalcolato ogni
+    notte con `manage.py refresh_member_status`, perche' i conteggi
+    "attivi" dipendono dalla data odierna.
+    Serve a filtrare e ordinare le liste per stato con un WHERE indicizzato.
+    """
+    member = models.OneToOneField(
+        Member, on_delete=models.CASCADE, primary_key=True,
+        related_name="status_snapshot", verbose_name=_("Socio"),
+    )
+    has_certificate = models.BooleanField(_("Certificato presente"), default=False)
+    certificate_expiry = models.DateField(_("Scadenza ultimo certificato"), null=True, blank=True)
+    has_subscriptions = models.BooleanField(_("Ha abbonamenti"), default=False)
+    active_subscriptions = models.PositiveIntegerField(_("Abbonamenti attivi"), default=0)
+    next_subscription_end = models.DateField(_("Prossima scadenza abbonamento"), null=True, blank=True)
+    unpaid_balance = models.DecimalField(
+        _("Saldo insoluto €"), max_digits=10, decimal_places=2, default=0,
+    )
+    computed_on = models.DateField(_("Calcolato il"), null=True, blank=True)
+    updated_at = models.DateTimeField(_("Aggiornato il"), auto_now=True)
+
+    class Meta:
+        verbose_name = _("Stato socio")
+        verbose_name_plural = _("Stato soci")
+        indexes = [
+            models.Index(
+                fields=["has_certificate", "certificate_expiry", "has_subscriptions"],
+                name="memberstatus_cert_idx",
+            ),
+            models.Index(fields=["next_subscription_end"], name="memberstatus_next_end_idx"),
+            models.Index(fields=["active_subscriptions"], name="memberstatus_active_subs_idx"),
+            models.Index(fields=["unpaid_balance"], name="memberstatus_unpaid_idx"),
+        ]
+
+    def __str__(self):
+        return f"Stato di {self.member_id}"
+
+    def certificate_status(self, today=None):
+        """'Attivo' / 'Scaduto' / 'Assente', come in medical_certificate_status."""
+        today = today or timezone.now().date()
+        if not self.has_certificate:
+            return "Assente"
+        if self.certificate_expiry and self.certificate_expiry < today:
+            return "Scaduto"
+        return "Attivo"
+
+
+# ---------------------------------------------------------------------------
+#  STATISTICHE GIORNALIERE  (rollup per giorno e settore, per i grafici)
+# ---------------------------------------------------------------------------
+class DailyStats(models.Model):
+    """
+    Totali di un giorno per settore (sector vuoto = senza settore):
+    nuovi soci (date_joined), nuovi abbonamenti (start_date), abbonamenti
+    in scadenza (end_date), incassato (netto dei pagamenti pagati, per
+    payment_date) e da incassare (netto dei non pagati, per due_date).
+    Il settore di un pagamento e' quello dell'abbonamento collegato,
+    altrimenti quello del socio.
+    Ricostruito da `manage.py rebuild_daily_stats` e aggiornato dai signal
+    per i soli giorni toccati (members/rollup.py). I grafici leggono da qui.
+    """
+    day = models.DateField(_("Giorno"))
+    sector = models.ForeignKey(
+        # CASCADE e non SET_NULL: le righe del settore eliminato non si
+        # sommano a quelle senza settore, i giorni si ricalcolano (signals.py)
+        Sector, on_delete=models.CASCADE, null=True, blank=True,
+        related_name="daily_stats", verbose_name=_("Settore"),
+    )
+    new_members = models.PositiveIntegerField(_("Nuovi soci"), default=0)
+    new_subscriptions = models.PositiveIntegerField(_("Nuovi abbonamenti"), default=0)
+    expirations = models.PositiveIntegerField(_("Abbonamenti in scadenza"), default=0)
+    revenue = models.DecimalField(_("Incassato €"), max_digits=12, decimal_places=2, default=0)
+    outstanding = models.DecimalField(_("Da incassare €"), max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = _("Statistica giornaliera")
+        verbose_name_plural = _("Statistiche giornaliere")
+        indexes = [
+            models.Index(fields=["day", "sector"], name="dailystats_day_sector_idx"),
+        ]
+        constraints = [
+            # una riga per giorno e settore: due ricalcoli concorrenti dello
+            # stesso giorno non possono sommarsi (rollup.refresh_daily_stats).
+            # Due vincoli parziali perche' NULL (senza settore) non e' mai
+            # uguale a NULL in un UNIQUE, su SQLite come su PostgreSQL < 15.
+            models.UniqueConstraint(
+                fields=["day", "sector"], condition=Q(sector__isnull=False),
+                name="dailystats_day_sector_uniq",
+            ),
+            models.UniqueConstraint(
+                fields=["day"], condition=Q(sector__isnull=True),
+                name="dailystats_day_nosector_uniq",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.day} / {self.sector_id or '-'}"
+
+
+# ---------------------------------------------------------------------------
+#  CODA DI LAVORI IN BACKGROUND  (eseguiti da `manage.py run_worker`)
+# ---------------------------------------------------------------------------
+class Job(models.Model):
+    """
+    Lavoro da eseguire fuori dalla richiesta web (promemoria via email,
+    report pesanti...). `task` e' il nome registrato in members/jobs.py,
+    `payload` i suoi argomenti. Con `idempotency_key` lo stesso lavoro
+    non viene accodato due volte (es. un promemoria per abbonamento e scadenza).
+    """
+
+    class Status(models.TextChoices):
+        QUEUED = "QUEUED", _("In coda")
+        RUNNING = "RUNNING", _("In esecuzione")
+        DONE = "DONE", _("Completato")
+        FAILED = "FAILED", _("Fallito")
+
+    task = models.CharField(_("Attività"), max_length=100)
+    payload = models.JSONField(_("Parametri"), default=dict, blank=True)
+    idempotency_key = models.CharField(
+        _("Chiave di idempotenza"), max_length=200, unique=True, null=True, blank=True,
+    )
+    status = models.CharField(
+        _("Stato"), max_length=10, choices=Status.choices, default=Status.QUEUED,
+    )
+    attempts = models.PositiveSmallIntegerField(_("Tentativi"), default=0)
+    max_attempts = models.PositiveSmallIntegerField(_("Tentativi massimi"), default=5)
+    run_at = models.DateTimeField(_("Da eseguire dal"), default=timezone.now)
+    locked_by = models.CharField(_("Worker"), max_length=100, blank=True)
+    locked_at = models.DateTimeField(_("Preso in carico il"), null=True, blank=True)
+    last_error = models.TextField(_("Ultimo errore"), blank=True)
+    created_at = models.DateTimeField(_("Creato il"), auto_now_add=True)
+    finished_at = models.DateTimeField(_("Terminato il"), null=True, blank=True)
+
+    class Meta:
+        verbose_name = _("Lavoro in coda")
+        verbose_name_plural = _("Lavori in coda")
+        ordering = ["run_at", "id"]
+        indexes = [
+            # prossimo lavoro da eseguire (e lavori bloccati da riprendere)
+            models.Index(fields=["status", "run_at", "id"], name="job_ready_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.task} #{self.pk} ({self.get_status_display()})"
+
+
+# ---------------------------------------------------------------------------
+#  ARCHIVIO DEI SOCI DIMESSI  (members/archive.py, `manage.py archive_members`)
+# ---------------------------------------------------------------------------
+class ArchivedMember(models.Model):
+    """
+    Socio dimesso da anni, tolto dalle tabelle di lavoro: il socio e le sue
+    righe (affiliazioni, abbonamenti, pagamenti, documenti) serializzati in
+    `data`, i file in `tarball` (uno per anno di dimissione). Nessuna
+    chiave esterna: con SGS_ARCHIVE_DB la tabella sta in un database a
+    parte (members/routers.py). Il ripristino rimette le righe con le
+    stesse chiavi primarie.
+    """
+    member_id = models.BigIntegerField(_("ID socio"), unique=True)
+    username = models.CharField(_("Username"), max_length=150)
+    first_name = models.CharField(_("Nome"), max_length=150, blank=True)
+    last_name = models.CharField(_("Cognome"), max_length=150, blank=True)
+    card_number = models.CharField(_("Numero tessera"), max_length=30, blank=True)
+    fiscal_code = models.CharField(_("Codice fiscale"), max_length=16, blank=True)
+    dismissed_on = models.DateField(_("Dimesso il"), null=True, blank=True)
+    data = models.JSONField(_("Righe archiviate"), encoder=DjangoJSONEncoder)
+    files = models.JSONField(_("File nel tarball"), default=list, blank=True)
+    tarball = models.CharField(_("Tarball"), max_length=255, blank=True)
+    archived_at = models.DateTimeField(_("Archiviato il"), auto_now_add=True)
+
+    class Meta:
+        verbose_name = _("Socio archiviato")
+        verbose_name_plural = _("Soci archiviati")
+        ordering = ["last_name", "first_name"]
+        indexes = [
+            models.Index(fields=["last_name", "first_name"], name="archived_member_name_idx"),
+        ]
+
+    def __str__(self):
+        full = f"{self.first_name} {self.last_name}".strip()
+        return full or self.username
+
+
+class ArchivedDocument(models.Model):
+    """
+    Documento scaduto da anni di un socio attivo, gia' sostituito da uno
+    piu' recente dello stesso tipo: la riga serializzata in `data`, i file
+    nel tarball dell'anno di scadenza. Come ArchivedMember, senza chiavi
+    esterne e nello stesso database.
+    """
+    document_id = models.BigIntegerField(_("ID documento"), unique=True)
+    member_id = models.BigIntegerField(_("ID socio"), db_index=True)
+    member_name = models.CharField(_("Socio"), max_length=300, blank=True)
+    document_type = models.CharField(
+        _("Tipo documento"), max_length=50, choices=MemberDocument.DocumentType.choices,
+    )
+    expiration_date = models.DateField(_("Data di Scadenza"), null=True, blank=True)
+    data = models.JSONField(_("Righe archiviate"), encoder=DjangoJSONEncoder)
+    files = models.JSONField(_("File nel tarball"), default=list, blank=True)
+    tarball = models.CharField(_("Tarball"), max_length=255, blank=True)
+    archived_at = models.DateTimeField(_("Archiviato il"), auto_now_add=True)
+
+    class Meta:
+        verbose_name = _("Documento archiviato")
+        verbose_name_plural = _("Documenti archiviati")
+        ordering = ["-expiration_date"]
+
+    def __str__(self):
+        return f"{self.member_name} - {self.get_document_type_display()}"
+
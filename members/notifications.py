@@ -0,0 +1,161 @@
+# members/notifications.py
+# Promemoria via email, eseguiti dalla coda (members/jobs.py):
+#   - abbonamento in scadenza entro SGS_REMINDER_DAYS giorni (non rinnovato);
+#   - ultimo certificato medico in scadenza entro SGS_REMINDER_DAYS giorni;
+#   - rata non pagata scaduta (is_overdue) da non piu' di SGS_OVERDUE_DAYS giorni.
+#
+# Lo smistamento (send_reminders) gira una volta al giorno nel worker:
+# poche query indicizzate e un bulk_create di un lavoro per avviso, con
+# chiave di idempotenza (avviso, oggetto, data): rilanciarlo non duplica
+# nulla e ogni socio riceve un solo avviso per scadenza. Ogni avviso
+# ricontrolla lo stato prima di inviare (nel frattempo il socio puo' aver
+# pagato o rinnovato). Destinatario: email del socio, altrimenti del genitore.
+
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.mail import send_mail
+from django.db.models import Q
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .jobs import enqueue, enqueue_many, task
+from .models import Job, MemberStatus, Payment, Subscription
+
+SUBSCRIPTION_EXPIRING = 'notifications.subscription_expiring'
+CERTIFICATE_EXPIRING = 'notifications.certificate_expiring'
+PAYMENT_OVERDUE = 'notifications.payment_overdue'
+SEND_REMINDERS = 'notifications.send_reminders'
+
+
+def reminder_days():
+    return getattr(settings, 'SGS_REMINDER_DAYS', 15)
+
+
+def overdue_days():
+    return getattr(settings, 'SGS_OVERDUE_DAYS', 60)
+
+
+def recipient(member):
+    """Email a cui scrivere per il socio ('' se nessuna)."""
+    if member.email:
+        return member.email
+    if member.guardian_id and member.guardian.email:
+        return member.guardian.email
+    return ''
+
+
+def _reachable(prefix):
+    """Socio non dimesso con un'email propria o del genitore."""
+    return Q(**{f'{prefix}is_dismissed': False}) & (
+        Q(**{f'{prefix}email__gt': ''}) | Q(**{f'{prefix}guardian__email__gt': ''})
+    )
+
+
+def send_notice(member, template, context):
+    """Invia l'avviso `template` (emails/<template>_subject.txt e .txt)."""
+    to = recipient(member)
+    if not to:
+        return False
+    context = {'member': member, **context}
+    subject = render_to_string(f'emails/{template}_subject.txt', context).strip()
+    body = render_to_string(f'emails/{template}.txt', context)
+    send_mail(subject, body, None, [to])
+    return True
+
+
+# ---------------------------------------------------------------------------
+#  SMISTAMENTO GIORNALIERO
+# ---------------------------------------------------------------------------
+def _jobs(task_name, key_prefix, rows):
+    return [
+        Job(task=task_name, payload=payload, idempotency_key=f'{key_prefix}:{key}')
+        for key, payload in rows
+    ]
+
+
+def expiring_subscriptions(today, days):
+    return (
+        Subscription.objects
+        .filter(end_date__gte=today, end_date__lte=today + timedelta(days=days))
+        .filter(_reachable('member__'))
+        .not_renewed()
+    )
+
+
+def expiring_certificates(today, days):
+    return MemberStatus.objects.filter(
+        has_certificate=True,
+        certificate_expiry__gte=today, certificate_expiry__lte=today + timedelta(days=days),
+    ).filter(_reachable('member__'))
+
+
+def overdue_payments(today, days):
+    return Payment.objects.filter(
+        is_paid=False, due_date__lt=today, due_date__gte=today - timedelta(days=days),
+    ).filter(_reachable('member__'))
+
+
+@task(SEND_REMINDERS)
+def send_reminders(day=None):
+    """Accoda gli avvisi del giorno `day` (AAAA-MM-GG, default oggi)."""
+    today = date.fromisoformat(day) if day else timezone.localdate()
+    jobs = _jobs(SUBSCRIPTION_EXPIRING, 'subscription-expiring', (
+        (f'{pk}:{end}', {'subscription_id': pk})
+        for pk, end in expiring_subscriptions(today, reminder_days())
+        .values_list('pk', 'end_date').iterator()
+    ))
+    jobs += _jobs(CERTIFICATE_EXPIRING, 'certificate-expiring', (
+        (f'{member_id}:{expiry}', {'member_id': member_id, 'expiry': expiry.isoformat()})
+        for member_id, expiry in expiring_certificates(today, reminder_days())
+        .values_list('member_id', 'certificate_expiry').iterator()
+    ))
+    jobs += _jobs(PAYMENT_OVERDUE, 'payment-overdue', (
+        (f'{pk}:{due}', {'payment_id': pk})
+        for pk, due in overdue_payments(today, overdue_days())
+        .values_list('pk', 'due_date').iterator()
+    ))
+    enqueue_many(jobs)
+    return len(jobs)
+
+
+def schedule_reminders(today=None):
+    """Accoda lo smistamento del giorno (una sola volta, anche con piu' worker)."""
+    today = today or timezone.localdate()
+    return enqueue(SEND_REMINDERS, {'day': today.isoformat()}, key=f'reminders:{today}')
+
+
+# ---------------------------------------------------------------------------
+#  AVVISI (un lavoro per socio e scadenza)
+# ---------------------------------------------------------------------------
+@task(SUBSCRIPTION_EXPIRING)
+def subscription_expiring(subscription_id):
+    today = timezone.localdate()
+    sub = (
+        expiring_subscriptions(today, reminder_days())
+        .select_related('member__guardian', 'sector', 'package')
+        .filter(pk=subscription_id).first()
+    )
+    if sub is not None:  # rinnovato, eliminato o gia' scaduto: niente avviso
+        send_notice(sub.member, 'subscription_expiring', {'subscription': sub})
+
+
+@task(CERTIFICATE_EXPIRING)
+def certificate_expiring(member_id, expiry):
+    status = (
+        MemberStatus.objects.select_related('member__guardian')
+        .filter(pk=member_id, has_certificate=True, certificate_expiry=expiry).first()
+    )
+    if status is not None:  # nel frattempo e' arrivato un certificato nuovo
+        send_notice(status.member, 'certificate_expiring', {'expiry': status.certificate_expiry})
+
+
+@task(PAYMENT_OVERDUE)
+def payment_overdue(payment_id):
+    payment = (
+        Payment.objects.select_related('member__guardian')
+        .filter(pk=payment_id, is_paid=False).first()
+    )
+    if payment is not None and payment.is_overdue:
+        send_notice(payment.member, 'payment_overdue', {'payment': payment})
+
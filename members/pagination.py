@@ -0,0 +1,107 @@
+# members/pagination.py
+# Paginazione "keyset" (a cursore): invece di OFFSET N si filtra con
+# WHERE (chiave) > (ultima chiave vista). La pagina N costa come la prima
+# e non serve contare le righe totali.
+
+import base64
+import json
+
+from django.db.models import F, Q
+
+DEFAULT_PAGE_SIZE = 50
+
+
+class KeysetPage:
+    """Una pagina di risultati piu' il cursore per la successiva."""
+
+    def __init__(self, object_list, next_cursor, is_first):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.is_first = is_first
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+
+def _parse_keys(model, keys):
+    """['-end_date', '-id'] -> [(campo, discendente), ...]"""
+    parsed = []
+    for key in keys:
+        name = key.lstrip('-')
+        parsed.append((model._meta.get_field(name), key.startswith('-')))
+    return parsed
+
+
+def encode_cursor(values):
+    raw = json.dumps([v.isoformat() if hasattr(v, 'isoformat') else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, fields):
+    """Restituisce i valori del cursore, o None se il cursore non e' valido."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if len(raw) != len(fields):
+            return None
+        return [None if v is None else field.to_python(v) for v, (field, _) in zip(raw, fields)]
+    except Exception:
+        return None
+
+
+def _after_q(fields, values):
+    """
+    Condizione "viene dopo il cursore" per un ordinamento lessicografico.
+    I NULL stanno sempre in fondo (NULLS LAST), in entrambe le direzioni.
+    """
+    condition = Q(pk__in=[])
+    equal = Q()
+    for (field, desc), value in zip(fields, values):
+        name = field.attname
+        if value is None:
+            after = Q(pk__in=[])
+            same = Q(**{f'{name}__isnull': True})
+        else:
+            after = Q(**{f'{name}__lt' if desc else f'{name}__gt': value})
+            if field.null:
+                after |= Q(**{f'{name}__isnull': True})
+            same = Q(**{name: value})
+        condition |= equal & after
+        equal &= same
+    return condition
+
+
+def keyset_paginate(queryset, keys, cursor=None, per_page=DEFAULT_PAGE_SIZE):
+    """
+    Pagina `queryset` ordinandolo per `keys` (l'ultima chiave deve essere
+    univoca, es. 'id'). `cursor` e' il valore restituito dalla pagina
+    precedente in `next_cursor`.
+    """
+    fields = _parse_keys(queryset.model, keys)
+    ordering = [
+        F(field.attname).desc(nulls_last=True) if desc else F(field.attname).asc(nulls_last=True)
+        for field, desc in fields
+    ]
+    queryset = queryset.order_by(*ordering)
+
+    values = decode_cursor(cursor, fields) if cursor else None
+    if values is not None:
+        queryset = queryset.filter(_after_q(fields, values))
+
+    rows = list(queryset[:per_page + 1])
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        last = rows[-1]
+        next_cursor = encode_cursor([getattr(last, field.attname) for field, _ in fields])
+    return KeysetPage(rows, next_cursor, is_first=values is None)
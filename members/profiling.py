@@ -0,0 +1,176 @@
+# members/profiling.py
+# Profilazione delle richieste, facoltativa (SGS_PROFILING=1).
+#
+# Per ogni richiesta misura: tempo totale, numero di query e tempo SQL
+# (connection.execute_wrapper), tempo di rendering dei template. Una
+# stessa istruzione SQL ripetuta piu' di N_PLUS_ONE_MIN volte nella
+# richiesta (stesso testo, parametri diversi) e' segnalata come possibile
+# N+1. Le richieste piu' lente della soglia finiscono, una riga JSON per
+# richiesta, in un log a rotazione; `manage.py perf_report` lo riassume.
+# In ogni risposta l'header Server-Timing riporta i tempi (DevTools).
+#
+# Disattivata, il middleware si toglie dalla catena (MiddlewareNotUsed):
+# nessun costo per le richieste.
+
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import time
+from collections import Counter
+from contextlib import ExitStack
+from functools import wraps
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.base import Template
+from django.utils import timezone
+
+logger = logging.getLogger('members.profiling')
+slow_log = logging.getLogger('members.profiling.slow')
+
+N_PLUS_ONE_MIN = 5
+SQL_PREVIEW = 300
+
+_current = contextvars.ContextVar('sgs_profile', default=None)
+
+
+class RequestProfile:
+    """Misure di una richiesta (usato anche come execute_wrapper)."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - start
+            self.queries += 1
+            self.statements[sql] += 1
+
+    @property
+    def wall_time(self):
+        return time.perf_counter() - self.started
+
+    def n_plus_one(self):
+        """Istruzioni ripetute: [{'sql', 'count'}], le piu' frequenti prima."""
+        return [
+            {'sql': sql[:SQL_PREVIEW], 'count': count}
+            for sql, count in self.statements.most_common()
+            if count >= N_PLUS_ONE_MIN
+        ]
+
+
+def _timed_render(render):
+    """Template.render misurato: conta solo il template piu' esterno (include compresi)."""
+    @wraps(render)
+    def wrapper(self, context):
+        profile = _current.get()
+        if profile is None or profile.template_depth:
+            return render(self, context)
+        profile.template_depth += 1
+        start = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            profile.template_time += time.perf_counter() - start
+            profile.template_depth -= 1
+    wrapper._sgs_profiled = True
+    return wrapper
+
+
+def install_template_timer():
+    if not getattr(Template.render, '_sgs_profiled', False):
+        Template.render = _timed_render(Template.render)
+
+
+def log_path():
+    return str(getattr(settings, 'SGS_PROFILING_LOG', settings.BASE_DIR / 'perf.log'))
+
+
+def _configure_slow_log(path):
+    """Log a rotazione su `path` (sostituisce un handler su un altro file)."""
+    for handler in list(slow_log.handlers):
+        if getattr(handler, 'baseFilename', None) == os.path.abspath(path):
+            return
+        slow_log.removeHandler(handler)
+        handler.close()
+    handler = logging.handlers.RotatingFileHandler(
+        path, maxBytes=getattr(settings, 'SGS_PROFILING_LOG_BYTES', 10 * 1024 * 1024),
+        backupCount=getattr(settings, 'SGS_PROFILING_LOG_BACKUPS', 5), encoding='utf-8',
+    )
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    slow_log.addHandler(handler)
+    slow_log.setLevel(logging.INFO)
+    slow_log.propagate = False
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 1)
+
+
+class ProfilingMiddleware:
+    """
+    Da mettere per primo in MIDDLEWARE, cosi' misura anche gli altri.
+    Impostazioni: SGS_PROFILING (attiva), SGS_PROFILING_SLOW_MS (soglia
+    del log, default 500), SGS_PROFILING_LOG (file JSON lines).
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'SGS_PROFILING', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.slow_ms = getattr(settings, 'SGS_PROFILING_SLOW_MS', 500)
+        _configure_slow_log(log_path())
+        install_template_timer()
+
+    def __call__(self, request):
+        profile = RequestProfile()
+        token = _current.set(profile)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(profile))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+
+        wall = profile.wall_time
+        response['Server-Timing'] = (
+            f'db;desc="{profile.queries} query";dur={_ms(profile.sql_time)}, '
+            f'tpl;dur={_ms(profile.template_time)}, total;dur={_ms(wall)}'
+        )
+        if _ms(wall) >= self.slow_ms:
+            self.log(request, response, profile, wall)
+        return response
+
+    def log(self, request, response, profile, wall):
+        match = getattr(request, 'resolver_match', None)
+        record = {
+            'ts': timezone.now().isoformat(timespec='seconds'),
+            'method': request.method,
+            'path': request.path,
+            'url_name': match.view_name if match else '',
+            'status': response.status_code,
+            'wall_ms': _ms(wall),
+            'queries': profile.queries,
+            'sql_ms': _ms(profile.sql_time),
+            'template_ms': _ms(profile.template_time),
+            'n_plus_one': profile.n_plus_one(),
+        }
+        slow_log.info(json.dumps(record, ensure_ascii=False))
+        if record['n_plus_one']:
+            logger.warning(
+                "Possibile N+1 in %s: %s query ripetuta %s volte",
+                record['url_name'] or record['path'],
+                record['n_plus_one'][0]['sql'][:80], record['n_plus_one'][0]['count'],
+            )
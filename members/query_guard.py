@@ -0,0 +1,214 @@
+# members/query_guard.py
+# Guardia contro le regressioni N+1 (usata dai test, QueryCountTests).
+#
+# Percorre tutte le URL con nome servite dalle viste di members, le
+# chiama da utente di segreteria con dati sintetici a due volumi (piu'
+# soci, e per il socio "di riferimento" piu' abbonamenti, pagamenti e
+# certificati) e confronta il numero di query: una pagina corretta ne fa
+# lo stesso numero a qualsiasi volume. Per ogni query che cresce si
+# riporta l'SQL e da dove parte: riga del template in rendering e/o riga
+# del codice del progetto (es. una property del modello chiamata nel
+# ciclo del template).
+
+import os
+import sys
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+
+from .benchmarks import office_client
+from .charts import SERIES
+from .exports import DATASETS
+from .models import DocumentUpload, Instructor, Member, Package, Payment, Sector, Subscription
+from .synthetic import PREFIX, SyntheticData
+
+# (soci aggiunti, abbonamenti aggiunti al socio di riferimento) per volume
+STEPS = ((10, 2), (30, 8))
+
+# parametri <int:pk>: modello scelto in base al nome della URL
+PK_MODELS = (
+    ('sector', Sector), ('instructor', Instructor), ('package', Package),
+    ('payment', Payment), ('subscription', Subscription),
+)
+# parametri <slug:...>: si prova ogni valore
+SLUG_VALUES = {'series': sorted(SERIES), 'dataset': sorted(DATASETS)}
+
+SQL_PREVIEW = 200
+_HERE = os.path.abspath(__file__)
+
+
+# ---------------------------------------------------------------------------
+#  RACCOLTA DELLE QUERY
+# ---------------------------------------------------------------------------
+def _origin():
+    """'codice <- template' da cui parte la query corrente."""
+    code = template = None
+    frame = sys._getframe(2)
+    base = str(settings.BASE_DIR)
+    while frame is not None and template is None:
+        filename = frame.f_code.co_filename
+        if frame.f_code.co_name == 'render_annotated':
+            node = frame.f_locals.get('self')
+            token, origin = getattr(node, 'token', None), getattr(node, 'origin', None)
+            if token is not None and origin is not None:
+                template = f'{origin.template_name or origin.name}:{token.lineno}'
+        elif (code is None and filename.startswith(base) and filename != _HERE
+              and 'site-packages' not in filename):
+            code = f'{os.path.relpath(filename, base)}:{frame.f_lineno}'
+        frame = frame.f_back
+    return ' <- '.join(part for part in (code, template) if part) or '?'
+
+
+class QueryLog:
+    """execute_wrapper: conta le istruzioni SQL e ne ricorda l'origine."""
+
+    def __init__(self):
+        self.statements = Counter()
+        self.origins = defaultdict(Counter)
+
+    def __call__(self, execute, sql, params, many, context):
+        self.statements[sql] += 1
+        self.origins[sql][_origin()] += 1
+        return execute(sql, params, many, context)
+
+    @property
+    def total(self):
+        return sum(self.statements.values())
+
+
+def measure(client, url, params=None):
+    """Query di una GET a cache vuota (contenuto in streaming compreso)."""
+    cache.clear()
+    log = QueryLog()
+    with connection.execute_wrapper(log):
+        response = client.get(url, params or {})
+        if response.streaming:
+            b''.join(response.streaming_content)
+    return log, response.status_code
+
+
+# ---------------------------------------------------------------------------
+#  URL DA PERCORRERE
+# ---------------------------------------------------------------------------
+def office_patterns(patterns=None, namespace=''):
+    """(nome completo, parametri) delle URL con nome servite da members."""
+    if patterns is None:
+        patterns = get_resolver().url_patterns
+    for entry in patterns:
+        if isinstance(entry, URLResolver):
+            prefix = f'{namespace}{entry.namespace}:' if entry.namespace else namespace
+            yield from office_patterns(entry.url_patterns, prefix)
+        elif isinstance(entry, URLPattern) and entry.name:
+            if getattr(entry.callback, '__module__', '').startswith('members.'):
+                yield f'{namespace}{entry.name}', sorted(entry.pattern.converters)
+
+
+class Scenario:
+    """Dati sintetici che crescono a ogni passo, con un socio di riferimento."""
+
+    def __init__(self, seed=7):
+        self.data = SyntheticData(seed=seed, batch_size=500)
+        self.member = None
+
+    def grow(self, members, history):
+        self.data.generate(members)
+        if self.member is None:
+            self.member = (Member.objects
+                           .filter(username__startswith=PREFIX, guardian__isnull=True, is_dismissed=False)
+                           .order_by('pk').first())
+        self.data.extend_history(self.member, history)
+
+    def value(self, name, param):
+        """Valore del parametro `param` della URL `name` (None se sconosciuto)."""
+        member = self.member
+        if param == 'member_id':
+            return member.pk
+        if param == 'document_id':
+            return member.documents.order_by('expiration_date').last().pk
+        if param == 'upload_id':
+            return DocumentUpload.objects.get_or_create(
+                member=member, defaults={'filename': 'scansione.pdf', 'size': 1024},
+            )[0].pk
+        if param == 'pk':
+            for key, model in PK_MODELS:
+                if key in name.rsplit(':', 1)[-1]:
+                    if model is Sector:
+                        return member.sector_id
+                    if model is Instructor:
+                        return member.instructor_id
+                    if model is Package:
+                        return member.subscriptions.order_by('start_date').last().package_id
+                    return model.objects.filter(member=member).order_by('-pk').first().pk
+        return None
+
+    def urls(self):
+        """[(etichetta, url)] per ogni URL di members; i parametri sconosciuti in `missing`."""
+        urls, missing = [], []
+        for name, params in office_patterns():
+            variants = [{}]
+            for param in params:
+                if param in SLUG_VALUES:
+                    variants = [dict(v, **{param: s}) for v in variants for s in SLUG_VALUES[param]]
+                    continue
+                value = self.value(name, param)
+                if value is None:
+                    missing.append(f'{name} ({param})')
+                    variants = []
+                    break
+                variants = [dict(v, **{param: value}) for v in variants]
+            for kwargs in variants:
+                label = ' '.join([name] + [kwargs[p] for p in params if p in SLUG_VALUES])
+                urls.append((label, reverse(name, kwargs=kwargs)))
+        return urls, missing
+
+
+# ---------------------------------------------------------------------------
+#  CONFRONTO
+# ---------------------------------------------------------------------------
+def growth(small, large):
+    """Istruzioni eseguite piu' volte nella misura grande che nella piccola."""
+    rows = []
+    for sql, count in large.statements.items():
+        extra = count - small.statements.get(sql, 0)
+        if extra > 0:
+            rows.append((extra, sql, large.origins[sql]))
+    return sorted(rows, key=lambda row: -row[0])
+
+
+def format_growth(label, small, large):
+    lines = [f'{label}: {small.total} -> {large.total} query']
+    for extra, sql, origins in growth(small, large):
+        lines.append(f'  +{extra}  {sql[:SQL_PREVIEW]}')
+        for origin, count in origins.most_common(3):
+            lines.append(f'        {count}x  {origin}')
+    return '\n'.join(lines)
+
+
+def check(steps=STEPS, seed=7):
+    """
+    Misura ogni URL a ogni passo di `steps`. Restituisce (problemi, misure):
+    problemi e' una lista di testi (URL con query in crescita, parametri
+    che non si sanno valorizzare, errori), misure {etichetta: [query...]}.
+    """
+    scenario = Scenario(seed)
+    client = office_client()
+    runs = []
+    for members, history in steps:
+        scenario.grow(members, history)
+        urls, missing = scenario.urls()
+        if missing:
+            return [f'Parametro URL senza valore di prova: {m}' for m in missing], {}
+        runs.append({label: measure(client, url) for label, url in urls})
+
+    problems, counts = [], {}
+    for label, (first, status) in runs[0].items():
+        logs = [run[label][0] for run in runs]
+        counts[label] = [log.total for log in logs]
+        if status >= 500:
+            problems.append(f'{label}: risposta {status}')
+        elif logs[-1].total > first.total:
+            problems.append(format_growth(label, first, logs[-1]))
+    return problems, counts
@@ -0,0 +1,72 @@
+# members/query_plans.py
+# Controllo dei piani di esecuzione: quali query fanno una scansione
+# completa di una tabella invece di usare un indice.
+#   SQLite     -> EXPLAIN QUERY PLAN  ("SCAN tabella" senza "USING ... INDEX")
+#   PostgreSQL -> EXPLAIN             ("Seq Scan on tabella")
+
+import re
+
+from django.db import connection
+
+# Tabelle "calde": una scansione completa qui e' un problema di prestazioni.
+HOT_TABLES = (
+    'members_member',
+    'members_memberdocument',
+    'members_subscription',
+    'members_payment',
+    'members_memberstatus',
+)
+
+_SQLITE_SCAN = re.compile(r'\bSCAN (\w+)(?: AS \w+)?(.*)$')
+_POSTGRES_SCAN = re.compile(r'Seq Scan on (\w+)')
+
+
+def explain(sql, params=None, using=connection):
+    """Restituisce il piano di esecuzione di `sql` come lista di righe."""
+    if using.vendor == 'sqlite':
+        prefix = 'EXPLAIN QUERY PLAN '
+    elif using.vendor == 'postgresql':
+        prefix = 'EXPLAIN '
+    else:
+        raise NotImplementedError(f"EXPLAIN non supportato per {using.vendor}")
+    with using.cursor() as cursor:
+        if using.vendor == 'postgresql' and not using.get_autocommit():
+            # Su tabelle piccole (test, benchmark) PostgreSQL preferisce
+            # comunque la Seq Scan: cosi' si verifica che un indice esista
+            # e sia utilizzabile per la query.
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        cursor.execute(prefix + sql, params or ())
+        rows = cursor.fetchall()
+    # SQLite: (id, parent, notused, detail) / PostgreSQL: (riga,)
+    return [str(row[-1]) for row in rows]
+
+
+def full_scans(plan, tables=HOT_TABLES, vendor=None):
+    """Tabelle di `tables` lette per intero (senza indice) nel piano."""
+    vendor = vendor or connection.vendor
+    found = []
+    for line in plan:
+        if vendor == 'sqlite':
+            match = _SQLITE_SCAN.search(line)
+            if match and 'INDEX' not in match.group(2):
+                found.append(match.group(1))
+        else:
+            match = _POSTGRES_SCAN.search(line)
+            if match:
+                found.append(match.group(1))
+    return [t for t in found if t in tables]
+
+
+def plan_report(queries, tables=HOT_TABLES, using=connection):
+    """
+    Dato l'elenco di query catturate (CaptureQueriesContext.captured_queries),
+    restituisce [(sql, piano, tabelle_scansionate)] per le sole SELECT.
+    """
+    report = []
+    for query in queries:
+        sql = query['sql']
+        if not sql.lstrip().upper().startswith('SELECT'):
+            continue
+        plan = explain(sql, using=using)
+        report.append((sql, plan, full_scans(plan, tables, using.vendor)))
+    return report
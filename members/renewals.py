@@ -0,0 +1,120 @@
+# members/renewals.py
+# Rinnovo in blocco degli abbonamenti in scadenza (inizio stagione).
+#
+# Anteprima: gli abbonamenti che finiscono nell'intervallo scelto, non
+# ancora rinnovati, con il nuovo periodo calcolato da Package.duration
+# (inizio = giorno dopo la fine, come farebbe la segreteria a mano) e
+# l'importo dal listino. Due query (elenco e sovrapposizioni), nessun
+# accesso per riga.
+#
+# Conferma: in una transazione si rilegge l'elenco (un doppio invio non
+# rinnova due volte) e si creano tutti gli abbonamenti e poi tutti i
+# pagamenti con due bulk_create, con date fine, tipi e importi gia'
+# calcolati: niente save() per riga. bulk_create non invia i signal,
+# quindi MemberStatus e DailyStats si aggiornano alla fine, una volta sola.
+
+from datetime import timedelta
+
+from django.db import transaction
+
+from .models import Payment, Subscription
+from .rollup import refresh_daily_stats
+from .status import refresh_member_status
+
+BATCH_SIZE = 500
+
+
+class Renewal:
+    """Rinnovo proposto per un abbonamento (o il motivo per cui non si puo')."""
+
+    def __init__(self, source):
+        self.source = source
+        self.member = source.member
+        self.package = source.package
+        self.start_date = source.end_date + timedelta(days=1)
+        self.end_date = None
+        self.amount = None
+        self.problem = ''
+        if self.package is None:
+            self.problem = "Senza pacchetto"
+        elif not self.package.is_active:
+            self.problem = "Pacchetto non più a listino"
+        elif not self.package.duration:
+            self.problem = "Durata del pacchetto sconosciuta"
+        else:
+            self.end_date = self.start_date + self.package.duration
+            self.amount = self.package.price
+
+    @property
+    def ok(self):
+        return not self.problem
+
+    def subscription(self):
+        return Subscription(
+            member=self.member, package=self.package,
+            sector_id=self.source.sector_id or self.package.sector_id,
+            subscription_type=self.package.package_type,
+            start_date=self.start_date, end_date=self.end_date,
+        )
+
+    def payment(self, subscription):
+        payment = Payment(
+            member=self.member, subscription=subscription,
+            payment_type=Payment.type_for_subscription(subscription.subscription_type) or '',
+            due_date=self.start_date, amount=self.amount, is_paid=False,
+        )
+        payment.next_due_date = payment.compute_next_due_date()
+        return payment
+
+
+def renewal_candidates(start, end, sector=None):
+    """Abbonamenti che finiscono tra start ed end, non ancora rinnovati."""
+    subscriptions = (
+        Subscription.objects
+        .filter(end_date__gte=start, end_date__lte=end, member__is_dismissed=False)
+        .not_renewed()
+        .select_related('member', 'package')
+        .order_by('end_date', 'member__last_name', 'member__first_name', 'id')
+    )
+    if sector:
+        subscriptions = subscriptions.filter(sector=sector)
+    return subscriptions
+
+
+def plan_renewals(subscriptions):
+    """
+    Rinnovi proposti. Le sovrapposizioni con altri abbonamenti (o tra i
+    rinnovi stessi) si controllano per tutto il blocco con una query.
+    """
+    renewals = [Renewal(sub) for sub in subscriptions]
+    feasible = [r for r in renewals if r.ok]
+    clashes = Subscription.objects.overlaps_in_batch([r.subscription() for r in feasible])
+    for index in clashes:
+        feasible[index].problem = "Si sovrappone a un altro abbonamento"
+    return renewals
+
+
+def renew(subscription_ids):
+    """
+    Rinnova gli abbonamenti indicati (se ancora da rinnovare e rinnovabili).
+    Restituisce la lista degli abbonamenti creati.
+    """
+    with transaction.atomic():
+        sources = (
+            Subscription.objects.filter(pk__in=list(subscription_ids), end_date__isnull=False)
+            .not_renewed().select_related('member', 'package').select_for_update(of=('self',))
+        )
+        renewals = [r for r in plan_renewals(sources) if r.ok]
+        created = Subscription.objects.bulk_create(
+            [r.subscription() for r in renewals], batch_size=BATCH_SIZE,
+        )
+        Payment.objects.bulk_create(
+            [r.payment(sub) for r, sub in zip(renewals, created)], batch_size=BATCH_SIZE,
+        )
+        if created:
+            refresh_member_status({sub.member_id for sub in created})
+            days = set()
+            for sub in created:
+                days.update({sub.start_date, sub.end_date})
+            refresh_daily_stats(days)
+    return created
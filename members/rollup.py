@@ -0,0 +1,157 @@
+# members/rollup.py
+# Calcolo di DailyStats (totali per giorno e settore).
+#
+# Cinque GROUP BY (soci, abbonamenti iniziati, abbonamenti in scadenza,
+# incassato, da incassare) sui soli giorni richiesti; le righe di quei
+# giorni vengono sostituite in blocco. Senza giorni si ricostruisce tutto.
+# I signal (signals.py) ricalcolano i giorni toccati da ogni modifica.
+# Calcolo e sostituzione stanno nella stessa transazione; (giorno,
+# settore) e' univoco, quindi se due ricalcoli concorrenti riscrivono lo
+# stesso giorno il secondo fallisce sul vincolo e riparte, invece di
+# aggiungere righe doppie.
+#
+# Le funzioni accettano un registro `apps` per poter essere usate anche
+# dalla migrazione che crea la tabella (modelli storici).
+
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.apps import apps as global_apps
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DecimalField, F, Q, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+MONEY = DecimalField(max_digits=12, decimal_places=2)
+
+
+def _runs(days):
+    """Giorni raggruppati in intervalli contigui: [(primo, ultimo), ...]."""
+    runs = []
+    for day in sorted(days):
+        if runs and day == runs[-1][1] + timedelta(days=1):
+            runs[-1][1] = day
+        else:
+            runs.append([day, day])
+    return runs
+
+
+def _days_q(field, days, is_datetime=False):
+    """
+    Condizione "field cade in uno dei giorni" (nessun filtro se days e' None),
+    come OR di intervalli: un anno intero e' un solo BETWEEN.
+    Sui DateTimeField si confrontano istanti, non __date: l'indice resta utile.
+    """
+    if days is None:
+        return Q()
+    condition = Q(pk__in=[])
+    for first, last in _runs(days):
+        if is_datetime:
+            lower = timezone.make_aware(datetime.combine(first, time.min))
+            upper = timezone.make_aware(datetime.combine(last + timedelta(days=1), time.min))
+            condition |= Q(**{f'{field}__gte': lower, f'{field}__lt': upper})
+        else:
+            condition |= Q(**{f'{field}__range': (first, last)})
+    return condition
+
+
+def compute_daily_stats(days=None, apps=global_apps):
+    """Righe DailyStats (non salvate) per i giorni indicati, o per tutti."""
+    Member = apps.get_model('members', 'Member')
+    Subscription = apps.get_model('members', 'Subscription')
+    Payment = apps.get_model('members', 'Payment')
+    DailyStats = apps.get_model('members', 'DailyStats')
+
+    totals = defaultdict(dict)  # (giorno, settore) -> {campo: valore}
+
+    def collect(queryset, day, sector, field, value):
+        rows = (
+            queryset.order_by()
+            .annotate(stat_day=day, stat_sector=sector)
+            .values('stat_day', 'stat_sector')
+            .annotate(value=value)
+        )
+        for row in rows:
+            if row['stat_day'] is not None:
+                totals[(row['stat_day'], row['stat_sector'])][field] = row['value']
+
+    collect(
+        Member.objects.filter(_days_q('date_joined', days, is_datetime=True)),
+        TruncDate('date_joined'), F('sector'), 'new_members', Count('pk'),
+    )
+    collect(
+        Subscription.objects.filter(_days_q('start_date', days)),
+        F('start_date'), F('sector'), 'new_subscriptions', Count('pk'),
+    )
+    collect(
+        Subscription.objects.filter(end_date__isnull=False).filter(_days_q('end_date', days)),
+        F('end_date'), F('sector'), 'expirations', Count('pk'),
+    )
+    net = Sum(F('amount') - F('discount'), output_field=MONEY)
+    payment_sector = Coalesce(F('subscription__sector'), F('member__sector'))
+    collect(
+        Payment.objects.filter(is_paid=True, payment_date__isnull=False)
+        .filter(_days_q('payment_date', days)),
+        F('payment_date'), payment_sector, 'revenue', net,
+    )
+    collect(
+        Payment.objects.filter(is_paid=False, due_date__isnull=False)
+        .filter(_days_q('due_date', days)),
+        F('due_date'), payment_sector, 'outstanding', net,
+    )
+
+    return [
+        DailyStats(day=day, sector_id=sector, **values)
+        for (day, sector), values in sorted(totals.items(), key=lambda i: (i[0][0], i[0][1] or 0))
+    ]
+
+
+def refresh_daily_stats(days=None, apps=global_apps, batch_size=1000, attempts=3):
+    """
+    Ricalcola DailyStats per i giorni indicati (tutti se days e' None).
+    Restituisce il numero di righe scritte.
+    """
+    DailyStats = apps.get_model('members', 'DailyStats')
+    if days is not None:
+        days = {day for day in days if day}
+        if not days:
+            return 0
+    for attempt in range(attempts):
+        try:
+            with transaction.atomic():
+                rows = compute_daily_stats(days, apps)
+                DailyStats.objects.filter(_days_q('day', days)).delete()
+                DailyStats.objects.bulk_create(rows, batch_size=batch_size)
+            break
+        except IntegrityError:
+            # un ricalcolo concorrente ha appena scritto gli stessi giorni:
+            # si rilegge (ora vede i suoi dati) e si riscrive
+            if attempt == attempts - 1:
+                raise
+    if apps is global_apps:
+        from .charts import invalidate_charts
+        invalidate_charts()
+    return len(rows)
+
+
+# ---------------------------------------------------------------------------
+#  GIORNI TOCCATI DA UNA MODIFICA (usati dai signal)
+# ---------------------------------------------------------------------------
+def member_days(member):
+    return {timezone.localdate(member.date_joined)} if member.date_joined else set()
+
+
+def subscription_days(subscription):
+    return {subscription.start_date, subscription.end_date} - {None}
+
+
+def payment_days(payment):
+    return {payment.payment_date, payment.due_date} - {None}
+
+
+def payment_days_of(payments):
+    """Giorni di un queryset di pagamenti (una query)."""
+    days = set()
+    for paid_on, due in payments.values_list('payment_date', 'due_date'):
+        days.update({paid_on, due} - {None})
+    return days
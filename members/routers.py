@@ -0,0 +1,40 @@
+# members/routers.py
+# Database dell'archivio dei soci dimessi e dei documenti scaduti
+# (members/archive.py).
+#
+# Con SGS_ARCHIVE_DB (settings) esiste l'alias "archive", un file SQLite a
+# parte: ArchivedMember e ArchivedDocument si leggono, si scrivono e si
+# migrano solo li' (`manage.py migrate --database archive`), tutto il resto
+# solo sul database principale. Senza l'alias l'archivio e' una tabella
+# come le altre.
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+ARCHIVE_DB = 'archive'
+ARCHIVE_MODELS = {'archivedmember', 'archiveddocument'}
+
+
+def archive_db():
+    return ARCHIVE_DB if ARCHIVE_DB in settings.DATABASES else DEFAULT_DB_ALIAS
+
+
+def _archived(app_label, model_name):
+    return app_label == 'members' and model_name in ARCHIVE_MODELS
+
+
+class ArchiveRouter:
+
+    def db_for_read(self, model, **hints):
+        if _archived(model._meta.app_label, model._meta.model_name):
+            return archive_db()
+        return None
+
+    db_for_write = db_for_read
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == ARCHIVE_DB:
+            return _archived(app_label, model_name)
+        if _archived(app_label, model_name):
+            return db == archive_db()
+        return None
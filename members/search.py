@@ -0,0 +1,199 @@
+# members/search.py
+# Ricerca soci unica per tutte le liste (dashboard, pagamenti, abbonamenti,
+# certificati, esportazioni). Cerca su nome, cognome, email, username,
+# codice fiscale, tessera e telefoni; ignora maiuscole e accenti
+# ("nicolo" trova "Nicolò"); ogni parola vale come prefisso ("ros mar"
+# trova "Rossi Mario"); tutte le parole devono comparire.
+#
+# Indice scelto in base al database:
+#   SQLite     -> tabella FTS5 "external content" su members_member,
+#                 tenuta allineata da trigger; rank con bm25().
+#   PostgreSQL -> indice GIN trigram (pg_trgm) sul testo normalizzato
+#                 (minuscolo, senza accenti); rank con word_similarity().
+#   altri      -> OR di icontains (nessun indice).
+
+import re
+import unicodedata
+
+from django.db import connection
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'members_member_fts'
+
+SEARCH_FIELDS = (
+    'first_name', 'last_name', 'email', 'username',
+    'fiscal_code', 'card_number', 'phone_number', 'phone_home',
+)
+
+# Pesi bm25 per colonna (stesso ordine di SEARCH_FIELDS)
+FTS_WEIGHTS = (8.0, 10.0, 3.0, 2.0, 10.0, 10.0, 5.0, 5.0)
+
+MAX_TERMS = 8
+
+
+def _pg_document(table=''):
+    """Testo indicizzato su PostgreSQL (uguale all'espressione dell'indice)."""
+    columns = ', '.join(f'{table}"{f}"' for f in SEARCH_FIELDS)
+    return f"lower(members_f_unaccent(concat_ws(' ', {columns})))"
+
+
+def fold(text):
+    """Minuscolo e senza accenti: 'Nicolò' -> 'nicolo'."""
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+def terms(q):
+    """Parole della ricerca, normalizzate (al massimo MAX_TERMS)."""
+    return re.findall(r'\w+', fold(q or ''))[:MAX_TERMS]
+
+
+def _fts_query(words):
+    # "ros"* "mar"*  -> tutte le parole, ciascuna come prefisso
+    return ' '.join(f'"{w}"*' for w in words)
+
+
+def _fts_rank_query(words):
+    # Stesse righe di _fts_query, ma la parola intera conta due volte nel
+    # bm25: "rossi" mette Rossi prima di Rossini.
+    return ' AND '.join(f'("{w}" OR "{w}"*)' for w in words)
+
+
+def member_search_q(q, prefix='', using=connection):
+    """
+    Condizione "il socio corrisponde a `q`". `prefix` e' il percorso verso
+    il socio dal modello filtrato ('' per Member, 'member__' per Payment...).
+    Con `q` vuota restituisce Q() (nessun filtro).
+    """
+    words = terms(q)
+    if not words:
+        return Q()
+    if using.vendor == 'sqlite':
+        sql = f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s'
+        return Q(**{f'{prefix}pk__in': RawSQL(sql, [_fts_query(words)])})
+    if using.vendor == 'postgresql':
+        where = ' AND '.join([f'{_pg_document()} LIKE %s'] * len(words))
+        sql = f'SELECT "id" FROM "members_member" WHERE {where}'
+        return Q(**{f'{prefix}pk__in': RawSQL(sql, [f'%{w}%' for w in words])})
+    condition = Q()
+    for word in words:
+        any_field = Q()
+        for field in SEARCH_FIELDS:
+            any_field |= Q(**{f'{prefix}{field}__icontains': word})
+        condition &= any_field
+    return condition
+
+
+def search_ranked(queryset, q, using=connection):
+    """
+    Filtra un queryset di Member per `q` e lo ordina per rilevanza
+    (annotazione search_rank: piu' alta = migliore), poi per nome.
+    """
+    words = terms(q)
+    if not words:
+        return queryset
+    ordering = ('-search_rank', 'last_name', 'first_name', 'id')
+    if using.vendor == 'sqlite':
+        # bm25() funziona solo nella query che fa il MATCH: la tabella FTS
+        # va in join (una subquery correlata rifarebbe il MATCH per riga).
+        weights = ', '.join(str(w) for w in FTS_WEIGHTS)
+        return queryset.extra(
+            tables=[FTS_TABLE],
+            where=[f'{FTS_TABLE}.rowid = "members_member"."id"', f'{FTS_TABLE} MATCH %s'],
+            params=[_fts_rank_query(words)],
+            select={'search_rank': f'-bm25({FTS_TABLE}, {weights})'},
+        ).order_by(*ordering)
+    queryset = queryset.filter(member_search_q(q, using=using))
+    if using.vendor == 'postgresql':
+        document = _pg_document('"members_member".')
+        rank = RawSQL(f'word_similarity(%s, {document})', [' '.join(words)],
+                      output_field=FloatField())
+    else:
+        rank = Value(0.0, output_field=FloatField())
+    return queryset.annotate(search_rank=rank).order_by(*ordering)
+
+
+# ---------------------------------------------------------------------------
+#  INSTALLAZIONE DELL'INDICE (migrazione 0010 e post_migrate)
+# ---------------------------------------------------------------------------
+def _sqlite_statements():
+    columns = ', '.join(SEARCH_FIELDS)
+    new = ', '.join(f'new.{f}' for f in SEARCH_FIELDS)
+    old = ', '.join(f'old.{f}' for f in SEARCH_FIELDS)
+    delete_old = (
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns}) "
+        f"VALUES ('delete', old.id, {old});"
+    )
+    insert_new = f"INSERT INTO {FTS_TABLE}(rowid, {columns}) VALUES (new.id, {new});"
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5({columns}, "
+        f"content='members_member', content_rowid='id', "
+        f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON members_member "
+        f"BEGIN {insert_new} END",
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON members_member "
+        f"BEGIN {delete_old} END",
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF {columns} ON members_member "
+        f"BEGIN {delete_old} {insert_new} END",
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+    ]
+
+
+def _postgresql_statements():
+    return [
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        "CREATE EXTENSION IF NOT EXISTS unaccent",
+        # unaccent() non e' IMMUTABLE: serve un involucro per usarlo in un indice
+        "CREATE OR REPLACE FUNCTION members_f_unaccent(text) RETURNS text "
+        "LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT AS "
+        "$$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$",
+        f"CREATE INDEX IF NOT EXISTS members_member_search_trgm ON members_member "
+        f"USING gin (({_pg_document()}) gin_trgm_ops)",
+    ]
+
+
+def install_search_index(using=connection):
+    """Crea (o ricrea) indice e trigger di ricerca. Idempotente."""
+    if using.vendor == 'sqlite':
+        statements = _sqlite_statements()
+    elif using.vendor == 'postgresql':
+        statements = _postgresql_statements()
+    else:
+        return
+    with using.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+def drop_search_index(using=connection):
+    if using.vendor == 'sqlite':
+        statements = [f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{s}" for s in ('ai', 'ad', 'au')]
+        statements.append(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+    elif using.vendor == 'postgresql':
+        statements = [
+            "DROP INDEX IF EXISTS members_member_search_trgm",
+            "DROP FUNCTION IF EXISTS members_f_unaccent(text)",
+        ]
+    else:
+        return
+    with using.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+def search_index_missing(using=connection):
+    """
+    Su SQLite le migrazioni che ricostruiscono members_member (ALTER di un
+    campo) eliminano i trigger insieme alla vecchia tabella: se la tabella
+    FTS esiste ma i trigger no, l'indice va reinstallato.
+    """
+    if using.vendor != 'sqlite':
+        return False
+    with using.cursor() as cursor:
+        cursor.execute(
+            "SELECT type, count(*) FROM sqlite_master WHERE name LIKE %s GROUP BY type",
+            [f'{FTS_TABLE}%'],
+        )
+        found = dict(cursor.fetchall())
+    return found.get('table', 0) > 0 and found.get('trigger', 0) < 3
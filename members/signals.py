@@ -0,0 +1,166 @@
+# members/signals.py
+# Mantiene aggiornata la fotografia MemberStatus.
+# Sul salvataggio si ricalcola subito (la pagina successiva vede il dato
+# nuovo); sull'eliminazione si rimanda al commit, perche' durante la
+# cancellazione a cascata di un socio la riga di stato sta per sparire.
+# Aggiorna inoltre le statistiche giornaliere (members/rollup.py), invalida
+# le cache dei grafici e delle tabelle di configurazione e accoda le
+# miniature delle foto nuove e la compressione dei documenti nuovi.
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import compression, images, rollup
+from .charts import invalidate_charts
+from .config_cache import invalidate_config
+from .models import Instructor, Member, MemberDocument, Package, Payment, Sector, Subscription
+from .status import refresh_member_status
+
+
+@receiver(post_save, sender=Member)
+def member_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        refresh_member_status([instance.pk])
+
+
+@receiver(post_save, sender=MemberDocument)
+@receiver(post_save, sender=Subscription)
+@receiver(post_save, sender=Payment)
+def related_saved(sender, instance, raw=False, **kwargs):
+    if not raw and instance.member_id:
+        refresh_member_status([instance.member_id])
+
+
+@receiver(post_delete, sender=MemberDocument)
+@receiver(post_delete, sender=Subscription)
+@receiver(post_delete, sender=Payment)
+def related_deleted(sender, instance, origin=None, **kwargs):
+    if getattr(origin, '_archiving', False):
+        return  # socio archiviato (archive.py): niente stato da ricalcolare
+    member_id = instance.member_id
+    transaction.on_commit(lambda: refresh_member_status([member_id]))
+
+
+# ---------------------------------------------------------------------------
+#  MINIATURE DELLE FOTO: foto nuova -> lavoro per il worker (images.py)
+# ---------------------------------------------------------------------------
+@receiver(post_save, sender=Member)
+def member_photo_saved(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or _only_login(update_fields) or not instance.photo or instance.photo_checksum:
+        return
+    transaction.on_commit(lambda: images.schedule(instance))
+
+
+# ---------------------------------------------------------------------------
+#  DOCUMENTI: file nuovo -> compressione nel worker (compression.py)
+# ---------------------------------------------------------------------------
+@receiver(post_save, sender=MemberDocument)
+def document_file_saved(sender, instance, raw=False, **kwargs):
+    if raw or not instance.file or instance.compressed_at:
+        return
+    transaction.on_commit(lambda: compression.schedule(instance))
+
+
+# ---------------------------------------------------------------------------
+#  STATISTICHE GIORNALIERE E CACHE DEI GRAFICI
+#  Si ricalcolano i giorni toccati, prima e dopo la modifica (il vecchio
+#  valore si legge in pre_save). refresh_daily_stats invalida i grafici.
+# ---------------------------------------------------------------------------
+def _only_login(update_fields):
+    # Il login salva solo last_login: niente da ricalcolare
+    return update_fields is not None and set(update_fields) <= {'last_login'}
+
+
+@receiver(pre_save, sender=Member)
+@receiver(pre_save, sender=Subscription)
+@receiver(pre_save, sender=Payment)
+def remember_stats_days(sender, instance, raw=False, update_fields=None, **kwargs):
+    instance._stats_days_before = set()
+    if raw or instance.pk is None or _only_login(update_fields):
+        return
+    old = sender._default_manager.filter(pk=instance.pk).first()
+    if old is None:
+        return
+    if sender is Member:
+        days = rollup.member_days(old)
+        if old.sector_id != instance.sector_id:
+            # i pagamenti senza abbonamento prendono il settore del socio
+            days |= rollup.payment_days_of(old.payments.filter(subscription__isnull=True))
+    elif sender is Subscription:
+        days = rollup.subscription_days(old)
+        if old.sector_id != instance.sector_id:
+            days |= rollup.payment_days_of(Payment.objects.filter(subscription=old))
+    else:
+        days = rollup.payment_days(old)
+    instance._stats_days_before = days
+
+
+@receiver(post_save, sender=Member)
+@receiver(post_save, sender=Subscription)
+@receiver(post_save, sender=Payment)
+def refresh_stats_days(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or _only_login(update_fields):
+        return
+    days = getattr(instance, '_stats_days_before', set())
+    if sender is Member:
+        days |= rollup.member_days(instance)
+    elif sender is Subscription:
+        days |= rollup.subscription_days(instance)
+    else:
+        days |= rollup.payment_days(instance)
+    rollup.refresh_daily_stats(days)
+
+
+@receiver(pre_delete, sender=Member)
+def member_stats_deleting(sender, instance, **kwargs):
+    # Un unico ricalcolo per il socio e tutto cio' che sparisce a cascata.
+    # Un socio archiviato (archive.py) resta nella storia dei grafici.
+    if getattr(instance, '_archiving', False):
+        return
+    days = rollup.member_days(instance)
+    for start, end in instance.subscriptions.values_list('start_date', 'end_date'):
+        days.update({start, end} - {None})
+    days |= rollup.payment_days_of(instance.payments.all())
+    transaction.on_commit(lambda: rollup.refresh_daily_stats(days))
+
+
+@receiver(post_delete, sender=Subscription)
+@receiver(post_delete, sender=Payment)
+def stats_deleted(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, Member):
+        return  # gia' compreso in member_stats_deleting
+    days = rollup.subscription_days(instance) if sender is Subscription else rollup.payment_days(instance)
+    transaction.on_commit(lambda: rollup.refresh_daily_stats(days))
+
+
+@receiver(pre_delete, sender=Sector)
+def sector_stats_deleting(sender, instance, **kwargs):
+    # le righe del settore spariscono a cascata; i suoi soci restano senza
+    # settore: a cancellazione finita si ricalcolano gli stessi giorni
+    instance._stats_days = set(instance.daily_stats.values_list('day', flat=True))
+
+
+@receiver(post_delete, sender=Sector)
+def sector_stats_deleted(sender, instance, **kwargs):
+    rollup.refresh_daily_stats(getattr(instance, '_stats_days', set()))
+
+
+@receiver(post_save, sender=Sector)
+@receiver(post_delete, sender=Sector)
+def sector_changed_charts(sender, **kwargs):
+    invalidate_charts()  # i nomi dei settori compaiono nelle etichette
+
+
+# ---------------------------------------------------------------------------
+#  CACHE DELLA CONFIGURAZIONE
+# ---------------------------------------------------------------------------
+@receiver(post_save, sender=Sector)
+@receiver(post_save, sender=Package)
+@receiver(post_save, sender=Instructor)
+@receiver(post_delete, sender=Sector)
+@receiver(post_delete, sender=Package)
+@receiver(post_delete, sender=Instructor)
+@receiver(m2m_changed, sender=Instructor.sectors.through)
+def config_changed(sender, **kwargs):
+    invalidate_config()
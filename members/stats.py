@@ -0,0 +1,80 @@
+# members/stats.py
+# Contatori della dashboard di segreteria, calcolati lato database.
+# Numero di query fisso: non dipende da quanti soci/abbonamenti ci sono.
+
+from datetime import timedelta
+
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .models import Member, MemberDocument, MemberStatus, Subscription
+
+# Soglia "in scadenza" per gli abbonamenti (giorni)
+SCADENZA_GIORNI = 30
+
+
+def member_counters():
+    """Soci totali e attivi (scansione del solo indice su is_active)."""
+    return Member.objects.aggregate(
+        total_members=Count('pk'),
+        active_members=Count('pk', filter=Q(is_active=True)),
+    )
+
+
+def certificate_counters(today=None):
+    """
+    Certificati medici per socio, in UNA query sulla fotografia MemberStatus:
+    - attivo: l'ultimo certificato non e' scaduto (o non ha scadenza);
+    - scaduto: l'ultimo certificato ha scadenza passata;
+    - sospeso: nessun certificato ma almeno un abbonamento.
+    "Ultimo" = quello con la scadenza piu' lontana.
+    """
+    today = today or timezone.now().date()
+    # si conta una colonna dell'indice: la query non tocca la tabella
+    has_cert = Q(has_certificate=True)
+    return MemberStatus.objects.aggregate(
+        expired_certificates=Count(
+            'has_certificate', filter=has_cert & Q(certificate_expiry__lt=today)
+        ),
+        active_certificates=Count(
+            'has_certificate', filter=has_cert & (
+                Q(certificate_expiry__isnull=True) | Q(certificate_expiry__gte=today)
+            )
+        ),
+        suspended_certificates=Count(
+            'has_certificate', filter=Q(has_certificate=False, has_subscriptions=True)
+        ),
+    )
+
+
+def subscription_counters(today=None, giorni=SCADENZA_GIORNI):
+    """
+    Abbonamenti attivi / scaduti / in scadenza entro `giorni`, in UNA query.
+    Gli abbonamenti non ancora iniziati non rientrano in nessun contatore
+    (ma sono compresi nel totale).
+    """
+    today = today or timezone.now().date()
+    limite = today + timedelta(days=giorni)
+    started = Q(start_date__lte=today)
+    running = started & (Q(end_date__isnull=True) | Q(end_date__gte=today))
+    return Subscription.objects.aggregate(
+        total_subscriptions=Count('pk'),
+        active_subscriptions=Count('pk', filter=running),
+        expired_subscriptions=Count('pk', filter=started & Q(end_date__lt=today)),
+        expiring_subscriptions=Count(
+            'pk', filter=started & Q(end_date__gte=today, end_date__lte=limite)
+        ),
+    )
+
+
+def dashboard_counters(today=None, giorni=SCADENZA_GIORNI):
+    """Tutti i contatori delle card della dashboard (4 query in totale)."""
+    today = today or timezone.now().date()
+    counters = {
+        'total_documents': MemberDocument.objects.count(),
+        'scadenza_giorni': giorni,
+    }
+    counters.update(member_counters())
+    counters.update(certificate_counters(today))
+    counters.update(subscription_counters(today, giorni))
+    return counters
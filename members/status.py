@@ -0,0 +1,98 @@
+# members/status.py
+# Calcolo e aggiornamento della fotografia MemberStatus.
+# Tutto lato database: una query di lettura (subquery correlate) e un
+# upsert in blocco, sia per un singolo socio sia per l'intero archivio.
+
+from decimal import Decimal
+
+from django.db.models import (
+    Count, DecimalField, Exists, F, Min, OuterRef, Subquery, Sum, Value,
+)
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Member, MemberStatus, Payment, Subscription
+
+# Campi ricalcolati (usati anche come update_fields dell'upsert)
+STATUS_FIELDS = [
+    'has_certificate', 'certificate_expiry', 'has_subscriptions',
+    'active_subscriptions', 'next_subscription_end', 'unpaid_balance',
+    'computed_on', 'updated_at',
+]
+
+MONEY = DecimalField(max_digits=10, decimal_places=2)
+
+
+def _aggregate_subquery(qs, expression):
+    """Subquery correlata che restituisce un solo aggregato per socio."""
+    return Subquery(
+        qs.order_by().values('member').annotate(value=expression).values('value')[:1]
+    )
+
+
+def annotate_member_status(members, today=None):
+    """
+    Annota un queryset di Member con i valori di MemberStatus
+    (il certificato arriva da MemberQuerySet.with_latest_certificate).
+    """
+    today = today or timezone.now().date()
+    subs = Subscription.objects.filter(member=OuterRef('pk'))
+    running = subs.active(today)
+    unpaid = Payment.objects.filter(member=OuterRef('pk'), is_paid=False)
+    return members.with_latest_certificate().annotate(
+        st_has_subscriptions=Exists(subs),
+        st_active_subscriptions=Coalesce(_aggregate_subquery(running, Count('pk')), 0),
+        st_next_subscription_end=_aggregate_subquery(
+            subs.filter(end_date__gte=today), Min('end_date')
+        ),
+        st_unpaid_balance=Coalesce(
+            _aggregate_subquery(unpaid, Sum(F('amount') - F('discount'), output_field=MONEY)),
+            Value(Decimal('0')), output_field=MONEY,
+        ),
+    )
+
+
+def refresh_member_status(member_ids=None, today=None, batch_size=1000):
+    """
+    Ricalcola MemberStatus per i soci indicati (tutti se member_ids e' None).
+    I soci inesistenti (es. appena eliminati) vengono ignorati.
+    Restituisce il numero di righe scritte.
+    """
+    today = today or timezone.now().date()
+    members = Member.objects.order_by()
+    if member_ids is not None:
+        members = members.filter(pk__in=list(member_ids))
+    rows = annotate_member_status(members, today).values(
+        'pk', 'latest_certificate_id', 'latest_certificate_expiry', 'st_has_subscriptions',
+        'st_active_subscriptions', 'st_next_subscription_end', 'st_unpaid_balance',
+    )
+
+    written = 0
+    batch = []
+    for row in rows.iterator(chunk_size=batch_size):
+        batch.append(MemberStatus(
+            member_id=row['pk'],
+            has_certificate=row['latest_certificate_id'] is not None,
+            certificate_expiry=row['latest_certificate_expiry'],
+            has_subscriptions=row['st_has_subscriptions'],
+            active_subscriptions=row['st_active_subscriptions'],
+            next_subscription_end=row['st_next_subscription_end'],
+            unpaid_balance=row['st_unpaid_balance'],
+            computed_on=today,
+        ))
+        if len(batch) >= batch_size:
+            written += _upsert(batch)
+            batch = []
+    if batch:
+        written += _upsert(batch)
+    return written
+
+
+def _upsert(batch):
+    MemberStatus.objects.bulk_create(
+        batch,
+        update_conflicts=True,
+        unique_fields=['member'],
+        update_fields=STATUS_FIELDS,
+    )
+    return len(batch)
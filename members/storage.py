@@ -0,0 +1,196 @@
+# members/storage.py
+# Archivio dei documenti dei soci indirizzato per contenuto.
+#
+# Il nome del file e' lo SHA-256 del contenuto, con l'estensione del tipo
+# riconosciuto dai primi byte (members/filetypes.py), mai quella del client:
+#   documents/sha256/ab/ab12...ef.pdf
+# quindi lo stesso certificato ricaricato ogni stagione occupa spazio una
+# volta sola, e il checksum (MemberDocument.checksum) serve per verificare
+# l'integrita' e come ETag nei download.
+#
+# Un file puo' essere referenziato da piu' documenti: eliminare una riga
+# non cancella il file. Le referenze si contano sul database e i file
+# senza referenze (orfani, compresi quelli dei vecchi percorsi
+# documents/member_<id>/) li elimina `manage.py gc_documents`, solo se
+# non toccati da un periodo di grazia: un upload identico appena
+# arrivato "tocca" il file esistente e lo protegge.
+
+import hashlib
+import os
+import tempfile
+import time
+from collections import Counter
+
+from django.core.files.storage import FileSystemStorage
+
+from .filetypes import SNIFF_BYTES, extension, sniff
+
+PREFIX = 'documents/sha256'
+CHUNK_SIZE = 64 * 1024
+
+
+def checksum_of(fileobj):
+    """SHA-256 (esadecimale) di un file aperto, letto a blocchi."""
+    digest = hashlib.sha256()
+    fileobj.seek(0)
+    for chunk in iter(lambda: fileobj.read(CHUNK_SIZE), b''):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def checksum_from_name(name):
+    """Checksum contenuto nel nome di un file dell'archivio ('' per i vecchi percorsi)."""
+    if not (name or '').startswith(PREFIX + '/'):
+        return ''
+    return os.path.splitext(os.path.basename(name))[0]
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    FileSystemStorage che ignora il percorso proposto e salva il file
+    col suo SHA-256 e l'estensione del tipo riconosciuto. Scrittura su file
+    temporaneo e rename atomico: un file dell'archivio e' sempre completo.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        return name  # il nome definitivo lo decide _save
+
+    def _save(self, name, content):
+        staging = self.path(PREFIX)
+        os.makedirs(staging, exist_ok=True)
+        digest, head = hashlib.sha256(), b''
+        fd, tmp = tempfile.mkstemp(dir=staging, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as fh:
+                for chunk in content.chunks():
+                    if len(head) < SNIFF_BYTES:
+                        head += chunk[:SNIFF_BYTES - len(head)]
+                    digest.update(chunk)
+                    fh.write(chunk)
+            return self._commit(tmp, digest.hexdigest(), head)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+
+    def adopt(self, path, name):
+        """
+        Sposta nell'archivio un file gia' su disco (stesso filesystem, es.
+        un caricamento a blocchi completato) senza copiarlo: lo si legge
+        una volta per il checksum e lo si rinomina. Restituisce il nome.
+        """
+        with open(path, 'rb') as fh:
+            head = fh.read(SNIFF_BYTES)
+            checksum = checksum_of(fh)
+        return self._commit(path, checksum, head)
+
+    def _commit(self, tmp, checksum, head):
+        """Rinomina `tmp` col suo checksum, o lo scarta se il contenuto c'e' gia'."""
+        final = f'{PREFIX}/{checksum[:2]}/{checksum}{extension(sniff(head))}'
+        path = self.path(final)
+        if os.path.exists(path):
+            os.utime(path)  # gia' presente: lo si riusa (e lo si protegge dal gc)
+            os.unlink(tmp)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if self.file_permissions_mode is not None:
+                os.chmod(tmp, self.file_permissions_mode)
+            os.replace(tmp, path)
+        return final
+
+    def verify(self, name):
+        """True se il contenuto corrisponde al checksum nel nome."""
+        with self.open(name, 'rb') as fh:
+            return checksum_of(fh) == checksum_from_name(name)
+
+
+def get_document_storage():
+    return document_storage
+
+
+document_storage = ContentAddressedStorage()
+
+
+def references():
+    """Counter {nome file: documenti che lo usano} (originali conservati compresi)."""
+    from .models import MemberDocument
+    used = Counter(MemberDocument.objects.exclude(file='').values_list('file', flat=True).iterator())
+    used.update(MemberDocument.objects.exclude(original_file='').values_list('original_file', flat=True).iterator())
+    return used
+
+
+def stored_files(storage=document_storage, top='documents'):
+    """(nome, mtime) di tutti i file sotto `top` (anche i temporanei di upload interrotti)."""
+    root = storage.path(top)
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            name = os.path.relpath(path, storage.location).replace(os.sep, '/')
+            try:
+                yield name, os.stat(path).st_mtime
+            except FileNotFoundError:
+                continue
+
+
+# ---------------------------------------------------------------------------
+#  MANUTENZIONE (manage.py gc_documents)
+# ---------------------------------------------------------------------------
+def collect_garbage(grace_seconds=24 * 3600, dry_run=False, now=None, storage=document_storage):
+    """
+    Elimina i file sotto documents/ che nessun documento usa, non toccati
+    da almeno `grace_seconds`. Restituisce [(nome, byte)] dei file eliminati.
+    """
+    used = references()
+    limit = (now or time.time()) - grace_seconds
+    removed = []
+    for name, mtime in stored_files(storage):
+        if name in used or mtime > limit:
+            continue
+        size = storage.size(name)
+        if not dry_run:
+            storage.delete(name)
+        removed.append((name, size))
+    return removed
+
+
+def adopt_legacy(storage=document_storage):
+    """
+    Sposta nell'archivio i file dei documenti caricati prima (senza
+    checksum). I vecchi file restano orfani e li toglie collect_garbage.
+    Restituisce il numero di documenti aggiornati.
+    """
+    from django.core.files import File
+
+    from .models import MemberDocument
+
+    adopted = 0
+    for document in MemberDocument.objects.filter(checksum='').exclude(file='').iterator():
+        old = document.file.name
+        if not storage.exists(old):
+            continue
+        with storage.open(old, 'rb') as fh:
+            name = storage.save(old, File(fh))
+        MemberDocument.objects.filter(pk=document.pk).update(
+            file=name, checksum=checksum_from_name(name), size=storage.size(name),
+            original_name=document.original_name or os.path.basename(old)[:255],
+        )
+        adopted += 1
+    return adopted
+
+
+def verify_documents(storage=document_storage):
+    """[(pk documento, nome, problema)] per file mancanti o con checksum diverso."""
+    from .models import MemberDocument
+
+    problems, checked = [], {}
+    rows = MemberDocument.objects.exclude(checksum='').values_list('pk', 'file', 'checksum')
+    for pk, name, checksum in rows.iterator():
+        if name not in checked:
+            if not storage.exists(name):
+                checked[name] = "file mancante"
+            else:
+                with storage.open(name, 'rb') as fh:
+                    checked[name] = None if checksum_of(fh) == checksum else "checksum diverso"
+        if checked[name]:
+            problems.append((pk, name, checked[name]))
+    return problems
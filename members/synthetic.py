@@ -0,0 +1,258 @@
+# members/synthetic.py
+# Dati sintetici realistici per prove di carico e benchmark
+# (`manage.py seed_synthetic`, `manage.py run_benchmarks`).
+#
+# Riproducibili: stesso seme -> stessi dati (date relative a oggi). Per
+# ogni socio: anagrafica, minorenni con genitore, affiliazione a un ente,
+# certificati medici, abbonamenti consecutivi per alcuni anni (con
+# abbandoni) e un pagamento per abbonamento, quasi tutti pagati tranne i
+# recenti. Tutto con bulk_create a blocchi (niente signal): alla fine si
+# ricalcolano MemberStatus e DailyStats una volta sola.
+# I soci sintetici hanno username "syn0000001"...: si possono aggiungere
+# in piu' riprese (1k, poi fino a 10k...) e riconoscere.
+
+import random
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+
+from .models import (
+    Affiliation, Instructor, Member, MemberDocument, Package, Payment, Sector, SportsBody,
+    Subscription,
+)
+from .rollup import refresh_daily_stats
+from .status import refresh_member_status
+
+PREFIX = 'syn'
+
+FIRST_NAMES = (
+    "Marco", "Giulia", "Luca", "Francesca", "Andrea", "Sara", "Matteo", "Chiara", "Alessandro",
+    "Martina", "Davide", "Elena", "Simone", "Valentina", "Lorenzo", "Federica", "Nicolò", "Alice",
+    "Gabriele", "Sofia", "Riccardo", "Aurora", "Tommaso", "Beatrice", "Filippo", "Anna",
+)
+LAST_NAMES = (
+    "Rossi", "Russo", "Ferrari", "Esposito", "Bianchi", "Romano", "Colombo", "Ricci", "Marino",
+    "Greco", "Bruno", "Gallo", "Conti", "De Luca", "Mancini", "Costa", "Giordano", "Rizzo",
+    "Lombardi", "Moretti", "Barbieri", "Fontana", "Santoro", "Mariani", "Rinaldi", "Caruso",
+)
+CITIES = (("Brescia", "BS", "25100"), ("Bergamo", "BG", "24100"), ("Milano", "MI", "20100"),
+          ("Cremona", "CR", "26100"), ("Verona", "VR", "37100"))
+
+SECTORS = ("FITNESS", "SALA PESI", "KARATE", "JUDO", "YOGA", "DANZA")
+PACKAGES = (  # (nome, tipo, prezzo base, peso nella scelta)
+    ("Mensile", Package.PackageType.MONTHLY, Decimal("40"), 3),
+    ("Trimestrale", Package.PackageType.QUARTERLY, Decimal("110"), 4),
+    ("Annuale", Package.PackageType.ANNUAL, Decimal("380"), 3),
+)
+BODIES = (("CSEN", "CSEN"), ("FIJLKAM", "FIJLKAM"), ("LIBERTAS", "LIB"))
+
+MINOR_SHARE = 0.2
+DISMISSED_SHARE = 0.05
+CONTINUE_SHARE = 0.8      # probabilita' di rinnovare alla scadenza
+AFFILIATION_SHARE = 0.6
+CERTIFICATE_SHARE = 0.9
+
+
+def ensure_configuration():
+    """Settori, listino, enti e insegnanti (creati solo se mancano)."""
+    sectors = [Sector.objects.get_or_create(name=name)[0] for name in SECTORS]
+    packages = []
+    for i, sector in enumerate(sectors):
+        for name, kind, price, weight in PACKAGES:
+            package, _ = Package.objects.get_or_create(
+                name=f"{name} {sector.name.title()}", sector=sector,
+                defaults={'package_type': kind, 'price': price + 5 * i},
+            )
+            packages.append((package, weight))
+        for n in (1, 2):
+            instructor, created = Instructor.objects.get_or_create(
+                first_name=f"Maestro {n}", last_name=sector.name.title(),
+            )
+            if created:
+                instructor.sectors.add(sector)
+    bodies = [
+        SportsBody.objects.get_or_create(name=name, defaults={'code': code})[0]
+        for name, code in BODIES
+    ]
+    instructors = list(Instructor.objects.filter(first_name__startswith="Maestro "))
+    return sectors, packages, bodies, instructors
+
+
+class SyntheticData:
+    """Generatore: crea `count` soci a partire dal numero `first` (1, 1001...)."""
+
+    def __init__(self, seed=42, years=3, today=None, batch_size=1000):
+        self.seed = seed
+        self.years = years
+        self.today = today or timezone.localdate()
+        self.batch_size = batch_size
+        self.password = make_password(None)
+        self.sectors, self.packages, self.bodies, self.instructors = ensure_configuration()
+        self.instructors_by_sector = {}
+        for instructor in self.instructors:
+            self.instructors_by_sector.setdefault(instructor.last_name, []).append(instructor)
+
+    def existing(self):
+        return Member.objects.filter(username__startswith=PREFIX).count()
+
+    def generate(self, count, first=None):
+        """Aggiunge `count` soci sintetici. Restituisce i conteggi creati."""
+        first = self.existing() + 1 if first is None else first
+        totals = dict.fromkeys(('members', 'subscriptions', 'payments', 'documents', 'affiliations'), 0)
+        for start in range(first, first + count, self.batch_size):
+            size = min(self.batch_size, first + count - start)
+            # un generatore per blocco: lo stesso blocco esce uguale anche
+            # se i soci vengono creati in piu' riprese
+            rng = random.Random(f'{self.seed}:{start}:{size}')
+            with transaction.atomic():
+                for key, value in self._chunk(rng, start, size).items():
+                    totals[key] += value
+        refresh_member_status()
+        refresh_daily_stats()
+        return totals
+
+    def extend_history(self, member, count):
+        """
+        Allunga lo storico di `member` all'indietro: `count` abbonamenti
+        consecutivi prima del primo, ognuno con pagamento e certificato.
+        """
+        rng = random.Random(f'{self.seed}:{member.pk}:{count}')
+        first = member.subscriptions.select_related('package').order_by('start_date').first()
+        package = first.package if first and first.package else rng.choice(self.packages)[0]
+        end = (first.start_date if first else self.today) - timedelta(days=1)
+        subscriptions, documents = [], []
+        for _ in range(count):
+            start = end - package.duration
+            subscriptions.append(Subscription(
+                member=member, package=package, sector_id=package.sector_id,
+                subscription_type=package.package_type, start_date=start, end_date=end,
+            ))
+            documents.append(MemberDocument(
+                member=member, document_type=MemberDocument.DocumentType.MEDICAL_CERTIFICATE,
+                file=f'documents/synthetic/{member.username}_{start:%Y%m%d}.pdf',
+                expiration_date=start + timedelta(days=365),
+            ))
+            end = start - timedelta(days=1)
+        with transaction.atomic():
+            Subscription.objects.bulk_create(subscriptions)
+            Payment.objects.bulk_create([self._payment(rng, sub) for sub in subscriptions])
+            MemberDocument.objects.bulk_create(documents)
+        refresh_member_status([member.pk])
+        refresh_daily_stats()
+
+    # --- un blocco di soci -------------------------------------------------
+    def _chunk(self, rng, start, size):
+        adults, minors = [], []
+        for n in range(start, start + size):
+            member = self._member(rng, n)
+            (minors if member.is_minor else adults).append(member)
+        Member.objects.bulk_create(adults, batch_size=self.batch_size)
+        for member in minors:
+            if adults:
+                member.guardian_id = rng.choice(adults).pk
+        Member.objects.bulk_create(minors, batch_size=self.batch_size)
+        members = adults + minors
+
+        subscriptions, documents, affiliations = [], [], []
+        for member in members:
+            subscriptions += self._subscriptions(rng, member)
+            documents += self._certificates(rng, member)
+            if rng.random() < AFFILIATION_SHARE:
+                affiliations.append(self._affiliation(rng, member))
+        Subscription.objects.bulk_create(subscriptions, batch_size=self.batch_size)
+        payments = [self._payment(rng, sub) for sub in subscriptions]
+        Payment.objects.bulk_create(payments, batch_size=self.batch_size)
+        MemberDocument.objects.bulk_create(documents, batch_size=self.batch_size)
+        Affiliation.objects.bulk_create(affiliations, batch_size=self.batch_size)
+        return {
+            'members': len(members), 'subscriptions': len(subscriptions), 'payments': len(payments),
+            'documents': len(documents), 'affiliations': len(affiliations),
+        }
+
+    def _member(self, rng, n):
+        joined = self.today - timedelta(days=rng.randrange(self.years * 365))
+        minor = rng.random() < MINOR_SHARE
+        age = rng.randint(6, 17) if minor else rng.randint(18, 75)
+        birth = self.today - timedelta(days=age * 365 + rng.randrange(365))
+        first_name, last_name = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        city, province, cap = rng.choice(CITIES)
+        sector = rng.choice(self.sectors)
+        username = f'{PREFIX}{n:07d}'
+        member = Member(
+            username=username, password=self.password,
+            first_name=first_name, last_name=last_name,
+            email='' if minor else f'{username}@example.com',
+            card_number=f'SY/{joined.year % 100:02d}/{n:07d}',
+            fiscal_code=''.join(rng.choice('ABCDEFGHLMNPRSTVZ0123456789') for _ in range(16)),
+            sex=rng.choice('MF'), date_of_birth=birth, birth_place=city,
+            phone_number=f'3{rng.randrange(10 ** 9):09d}',
+            address=f"Via {rng.choice(LAST_NAMES)} {rng.randint(1, 200)}",
+            residence_city=city, province=province, postal_code=cap,
+            registration_date=joined,
+            date_joined=timezone.make_aware(datetime.combine(joined, time(rng.randint(8, 20)))),
+            is_dismissed=rng.random() < DISMISSED_SHARE,
+            sector=sector,
+            instructor=rng.choice(self.instructors_by_sector.get(sector.name.title()) or [None]),
+        )
+        return member
+
+    def _subscriptions(self, rng, member):
+        """Abbonamenti consecutivi dal giorno di iscrizione, con abbandoni."""
+        package = rng.choices(
+            [p for p, _ in self.packages if p.sector_id == member.sector_id],
+            [w for p, w in self.packages if p.sector_id == member.sector_id],
+        )[0]
+        subscriptions = []
+        start = member.registration_date
+        while start <= self.today:
+            end = start + package.duration
+            subscriptions.append(Subscription(
+                member=member, package=package, sector_id=package.sector_id,
+                subscription_type=package.package_type, start_date=start, end_date=end,
+            ))
+            if rng.random() > CONTINUE_SHARE:
+                break
+            start = end + timedelta(days=1)
+        return subscriptions
+
+    def _payment(self, rng, sub):
+        recent = sub.start_date > self.today - timedelta(days=30)
+        paid = rng.random() < (0.6 if recent else 0.97)
+        payment = Payment(
+            member=sub.member, subscription=sub,
+            payment_type=Payment.type_for_subscription(sub.subscription_type) or '',
+            due_date=sub.start_date,
+            payment_date=sub.start_date + timedelta(days=rng.randrange(10)) if paid else None,
+            amount=sub.package.price,
+            discount=rng.choice((Decimal("0"),) * 8 + (Decimal("5"), Decimal("10"))),
+            payment_mode=rng.choice(Payment.PaymentMode.values) if paid else '',
+            is_paid=paid,
+        )
+        payment.next_due_date = payment.compute_next_due_date()
+        return payment
+
+    def _certificates(self, rng, member):
+        if rng.random() > CERTIFICATE_SHARE:
+            return []
+        issued = member.registration_date
+        documents = []
+        while issued <= self.today:
+            documents.append(MemberDocument(
+                member=member, document_type=MemberDocument.DocumentType.MEDICAL_CERTIFICATE,
+                file=f'documents/synthetic/{member.username}_{issued:%Y%m%d}.pdf',
+                expiration_date=issued + timedelta(days=365),
+            ))
+            issued += timedelta(days=365 + rng.randrange(60))
+        return documents
+
+    def _affiliation(self, rng, member):
+        season = self.today.year - (self.today.month < 9)
+        return Affiliation(
+            member=member, body=rng.choice(self.bodies),
+            federal_card=f'{rng.randrange(10 ** 8):08d}',
+            federal_card_expiry=self.today + timedelta(days=rng.randrange(-60, 300)),
+            affiliation_year=f'{season}/{season + 1}',
+        )
@@ -0,0 +1,39 @@
+# members/templatetags/member_images.py
+# {% load member_images %} ... {% member_avatar m %} / {% member_avatar member 48 %}
+# Avatar del socio: miniature WebP (con JPEG di riserva) in srcset, il
+# browser sceglie la risoluzione giusta per lo schermo. Finche' le
+# miniature non sono pronte (o senza foto) restano le iniziali.
+
+from django import template
+from django.urls import reverse
+from django.utils.html import format_html
+
+from members.images import THUMB_SIZES
+
+register = template.Library()
+
+DEFAULT_SIZE = 34  # come .hbs-avatar nel tema
+
+
+def _srcset(base, fmt, version):
+    return ', '.join(f'{base}?size={s}&format={fmt}&v={version} {s}w' for s in THUMB_SIZES)
+
+
+@register.simple_tag
+def member_avatar(member, size=DEFAULT_SIZE):
+    style = '' if size == DEFAULT_SIZE else format_html(
+        ' style="width:{}px; height:{}px; font-size:{}px;"', size, size, size // 3,
+    )
+    initials = f'{member.first_name[:1]}{member.last_name[:1]}'.upper()
+    if not member.photo_checksum:
+        return format_html('<span class="hbs-avatar"{}>{}</span>', style, initials)
+    base = reverse('members:member_photo', args=[member.pk])
+    version = member.photo_checksum[:12]
+    return format_html(
+        '<span class="hbs-avatar hbs-avatar--photo"{}><picture>'
+        '<source type="image/webp" srcset="{}" sizes="{}px">'
+        '<img src="{}?size={}&format=jpeg&v={}" srcset="{}" sizes="{}px" width="{}" height="{}" '
+        'alt="{}" loading="lazy" decoding="async"></picture></span>',
+        style, _srcset(base, 'webp', version), size,
+        base, THUMB_SIZES[0], version, _srcset(base, 'jpeg', version), size, size, size, initials,
+    )
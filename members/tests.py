@@ -1,3 +1,1954 @@
-from django.test import TestCase
+import base64
+import csv
+import hashlib
+import json
+import os
+import sys
+import tarfile
+import tempfile
+from datetime import date, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import skipUnless
+
+from django.core import mail
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
+from django.template import Context, Template
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from .archive import archive_root
+from .charts import chart_series, choose_bucket
+from .compression import MAX_IMAGE_SIDE, pdf_available
+from .exports import xlsx_available
+from .forms import InstructorForm, SubscriptionForm
+from .images import prune_variants, variant_name
+from .importers import AccessImporter
+from .jobs import claim, enqueue, purge_finished, requeue_stale, run_job, run_pending, task
+from .search import install_search_index, search_index_missing
+from .models import (
+    Affiliation, ArchivedDocument, ArchivedMember, DailyStats, DocumentUpload, Instructor, Job, Member, MemberDocument, MemberStatus,
+    Package, Payment, Sector, SportsBody, Subscription,
+)
+from .notifications import send_reminders
+from .profiling import RequestProfile
+from .query_guard import QueryLog, check as check_query_counts, format_growth
+from . import benchmarks
+from .synthetic import SyntheticData
+from .renewals import plan_renewals, renew, renewal_candidates
+from .routers import ArchiveRouter
+from .query_plans import plan_report
+from .rollup import compute_daily_stats, refresh_daily_stats
+from .stats import dashboard_counters
+from .storage import checksum_of, stored_files
+
+
+def make_member(username, **kwargs):
+    return Member.objects.create(
+        username=username, first_name=username.title(), last_name="Test", **kwargs
+    )
+
+
+class TempMediaMixin:
+    """Cartelle temporanee per i setting in `temp_dirs` (self.media e' MEDIA_ROOT)."""
+
+    temp_dirs = ('MEDIA_ROOT',)
+
+    def setUp(self):
+        super().setUp()
+        for setting in self.temp_dirs:
+            tmp = tempfile.TemporaryDirectory()
+            self.addCleanup(tmp.cleanup)
+            override = override_settings(**{setting: tmp.name})
+            override.enable()
+            self.addCleanup(override.disable)
+            if setting == 'MEDIA_ROOT':
+                self.media = tmp.name
+
+
+class DashboardCountersTests(TestCase):
+
+    def setUp(self):
+        self.today = timezone.now().date()
+
+    def _populate(self, n, offset=0):
+        """n soci con un certificato e un abbonamento ciascuno."""
+        for i in range(offset, offset + n):
+            member = make_member(f"socio{i}")
+            MemberDocument.objects.create(
+                member=member,
+                document_type=MemberDocument.DocumentType.MEDICAL_CERTIFICATE,
+                file="documents/cert.pdf",
+                expiration_date=self.today + timedelta(days=(i % 3) * 200 - 100),
+            )
+            Subscription.objects.create(
+                member=member,
+                subscription_type=Subscription.SubscriptionType.MONTHLY,
+                start_date=self.today - timedelta(days=i % 60),
+            )
+
+    def test_counters(self):
+        today = self.today
+        active = make_member("attivo")
+        MemberDocument.objects.create(
+            member=active, document_type="MEDICAL_CERTIFICATE", file="a.pdf",
+            expiration_date=today - timedelta(days=400),
+        )
+        MemberDocument.objects.create(
+            member=active, document_type="MEDICAL_CERTIFICATE", file="b.pdf",
+            expiration_date=today + timedelta(days=10),
+        )
+        expired = make_member("scaduto")
+        MemberDocument.objects.create(
+            member=expired, document_type="MEDICAL_CERTIFICATE", file="c.pdf",
+            expiration_date=today - timedelta(days=1),
+        )
+        suspended = make_member("sospeso")
+        MemberDocument.objects.create(
+            member=suspended, document_type="IDENTITY_CARD", file="d.pdf",
+        )
+        make_member("senza_niente")
+
+        # attivo, in scadenza entro 30 gg
+        Subscription.objects.create(
+            member=suspended, subscription_type="MONTHLY",
+            start_date=today - timedelta(days=10), end_date=today + timedelta(days=20),
+        )
+        # attivo, non in scadenza
+        Subscription.objects.create(
+            member=active, subscription_type="ANNUAL",
+            start_date=today - timedelta(days=10), end_date=today + timedelta(days=300),
+        )
+        # scaduto
+        Subscription.objects.create(
+            member=expired, subscription_type="MONTHLY",
+            start_date=today - timedelta(days=60), end_date=today - timedelta(days=30),
+        )
+        # non ancora attivo
+        Subscription.objects.create(
+            member=expired, subscription_type="MONTHLY",
+            start_date=today + timedelta(days=5),
+        )
+
+        c = dashboard_counters(today)
+        self.assertEqual(c['total_members'], 4)
+        self.assertEqual(c['total_documents'], 4)
+        self.assertEqual(c['active_certificates'], 1)
+        self.assertEqual(c['expired_certificates'], 1)
+        self.assertEqual(c['suspended_certificates'], 1)
+        self.assertEqual(c['total_subscriptions'], 4)
+        self.assertEqual(c['active_subscriptions'], 2)
+        self.assertEqual(c['expiring_subscriptions'], 1)
+        self.assertEqual(c['expired_subscriptions'], 1)
+
+    def test_query_count_is_constant(self):
+        self._populate(5)
+        with CaptureQueriesContext(connection) as small:
+            dashboard_counters(self.today)
+        self._populate(50, offset=5)
+        with CaptureQueriesContext(connection) as large:
+            dashboard_counters(self.today)
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(len(large), 4)
+
+    def test_dashboard_view_query_count_is_constant(self):
+        office = make_member("segreteria", role=Member.Role.STAFF)
+        self.client.force_login(office)
+        url = reverse('dashboard')
+
+        self._populate(5)
+        with CaptureQueriesContext(connection) as small:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self._populate(50, offset=5)
+        with CaptureQueriesContext(connection) as large:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(len(small), len(large))
+
+
+class MemberStatusTests(TestCase):
+
+    def setUp(self):
+        self.today = timezone.now().date()
+        self.member = make_member("mario")
+
+    def snapshot(self):
+        return MemberStatus.objects.get(member=self.member)
+
+    def test_created_with_member(self):
+        st = self.snapshot()
+        self.assertFalse(st.has_certificate)
+        self.assertEqual(st.active_subscriptions, 0)
+        self.assertEqual(st.certificate_status(self.today), "Assente")
+
+    def test_updated_on_save(self):
+        MemberDocument.objects.create(
+            member=self.member, document_type="MEDICAL_CERTIFICATE", file="a.pdf",
+            expiration_date=self.today - timedelta(days=5),
+        )
+        sub = Subscription.objects.create(
+            member=self.member, subscription_type="MONTHLY",
+            start_date=self.today - timedelta(days=5),
+        )
+        Payment.objects.create(
+            member=self.member, subscription=sub, payment_type="MONTHLY",
+            amount=Decimal("50"), discount=Decimal("5"), is_paid=False,
+        )
+        st = self.snapshot()
+        self.assertTrue(st.has_certificate)
+        self.assertEqual(st.certificate_status(self.today), "Scaduto")
+        self.assertEqual(st.active_subscriptions, 1)
+        self.assertEqual(st.next_subscription_end, sub.end_date)
+        self.assertEqual(st.unpaid_balance, Decimal("45"))
+
+    def test_updated_on_delete(self):
+        doc = MemberDocument.objects.create(
+            member=self.member, document_type="MEDICAL_CERTIFICATE", file="a.pdf",
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            doc.delete()
+        self.assertFalse(self.snapshot().has_certificate)
+
+    def test_member_delete_cascades(self):
+        Subscription.objects.create(
+            member=self.member, subscription_type="MONTHLY", start_date=self.today,
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.member.delete()
+        self.assertFalse(MemberStatus.objects.exists())
+
+    def test_nightly_command(self):
+        Subscription.objects.create(
+            member=self.member, subscription_type="MONTHLY",
+            start_date=self.today, end_date=self.today + timedelta(days=30),
+        )
+        # simula una fotografia vecchia
+        MemberStatus.objects.update(active_subscriptions=0, next_subscription_end=None)
+        call_command('refresh_member_status', stdout=StringIO())
+        st = self.snapshot()
+        self.assertEqual(st.active_subscriptions, 1)
+        self.assertEqual(st.computed_on, self.today)
+
+    def test_certificate_status_view_filters(self):
+        office = make_member("segreteria", role=Member.Role.STAFF)
+        MemberDocument.objects.create(
+            member=self.member, document_type="MEDICAL_CERTIFICATE", file="a.pdf",
+            expiration_date=self.today - timedelta(days=1),
+        )
+        self.client.force_login(office)
+        url = reverse('members:medical_certificate_status')
+        rows = self.client.get(url, {'status': 'Scaduto'}).context['members_status']
+        self.assertEqual([r['member'] for r in rows], [self.member])
+        rows = self.client.get(url, {'status': 'Assente'}).context['members_status']
+        self.assertEqual([r['member'] for r in rows], [office])
+
+
+class SubscriptionStatusViewTests(TestCase):
+
+    def setUp(self):
+        self.today = timezone.now().date()
+        self.office = make_member("segreteria", role=Member.Role.STAFF)
+        self.client.force_login(self.office)
+        self.url = reverse('members:subscription_status')
+
+    def _sub(self, member, start, end):
+        return Subscription.objects.create(
+            member=member, subscription_type="MONTHLY", start_date=start, end_date=end,
+        )
+
+    def test_status_and_search_filters(self):
+        rossi = make_member("rossi")
+        bianchi = make_member("bianchi")
+        active = self._sub(rossi, self.today - timedelta(days=5), self.today + timedelta(days=5))
+        expired = self._sub(rossi, self.today - timedelta(days=50), self.today - timedelta(days=20))
+        future = self._sub(bianchi, self.today + timedelta(days=5), self.today + timedelta(days=35))
+
+        def ids(**params):
+            rows = self.client.get(self.url, params).context['subscriptions_status']
+            return {r['subscription'].id for r in rows}
+
+        self.assertEqual(ids(status="Attivo"), {active.id})
+        self.assertEqual(ids(status="Scaduto"), {expired.id})
+        self.assertEqual(ids(status="Non ancora attivo"), {future.id})
+        self.assertEqual(ids(q="ROSSI"), {active.id, expired.id})
+
+    def test_keyset_pagination_walks_all_rows(self):
+        member = make_member("rossi")
+        created = {
+            self._sub(member, self.today, self.today + timedelta(days=i % 7)).id
+            for i in range(120)
+        }
+        # un abbonamento senza data fine (dati storici): va in fondo
+        legacy = self._sub(member, self.today, None)
+        Subscription.objects.filter(pk=legacy.pk).update(end_date=None)
+        created.add(legacy.id)
+
+        seen, cursor, pages = [], None, 0
+        while True:
+            params = {'after': cursor} if cursor else {}
+            with CaptureQueriesContext(connection) as ctx:
+                page = self.client.get(self.url, params).context['page']
+            pages += 1
+            if pages == 1:
+                first_page_queries = len(ctx)
+            else:
+                self.assertEqual(len(ctx), first_page_queries)
+            seen.extend(sub.id for sub in page)
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+
+        self.assertEqual(pages, 3)
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertEqual(set(seen), created)
+        self.assertEqual(seen[-1], legacy.id)
+
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        self._sub(make_member("rossi"), self.today, self.today)
+        response = self.client.get(self.url, {'after': 'non-valido'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['page'].is_first)
+
+
+class MedicalCertificateStatusViewTests(TestCase):
+
+    def setUp(self):
+        self.today = timezone.now().date()
+        self.office = make_member("segreteria", role=Member.Role.STAFF)
+        self.client.force_login(self.office)
+        self.url = reverse('members:medical_certificate_status')
+
+    def _cert(self, member, days):
+        return MemberDocument.objects.create(
+            member=member, document_type="MEDICAL_CERTIFICATE", file="c.pdf",
+            expiration_date=self.today + timedelta(days=days),
+        )
+
+    def test_latest_certificate_wins(self):
+        member = make_member("rossi")
+        self._cert(member, -30)
+        latest = self._cert(member, 30)
+        MemberDocument.objects.create(member=member, document_type="IDENTITY_CARD", file="ci.pdf")
+
+        annotated = Member.objects.with_latest_certificate().get(pk=member.pk)
+        self.assertEqual(annotated.latest_certificate_id, latest.id)
+
+        rows = self.client.get(self.url, {'q': 'rossi'}).context['members_status']
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['document'], latest)
+        self.assertEqual(rows[0]['cert_status'], "Attivo")
+
+    def test_paginated_with_constant_queries(self):
+        for i in range(5):
+            self._cert(make_member(f"socio{i}"), -1)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(self.url, {'status': 'Scaduto'})
+        for i in range(5, 80):
+            self._cert(make_member(f"socio{i}"), -1)
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get(self.url, {'status': 'Scaduto'})
+        self.assertEqual(len(small), len(large))
+        page = response.context['page']
+        self.assertEqual(len(page), 50)
+        self.assertTrue(page.has_next)
+        rows = self.client.get(
+            self.url, {'status': 'Scaduto', 'after': page.next_cursor}
+        ).context['members_status']
+        self.assertEqual(len(rows), 30)
+
+
+@skipUnless(connection.vendor in ('sqlite', 'postgresql'), "EXPLAIN solo su SQLite/PostgreSQL")
+class QueryPlanTests(TestCase):
+    """
+    Le pagine calde non devono fare scansioni complete delle tabelle
+    principali: ogni SELECT eseguita dalla view deve passare da un indice.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        today = timezone.now().date()
+        cls.office = make_member("segreteria", role=Member.Role.STAFF)
+        for i in range(20):
+            member = make_member(f"socio{i}")
+            MemberDocument.objects.create(
+                member=member, document_type="MEDICAL_CERTIFICATE", file="c.pdf",
+                expiration_date=today + timedelta(days=i - 10),
+            )
+            sub = Subscription.objects.create(
+                member=member, subscription_type="MONTHLY",
+                start_date=today - timedelta(days=i),
+            )
+            Payment.objects.create(
+                member=member, subscription=sub, payment_type="MONTHLY",
+                due_date=today + timedelta(days=i - 10), is_paid=bool(i % 2),
+            )
+
+    def assertNoFullScans(self, url_name, **params):
+        self.client.force_login(self.office)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse(url_name), params)
+        self.assertEqual(response.status_code, 200)
+        for sql, plan, scans in plan_report(ctx.captured_queries):
+            self.assertFalse(scans, f"Scansione completa di {scans}:\n{sql}\n" + "\n".join(plan))
+
+    def test_dashboard(self):
+        self.assertNoFullScans('dashboard')
+
+    def test_payment_all(self):
+        for status in ('', 'paid', 'unpaid', 'overdue'):
+            with self.subTest(status=status):
+                self.assertNoFullScans('members:payment_all', status=status)
+
+    def test_payment_due(self):
+        self.assertNoFullScans('members:payment_due')
+
+    def test_subscription_status(self):
+        for status in ('', 'Attivo', 'Scaduto', 'Non ancora attivo'):
+            with self.subTest(status=status):
+                self.assertNoFullScans('members:subscription_status', status=status)
+
+    def test_medical_certificate_status(self):
+        for status in ('', 'Attivo', 'Scaduto', 'Assente'):
+            with self.subTest(status=status):
+                self.assertNoFullScans('members:medical_certificate_status', status=status)
+
+
+class PaymentTotalsTests(TestCase):
+
+    def setUp(self):
+        self.today = timezone.now().date()
+        self.office = make_member("segreteria", role=Member.Role.STAFF)
+        self.client.force_login(self.office)
+
+    def _payments(self, member, n, offset=0):
+        for i in range(offset, offset + n):
+            Payment.objects.create(
+                member=member, payment_type="MONTHLY", due_date=self.today - timedelta(days=i),
+                amount=Decimal("30"), discount=Decimal("5"), is_paid=bool(i % 2),
+            )
+
+    def test_totals(self):
+        member = make_member("rossi")
+        self._payments(member, 4)
+        totals = Payment.objects.totals()
+        self.assertEqual(totals, {'paid': Decimal("50"), 'unpaid': Decimal("50")})
+        self.assertEqual(Payment.objects.none().totals(), {'paid': 0, 'unpaid': 0})
+
+        response = self.client.get(reverse('members:payment_list', args=[member.id]))
+        self.assertEqual(response.context['total_paid'], Decimal("50"))
+        self.assertEqual(response.context['total_due'], Decimal("50"))
+
+    def test_payment_all_constant_queries_and_bounded_page(self):
+        member = make_member("rossi")
+        url = reverse('members:payment_all')
+        self._payments(member, 5)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(url)
+        self._payments(member, 120, offset=5)
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get(url)
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(len(response.context['payments']), 50)
+        self.assertEqual(response.context['tot_paid'], Decimal("25") * 62)
+
+        second = self.client.get(url, {'after': response.context['page'].next_cursor})
+        first_ids = {p.id for p in response.context['payments']}
+        self.assertFalse(first_ids & {p.id for p in second.context['payments']})
+
+
+class SubscriptionPaymentStateTests(TestCase):
+
+    def setUp(self):
+        self.today = timezone.now().date()
+        self.member = make_member("rossi")
+
+    def _subs(self, n, offset=0):
+        for i in range(offset, offset + n):
+            sub = Subscription.objects.create(
+                member=self.member, subscription_type="MONTHLY",
+                start_date=self.today - timedelta(days=20 - i % 20),
+            )
+            if i % 3:
+                Payment.objects.create(
+                    member=self.member, subscription=sub, payment_type="MONTHLY",
+                    amount=Decimal("40"), discount=Decimal("10"), is_paid=bool(i % 2),
+                )
+
+    def test_properties_without_annotation(self):
+        sub = Subscription.objects.create(
+            member=self.member, subscription_type="MONTHLY", start_date=self.today,
+        )
+        self.assertIsNone(Subscription.objects.get(pk=sub.pk).payment)
+        self.assertFalse(Subscription.objects.get(pk=sub.pk).is_paid)
+        payment = Payment.objects.create(
+            member=self.member, subscription=sub, payment_type="MONTHLY", is_paid=True,
+        )
+        sub = Subscription.objects.get(pk=sub.pk)
+        self.assertEqual(sub.payment, payment)
+        self.assertTrue(sub.is_paid)
+
+    def test_annotations_avoid_per_row_queries(self):
+        self._subs(6)
+        with self.assertNumQueries(1):
+            subs = list(Subscription.objects.with_payment_state())
+            states = [(s.is_paid, s.payment_net_amount) for s in subs]
+        self.assertEqual(states.count((True, Decimal("30"))), 2)
+        self.assertEqual(states.count((False, Decimal("30"))), 2)
+        self.assertEqual(states.count((False, None)), 2)
+
+    def test_views_render_in_constant_queries(self):
+        office = make_member("segreteria", role=Member.Role.STAFF)
+        urls = [
+            (office, reverse('members:subscription_list', args=[self.member.id])),
+            (office, reverse('members:payment_due')),
+            (self.member, reverse('dashboard')),
+        ]
+        self._subs(3)
+        small = {}
+        for user, url in urls:
+            self.client.force_login(user)
+            with CaptureQueriesContext(connection) as ctx:
+                self.client.get(url)
+            small[url] = len(ctx)
+        self._subs(30, offset=3)
+        for user, url in urls:
+            self.client.force_login(user)
+            with CaptureQueriesContext(connection) as ctx:
+                self.client.get(url)
+            self.assertEqual(len(ctx), small[url], url)
+
+
+class AccessImportTests(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        Sector.objects.create(name="Karate")
+        SportsBody.objects.create(name="CSEN", code="CSEN")
+
+    def _csv(self, name, rows):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, 'w', newline='', encoding='utf-8') as fh:
+            csv.writer(fh, delimiter=';').writerows(rows)
+        return path
+
+    def _soci(self):
+        return self._csv('soci.csv', [
+            ['Tessera', 'Cognome', 'Nome', 'Sesso', 'Data nascita', 'Settore', 'Tessera genitore'],
+            ['BS/23/002', 'Rossi', 'Luca', 'M', '10/05/2015', 'Karate', 'BS/23/001'],
+            ['BS/23/001', 'Rossi', 'Mario', 'M', '1980-01-31', 'Karate', ''],
+            ['BS/23/003', 'Bianchi', 'Anna', 'X', '', 'Karate', ''],
+            ['BS/23/004', 'Verdi', 'Paola', 'F', '31/02/1990', '', ''],
+        ])
+
+    def test_import_soci_with_guardian_and_errors(self):
+        errors = os.path.join(self.tmp.name, 'scarti.csv')
+        out = StringIO()
+        call_command('import_access', soci=self._soci(), errors=errors, batch_size=1, stdout=out)
+
+        child = Member.objects.get(card_number='BS/23/002')
+        self.assertEqual(child.guardian.card_number, 'BS/23/001')  # genitore dopo il figlio
+        self.assertEqual(child.date_of_birth, date(2015, 5, 10))
+        self.assertEqual(child.sector.name, "Karate")
+        self.assertFalse(child.has_usable_password())
+        self.assertTrue(MemberStatus.objects.filter(member=child).exists())
+
+        with open(errors, encoding='utf-8') as fh:
+            rejected = list(csv.reader(fh, delimiter=';'))[1:]
+        self.assertEqual([r[1] for r in rejected], ['4', '5'])
+        self.assertIn("2 righe scartate", out.getvalue())
+
+    def test_reimport_updates_instead_of_duplicating(self):
+        path = self._soci()
+        call_command('import_access', soci=path, errors='', stdout=StringIO())
+        Member.objects.filter(card_number='BS/23/001').update(first_name="Altro")
+        call_command('import_access', soci=path, errors='', stdout=StringIO())
+        self.assertEqual(Member.objects.filter(card_number__startswith='BS/').count(), 2)
+        self.assertEqual(Member.objects.get(card_number='BS/23/001').first_name, "Mario")
+
+    def test_resume_from_checkpoint(self):
+        checkpoint = os.path.join(self.tmp.name, 'import.json')
+        soci = self._soci()
+        AccessImporter(checkpoint=checkpoint, errors='').run('soci', soci)
+        quote = self._csv('quote.csv', [
+            ['Tessera', 'Tipo', 'Data pagamento', 'Scadenza', 'Importo', 'Sconto', 'Modalita', 'Pagato'],
+            ['BS/23/001', 'Mensile', '01/09/2024', '01/09/2024', '45,00', '5', 'Contanti', 'S'],
+            ['BS/23/002', 'QUARTERLY', '01/09/2024', '01/09/2024', '1.120,50', '', 'POS', 'N'],
+            ['BS/23/999', 'Mensile', '01/09/2024', '', '45', '', '', ''],
+        ])
+
+        first = AccessImporter(checkpoint=checkpoint, errors='')
+        first.run('quote', quote)
+        first.finish()
+        self.assertEqual(Payment.objects.count(), 2)
+        paid = Payment.objects.get(member__card_number='BS/23/001')
+        self.assertEqual(paid.next_due_date, date(2024, 10, 1))
+        unpaid = Payment.objects.get(member__card_number='BS/23/002')
+        self.assertEqual(unpaid.amount, Decimal('1120.50'))
+        self.assertEqual(unpaid.payment_mode, Payment.PaymentMode.BANK)
+        self.assertFalse(unpaid.is_paid)
+        self.assertEqual(MemberStatus.objects.get(member=unpaid.member).unpaid_balance, Decimal('1120.50'))
+
+        again = AccessImporter(checkpoint=checkpoint, errors='')
+        stats = again.run('quote', quote)
+        self.assertEqual(stats['saltati'], 3)
+        self.assertEqual(Payment.objects.count(), 2)
+
+        # checkpoint perso: le righe si rileggono ma si aggiornano per chiave naturale
+        os.remove(checkpoint)
+        AccessImporter(checkpoint=checkpoint, errors='').run('quote', quote)
+        self.assertEqual(Payment.objects.count(), 2)
+
+    def test_identical_installments_are_kept(self):
+        AccessImporter(errors='').run('soci', self._soci())
+        rows = [
+            ['Tessera', 'Tipo', 'Scadenza', 'Importo', 'Ricevuta'],
+            ['BS/23/001', 'Mensile', '01/09/2024', '45', ''],
+            ['BS/23/001', 'Mensile', '01/09/2024', '45', ''],
+            ['BS/23/002', 'Mensile', '01/09/2024', '45', 'R-7'],
+            ['BS/23/002', 'Mensile', '01/09/2024', '45', 'R-8'],
+        ]
+        for _ in range(2):  # lo stesso foglio riletto non duplica
+            AccessImporter(errors='').run('quote', self._csv('rate.csv', rows))
+            self.assertEqual(Payment.objects.filter(member__card_number='BS/23/001').count(), 2)
+            self.assertEqual(Payment.objects.filter(member__card_number='BS/23/002').count(), 2)
+
+        # la ricevuta identifica la quota anche se la riga si sposta
+        AccessImporter(errors='').run('quote', self._csv('rate.csv', [rows[0], rows[4], rows[3]]))
+        self.assertEqual(Payment.objects.filter(member__card_number='BS/23/002').count(), 2)
+
+    def test_affiliazioni_and_certificati(self):
+        AccessImporter(errors='').run('soci', self._soci())
+        importer = AccessImporter(errors='')
+        importer.run('affiliazioni', self._csv('aff.csv', [
+            ['Tessera', 'Ente', 'Tessera federale', 'Anno'],
+            ['BS/23/001', 'csen', 'F-1', '2024/2025'],
+            ['BS/23/001', 'CSEN', 'F-2', '2024/2025'],
+        ]))
+        importer.run('certificati', self._csv('cert.csv', [
+            ['Tessera', 'Scadenza', 'File'],
+            ['BS/23/001', '30/06/2025', 'member_documents/rossi.pdf'],
+        ]))
+        importer.finish()
+        self.assertEqual(Affiliation.objects.get().federal_card, 'F-2')
+        doc = MemberDocument.objects.get()
+        self.assertEqual(doc.document_type, MemberDocument.DocumentType.MEDICAL_CERTIFICATE)
+        self.assertEqual(doc.member.status_snapshot.certificate_expiry, date(2025, 6, 30))
+
+        # stesso export rilanciato: nessun certificato doppio
+        AccessImporter(errors='').run('certificati', os.path.join(self.tmp.name, 'cert.csv'))
+        self.assertEqual(MemberDocument.objects.count(), 1)
+
+    def test_usernames_resolved_in_memory(self):
+        make_member("bs-23-001")
+        importer = AccessImporter(errors='')
+        with CaptureQueriesContext(connection) as queries:
+            importer.run('soci', self._soci())
+        self.assertFalse([q for q in queries if '"username" =' in q['sql']])
+        self.assertEqual(Member.objects.get(card_number='BS/23/001').username, 'bs-23-001-2')
+
+
+class ExportTests(TestCase):
+
+    def setUp(self):
+        self.today = timezone.now().date()
+        self.office = make_member("segreteria", role=Member.Role.STAFF)
+        self.client.force_login(self.office)
+        self.rossi = make_member("rossi", card_number="BS/1")
+
+    def _payments(self, n, offset=0):
+        Payment.objects.bulk_create([
+            Payment(member=self.rossi, payment_type="MONTHLY", amount=Decimal("30"),
+                    discount=Decimal("5"), is_paid=bool(i % 2),
+                    due_date=self.today - timedelta(days=i))
+            for i in range(offset, offset + n)
+        ])
+
+    def _csv(self, response):
+        self.assertTrue(response.streaming)
+        content = b''.join(response.streaming_content).decode('utf-8-sig')
+        return list(csv.reader(StringIO(content), delimiter=';'))
+
+    def test_payments_csv_uses_list_filters(self):
+        self._payments(4)
+        url = reverse('members:export_dataset', args=['pagamenti'])
+        rows = self._csv(self.client.get(url, {'status': 'overdue', 'q': 'ross'}))
+        self.assertEqual(rows[0][:3], ["Tessera", "Cognome", "Nome"])
+        self.assertEqual(len(rows), 1 + 1)  # insoluto con scadenza passata (i=2)
+        self.assertEqual(rows[1][0], "BS/1")
+        self.assertEqual(rows[1][3], "Mensile")
+        self.assertEqual(rows[1][10], "25,00")
+        self.assertEqual(rows[1][-1], "No")
+
+    def test_constant_queries(self):
+        url = reverse('members:export_dataset', args=['pagamenti'])
+        self._payments(3)
+        with CaptureQueriesContext(connection) as small:
+            self._csv(self.client.get(url))
+        self._payments(300, offset=3)
+        with CaptureQueriesContext(connection) as large:
+            rows = self._csv(self.client.get(url))
+        self.assertEqual(len(rows), 1 + 303)
+        self.assertEqual(len(small), len(large))
+
+    def test_subscriptions_and_affiliations(self):
+        Subscription.objects.create(
+            member=self.rossi, subscription_type="MONTHLY",
+            start_date=self.today - timedelta(days=40), end_date=self.today - timedelta(days=10),
+        )
+        rows = self._csv(self.client.get(
+            reverse('members:export_dataset', args=['abbonamenti']), {'status': 'Scaduto'},
+        ))
+        self.assertEqual(rows[1][-1], "Scaduto")
+
+        csen = SportsBody.objects.create(name="CSEN", code="CSEN")
+        Affiliation.objects.create(member=self.rossi, body=csen, federal_card="F-1")
+        rows = self._csv(self.client.get(
+            reverse('members:export_dataset', args=['affiliazioni']), {'ente': 'csen'},
+        ))
+        self.assertEqual(rows[1][:3], ["CSEN", "CSEN", "BS/1"])
+
+    def test_unknown_dataset_and_permissions(self):
+        self.assertEqual(self.client.get(
+            reverse('members:export_dataset', args=['nulla'])).status_code, 404)
+        self.client.force_login(self.rossi)
+        self.assertEqual(self.client.get(
+            reverse('members:export_dataset', args=['soci'])).status_code, 403)
+
+    def test_excel_button_only_with_openpyxl(self):
+        for name in ('members:payment_all', 'members:subscription_status'):
+            response = self.client.get(reverse(name))
+            self.assertEqual('format=xlsx' in response.content.decode(), xlsx_available())
+
+    def test_command(self):
+        self._payments(2)
+        out = StringIO()
+        call_command('export_data', 'soci', '--q', 'rossi', stdout=out)
+        rows = list(csv.reader(StringIO(out.getvalue().lstrip('\ufeff')), delimiter=';'))
+        self.assertEqual([r[0] for r in rows[1:]], ["BS/1"])
+
+    @skipUnless(xlsx_available(), "openpyxl non installato")
+    def test_xlsx(self):
+        from openpyxl import load_workbook
+        self._payments(2)
+        path = os.path.join(tempfile.mkdtemp(), 'pagamenti.xlsx')
+        call_command('export_data', 'pagamenti', '--format', 'xlsx', '-o', path, stderr=StringIO())
+        sheet = load_workbook(path, read_only=True).active
+        rows = list(sheet.iter_rows(values_only=True))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[1][7], 30)
+
+
+class MemberSearchTests(TestCase):
+
+    def setUp(self):
+        self.nicolo = Member.objects.create(
+            username="nrossi", first_name="Nicolò", last_name="Rossi",
+            fiscal_code="RSSNCL80A01F205X", card_number="BS/23/00202", phone_number="3331234567",
+        )
+        self.maria = Member.objects.create(
+            username="mbianchi", first_name="Maria", last_name="Bianchi Rossini",
+            email="maria@example.com",
+        )
+
+    def ids(self, q):
+        return set(Member.objects.search(q).values_list('id', flat=True))
+
+    def test_fields_accents_and_prefixes(self):
+        self.assertEqual(self.ids("nicolo"), {self.nicolo.id})
+        self.assertEqual(self.ids("ROSS"), {self.nicolo.id, self.maria.id})
+        self.assertEqual(self.ids("ros mar"), {self.maria.id})
+        self.assertEqual(self.ids("rssncl80"), {self.nicolo.id})
+        self.assertEqual(self.ids("BS/23/002"), {self.nicolo.id})
+        self.assertEqual(self.ids("333123"), {self.nicolo.id})
+        self.assertEqual(self.ids("example"), {self.maria.id})
+        self.assertEqual(self.ids("\"'*"), {self.nicolo.id, self.maria.id})  # nessuna parola
+
+    def test_index_follows_updates_and_deletes(self):
+        self.maria.last_name = "Verdi"
+        self.maria.save()
+        self.assertEqual(self.ids("verdi"), {self.maria.id})
+        self.assertEqual(self.ids("rossini"), set())
+        self.nicolo.delete()
+        self.assertEqual(self.ids("ross"), set())
+
+    def test_ranking(self):
+        for name in ("Verdi", "Neri", "Gialli"):  # bm25: serve qualche socio che non corrisponde
+            Member.objects.create(username=name.lower(), first_name="Test", last_name=name)
+        ranked = list(Member.objects.search_ranked("rossi"))
+        self.assertEqual(ranked, [self.nicolo, self.maria])
+
+        office = make_member("segreteria", role=Member.Role.STAFF)
+        self.client.force_login(office)
+        page = self.client.get(reverse('dashboard'), {'q': "rossi"}).context['members']
+        self.assertEqual(page.paginator.count, 2)
+        self.assertEqual(list(page), [self.nicolo, self.maria])
+
+    def test_related_lists_use_same_search(self):
+        Payment.objects.create(member=self.nicolo, payment_type="MONTHLY", amount=Decimal("30"))
+        Subscription.objects.create(member=self.maria, subscription_type="MONTHLY",
+                                    start_date=timezone.now().date())
+        self.assertEqual(Payment.objects.search("nicolò").count(), 1)
+        self.assertEqual(Subscription.objects.search("maria@").count(), 1)
+
+    @skipUnless(connection.vendor == 'sqlite', "trigger FTS5 solo su SQLite")
+    def test_lost_triggers_are_reinstalled(self):
+        with connection.cursor() as cursor:
+            cursor.execute("DROP TRIGGER members_member_fts_au")
+        self.assertTrue(search_index_missing())
+        install_search_index()
+        self.assertFalse(search_index_missing())
+        self.maria.first_name = "Giulia"
+        self.maria.save()
+        self.assertEqual(self.ids("giulia"), {self.maria.id})
+
+
+class ChartSeriesTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.today = timezone.now().date()
+        self.office = make_member("segreteria", role=Member.Role.STAFF)
+        self.client.force_login(self.office)
+        self.member = make_member("rossi")
+
+    def _sub(self, days_ago):
+        return Subscription.objects.create(
+            member=self.member, subscription_type="MONTHLY",
+            start_date=self.today - timedelta(days=days_ago),
+        )
+
+    def test_bucket_by_range_width(self):
+        self.assertEqual(choose_bucket(self.today - timedelta(days=30), self.today), 'day')
+        self.assertEqual(choose_bucket(self.today - timedelta(days=200), self.today), 'week')
+        self.assertEqual(choose_bucket(self.today - timedelta(days=900), self.today), 'month')
+
+    def test_cached_until_invalidated(self):
+        self._sub(1)
+        self._sub(1)
+        series = chart_series('subscriptions')
+        self.assertEqual(series['data'], [2])
+        self.assertEqual(series['bucket'], 'day')
+        with self.assertNumQueries(0):
+            chart_series('subscriptions')
+
+        self._sub(400)  # invalida: la serie si ricalcola, ora per mese
+        series = chart_series('subscriptions')
+        self.assertEqual(series['bucket'], 'month')
+        self.assertEqual(sum(series['data']), 3)
+
+        self.client.force_login(self.member)  # salva solo last_login
+        with self.assertNumQueries(0):
+            chart_series('subscriptions')
+
+    def test_etag_and_not_modified(self):
+        self._sub(3)
+        url = reverse('subscription_data')
+        params = {'start_date': (self.today - timedelta(days=10)).isoformat(),
+                  'end_date': self.today.isoformat()}
+        response = self.client.get(url, params)
+        self.assertEqual(response.json()['data'], [1])
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+
+        self.assertEqual(self.client.get(url, params, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        other = self.client.get(url, {'start_date': params['start_date']})
+        self.assertNotEqual(other['ETag'], etag)
+
+        self._sub(2)
+        response = self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data'], [1, 1])
+
+    def test_category_range_picker_format(self):
+        self._sub(3)
+        self._sub(100)
+        start = (self.today - timedelta(days=10)).isoformat()
+        response = self.client.get(
+            reverse('subscription_category_data'), {'start_date': f"{start} to {self.today}"},
+        )
+        self.assertEqual(response.json()['data'], [1])
+
+
+class DailyStatsTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.today = timezone.now().date()
+        self.karate = Sector.objects.create(name="KARATE")
+        self.member = make_member("rossi", sector=self.karate)
+
+    def stats(self, day, sector=None):
+        return DailyStats.objects.filter(day=day, sector=sector).first()
+
+    def pay(self, **kwargs):
+        return Payment.objects.create(
+            member=self.member, payment_type="MONTHLY",
+            amount=Decimal("50"), discount=Decimal("5"), **kwargs
+        )
+
+    def assert_matches_full_rebuild(self):
+        expected = {
+            (r.day, r.sector_id): (r.new_members, r.new_subscriptions, r.expirations, r.revenue, r.outstanding)
+            for r in compute_daily_stats()
+        }
+        stored = {
+            (r.day, r.sector_id): (r.new_members, r.new_subscriptions, r.expirations, r.revenue, r.outstanding)
+            for r in DailyStats.objects.all()
+        }
+        self.assertEqual(stored, expected)
+
+    def test_counters_by_day_and_sector(self):
+        Subscription.objects.create(
+            member=self.member, subscription_type="MONTHLY", sector=self.karate,
+            start_date=self.today, end_date=self.today + timedelta(days=30),
+        )
+        row = self.stats(self.today, self.karate)
+        self.assertEqual((row.new_members, row.new_subscriptions), (1, 1))
+        self.assertEqual(self.stats(self.today + timedelta(days=30), self.karate).expirations, 1)
+
+    def test_revenue_and_outstanding_use_net_amount(self):
+        self.pay(is_paid=True, payment_date=self.today)
+        self.pay(is_paid=False, due_date=self.today + timedelta(days=5))
+        self.assertEqual(self.stats(self.today, self.karate).revenue, Decimal("45"))
+        self.assertEqual(self.stats(self.today + timedelta(days=5), self.karate).outstanding, Decimal("45"))
+
+    def test_moving_a_payment_refreshes_both_days(self):
+        old_day = self.today - timedelta(days=3)
+        payment = self.pay(is_paid=True, payment_date=old_day)
+        payment.payment_date = self.today
+        payment.save()
+        self.assertIsNone(self.stats(old_day, self.karate))
+        self.assertEqual(self.stats(self.today, self.karate).revenue, Decimal("45"))
+        self.assert_matches_full_rebuild()
+
+    def test_deletes_refresh_after_commit(self):
+        payment = self.pay(is_paid=True, payment_date=self.today)
+        with self.captureOnCommitCallbacks(execute=True):
+            payment.delete()
+        self.assertEqual(self.stats(self.today, self.karate).revenue, 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.member.delete()
+        self.assertFalse(DailyStats.objects.exists())
+
+    def test_one_row_per_day_and_sector(self):
+        self.pay(is_paid=True, payment_date=self.today)
+        DailyStats.objects.create(day=self.today, sector=None)
+        for sector in (self.karate, None):
+            with self.assertRaises(IntegrityError), transaction.atomic():
+                DailyStats.objects.create(day=self.today, sector=sector)
+        refresh_daily_stats([self.today])
+        self.assert_matches_full_rebuild()
+
+    def test_deleting_a_sector_moves_its_rows(self):
+        make_member("bianchi")  # senza settore, stesso giorno
+        self.client.force_login(make_member("segreteria", role=Member.Role.STAFF))
+        self.assertEqual(self.stats(self.today, self.karate).new_members, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('members:sector_delete', args=[self.karate.pk]), follow=True)
+        self.assertContains(response, "eliminato")
+        self.assertFalse(Sector.objects.exists())
+        self.assertEqual(self.stats(self.today).new_members, 3)
+        self.assert_matches_full_rebuild()
+
+        judo = Sector.objects.create(name="JUDO")
+        Subscription.objects.create(
+            member=self.member, subscription_type="MONTHLY", sector=judo, start_date=self.today,
+        )
+        response = self.client.post(reverse('members:sector_delete', args=[judo.pk]), follow=True)
+        self.assertContains(response, "Impossibile eliminare")
+
+    def test_rebuild_command(self):
+        self.pay(is_paid=True, payment_date=self.today)
+        DailyStats.objects.all().delete()
+        out = StringIO()
+        call_command('rebuild_daily_stats', stdout=out)
+        self.assertIn("righe scritte", out.getvalue())
+        self.assert_matches_full_rebuild()
+
+        DailyStats.objects.all().delete()
+        day = self.today.isoformat()
+        call_command('rebuild_daily_stats', since=day, until=day, stdout=out)
+        self.assert_matches_full_rebuild()
+
+    def test_charts_read_the_rollup(self):
+        self.pay(is_paid=True, payment_date=self.today)
+        self.assertEqual(chart_series('revenue')['data'], [45.0])
+        self.assertEqual(chart_series('revenue_by_sector')['labels'], ["KARATE"])
+
+        office = make_member("segreteria", role=Member.Role.STAFF)
+        self.client.force_login(office)
+        response = self.client.get(reverse('members:chart_data', args=['members']))
+        self.assertEqual(response.json()['data'], [2])
+        self.assertTrue(response.has_header('ETag'))
+        missing = self.client.get(reverse('members:chart_data', args=['nessuna']))
+        self.assertEqual(missing.status_code, 404)
+
+
+class ConfigCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.fitness = Sector.objects.create(name="FITNESS")
+        self.package = Package.objects.create(
+            name="Mensile Fitness", sector=self.fitness, package_type="MONTHLY", price=Decimal("40"),
+        )
+
+    def package_ids(self):
+        return [value for value, _ in SubscriptionForm().fields['package'].choices if value]
+
+    def test_choices_come_from_cache(self):
+        self.assertEqual(self.package_ids(), [self.package.pk])
+        with self.assertNumQueries(0):
+            SubscriptionForm().as_p()
+
+    def test_edits_bust_the_snapshot(self):
+        self.package_ids()
+        other = Package.objects.create(
+            name="Annuale Fitness", sector=self.fitness, package_type="ANNUAL", price=Decimal("300"),
+        )
+        self.assertEqual(set(self.package_ids()), {self.package.pk, other.pk})
+        other.is_active = False
+        other.save()
+        self.assertEqual(self.package_ids(), [self.package.pk])
+
+    def test_submitted_value_is_still_validated(self):
+        form = SubscriptionForm(data={'package': self.package.pk, 'start_date': '2025-01-01'})
+        self.assertTrue(form.is_valid())
+        self.assertEqual(form.cleaned_data['package'], self.package)
+        self.package.is_active = False
+        self.package.save()
+        form = SubscriptionForm(data={'package': self.package.pk, 'start_date': '2025-01-01'})
+        self.assertFalse(form.is_valid())
+
+    def test_instructor_keeps_assigned_inactive_sector(self):
+        karate = Sector.objects.create(name="KARATE", is_active=False)
+        instructor = Instructor.objects.create(first_name="Anna")
+        self.assertEqual([v for v, _ in InstructorForm().fields['sectors'].choices], [self.fitness.pk])
+        instructor.sectors.add(karate)  # m2m_changed invalida
+        choices = InstructorForm(instance=instructor).fields['sectors'].choices
+        self.assertEqual({v for v, _ in choices}, {self.fitness.pk, karate.pk})
+
+    def test_config_home_counts(self):
+        office = make_member("segreteria", role=Member.Role.STAFF)
+        self.client.force_login(office)
+        response = self.client.get(reverse('members:config_home'))
+        self.assertEqual(response.context['sector_count'], 1)
+        self.assertEqual(response.context['package_count'], 1)
+
+    def test_cache_url_setting(self):
+        from config.settings import _cache_from_url
+        self.assertEqual(_cache_from_url('file:///var/cache/sgs')['LOCATION'], '/var/cache/sgs')
+        self.assertIn('RedisCache', _cache_from_url('redis://127.0.0.1:6379/1')['BACKEND'])
+        self.assertIn('LocMemCache', _cache_from_url('locmem://')['BACKEND'])
+
+
+FLAKY_CALLS = []
+
+
+@task('tests.flaky')
+def flaky(fail_times=0):
+    FLAKY_CALLS.append(fail_times)
+    if len(FLAKY_CALLS) <= fail_times:
+        raise RuntimeError("errore temporaneo")
+
+
+class JobQueueTests(TestCase):
+
+    def setUp(self):
+        FLAKY_CALLS.clear()
+
+    def test_idempotency_key(self):
+        first = enqueue('tests.flaky', key='una-volta')
+        again = enqueue('tests.flaky', {'fail_times': 3}, key='una-volta')
+        self.assertEqual(first.pk, again.pk)
+        self.assertEqual(Job.objects.count(), 1)
+
+    def test_claim_is_exclusive(self):
+        job = enqueue('tests.flaky')
+        self.assertEqual(claim('w1').pk, job.pk)
+        self.assertIsNone(claim('w2'))
+
+    def test_retry_with_backoff_then_fail(self):
+        job = enqueue('tests.flaky', {'fail_times': 5}, max_attempts=2)
+        with self.assertLogs('members.jobs', 'WARNING'):
+            self.assertEqual(run_pending('w1'), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.Status.QUEUED, 1))
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertIn("errore temporaneo", job.last_error)
+
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        with self.assertLogs('members.jobs', 'WARNING'):
+            run_pending('w1')
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.Status.FAILED, 2))
+
+    def test_success_after_retry(self):
+        job = enqueue('tests.flaky', {'fail_times': 1})
+        with self.assertLogs('members.jobs', 'WARNING'):
+            run_pending('w1')
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        run_pending('w1')
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.DONE)
+        self.assertEqual(len(FLAKY_CALLS), 2)
+
+    def test_stale_job_is_requeued(self):
+        job = enqueue('tests.flaky')
+        claim('morto')
+        Job.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(requeue_stale(), 1)
+        taken = claim('w2')
+        self.assertEqual(taken.pk, job.pk)
+        # il worker morto non puo' piu' chiudere il lavoro
+        self.assertTrue(run_job(taken, 'w2'))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.locked_by), (Job.Status.DONE, 'w2'))
+
+
+    def test_finished_jobs_purged_after_retention(self):
+        now = timezone.now()
+        old_done, old_failed, recent, queued = (enqueue('tests.flaky', key=f'k{i}') for i in range(4))
+        Job.objects.filter(pk__in=[old_done.pk, recent.pk]).update(status=Job.Status.DONE)
+        Job.objects.filter(pk=old_failed.pk).update(status=Job.Status.FAILED)
+        Job.objects.filter(pk__in=[old_done.pk, old_failed.pk]).update(finished_at=now - timedelta(days=100))
+        Job.objects.filter(pk=recent.pk).update(finished_at=now - timedelta(days=10))
+        Job.objects.filter(pk=queued.pk).update(created_at=now - timedelta(days=100))
+
+        out = StringIO()
+        call_command('run_worker', once=True, no_reminders=True, stdout=out)
+        self.assertIn("Eliminati 2 lavori", out.getvalue())
+        self.assertEqual(set(Job.objects.values_list('pk', flat=True)), {recent.pk, queued.pk})
+        # il lavoro appena eseguito dal worker resta, quello di 10 giorni fa no
+        self.assertEqual(purge_finished(timedelta(days=1), batch_size=1), 1)
+        self.assertEqual(list(Job.objects.values_list('pk', flat=True)), [queued.pk])
+
+
+class NotificationTests(TestCase):
+
+    def setUp(self):
+        self.today = timezone.localdate()
+        self.member = make_member("rossi", email="rossi@example.com")
+        self.child = make_member("bianchi", guardian=self.member)
+        self.no_email = make_member("verdi")
+
+    def subscription(self, member, days):
+        return Subscription.objects.create(
+            member=member, subscription_type="MONTHLY",
+            start_date=self.today - timedelta(days=20), end_date=self.today + timedelta(days=days),
+        )
+
+    def test_fan_out_is_idempotent(self):
+        self.subscription(self.member, 5)
+        self.subscription(self.child, 5)
+        self.subscription(self.no_email, 5)
+        self.subscription(self.member, 200)  # rinnovato: niente avviso per il primo
+        self.subscription(make_member("neri", email="neri@example.com"), 100)  # fuori finestra
+        self.assertEqual(send_reminders(), 1)
+        send_reminders()
+        self.assertEqual(Job.objects.count(), 1)
+
+        run_pending('w1')
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ["rossi@example.com"])
+
+    def test_guardian_receives_child_notices(self):
+        sub = self.subscription(self.child, 5)
+        send_reminders()
+        run_pending('w1')
+        self.assertEqual(mail.outbox[0].to, ["rossi@example.com"])
+        self.assertIn(sub.end_date.strftime('%d/%m/%Y'), mail.outbox[0].subject)
+
+    def test_certificate_and_overdue_notices(self):
+        MemberDocument.objects.create(
+            member=self.member, document_type=MemberDocument.DocumentType.MEDICAL_CERTIFICATE,
+            file="documents/cert.pdf", expiration_date=self.today + timedelta(days=3),
+        )
+        paid_later = Payment.objects.create(
+            member=self.member, payment_type="MONTHLY", amount=Decimal("40"),
+            due_date=self.today - timedelta(days=2), is_paid=False,
+        )
+        Payment.objects.create(
+            member=self.member, payment_type="MONTHLY", amount=Decimal("40"),
+            due_date=self.today - timedelta(days=400), is_paid=False,
+        )
+        self.assertEqual(send_reminders(), 2)
+        paid_later.is_paid = True
+        paid_later.save()
+
+        run_pending('w1')
+        self.assertEqual(len(mail.outbox), 1)  # la rata e' stata pagata nel frattempo
+        self.assertIn("certificato medico", mail.outbox[0].subject)
+        self.assertEqual(Job.objects.filter(status=Job.Status.DONE).count(), 2)
+
+    def test_run_worker_once(self):
+        self.subscription(self.member, 5)
+        out = StringIO()
+        call_command('run_worker', once=True, stdout=out)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn("2 lavori eseguiti", out.getvalue())
+        self.assertTrue(Job.objects.filter(idempotency_key=f'reminders:{self.today}').exists())
+
+
+class BulkRenewalTests(TestCase):
+
+    def setUp(self):
+        self.today = timezone.now().date()
+        self.fitness = Sector.objects.create(name="FITNESS")
+        self.package = Package.objects.create(
+            name="Mensile Fitness", sector=self.fitness, package_type="MONTHLY", price=Decimal("40"),
+        )
+
+    def expiring(self, n, days=10, package=None):
+        subs = []
+        for i in range(n):
+            member = make_member(f"socio{len(subs)}_{days}_{n}")
+            subs.append(Subscription.objects.create(
+                member=member, package=package or self.package,
+                start_date=self.today + timedelta(days=days) - timedelta(days=31),
+                end_date=self.today + timedelta(days=days),
+            ))
+        return subs
+
+    def test_preview_periods_and_amounts(self):
+        sub, = self.expiring(1)
+        renewal, = plan_renewals(renewal_candidates(self.today, self.today + timedelta(days=30)))
+        self.assertEqual(renewal.start_date, sub.end_date + timedelta(days=1))
+        self.assertEqual(renewal.end_date, renewal.start_date + self.package.duration)
+        self.assertEqual(renewal.amount, Decimal("40"))
+
+        self.package.is_active = False
+        self.package.save()
+        renewal, = plan_renewals(renewal_candidates(self.today, self.today + timedelta(days=30)))
+        self.assertFalse(renewal.ok)
+
+    def test_renew_in_constant_queries(self):
+        small = [s.pk for s in self.expiring(2)]
+        large = [s.pk for s in self.expiring(40, days=12)]
+        with CaptureQueriesContext(connection) as few:
+            renew(small)
+        with CaptureQueriesContext(connection) as many:
+            renew(large)
+        self.assertEqual(len(few), len(many))
+
+        renewed = Subscription.objects.filter(start_date=self.today + timedelta(days=13))
+        self.assertEqual(renewed.count(), 40)
+        payment = renewed.first().payment
+        self.assertEqual((payment.amount, payment.is_paid, payment.payment_type), (Decimal("40"), False, "MONTHLY"))
+        self.assertEqual(payment.due_date, self.today + timedelta(days=13))
+        self.assertEqual(MemberStatus.objects.get(pk=payment.member_id).unpaid_balance, Decimal("40"))
+
+    def test_double_submit_renews_once(self):
+        ids = [s.pk for s in self.expiring(3)]
+        self.assertEqual(len(renew(ids)), 3)
+        self.assertEqual(renew(ids), [])
+        self.assertFalse(renewal_candidates(self.today, self.today + timedelta(days=30)).exists())
+
+    def test_view_preview_and_confirm(self):
+        office = make_member("segreteria", role=Member.Role.STAFF)
+        self.client.force_login(office)
+        sub, = self.expiring(1)
+        url = reverse('members:subscription_renewals')
+        response = self.client.get(url)
+        self.assertEqual(response.context['renewable'], 1)
+        response = self.client.post(url, {'renew': [sub.pk]})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Subscription.objects.filter(member=sub.member).count(), 2)
+
+
+class SubscriptionOverlapTests(TestCase):
+
+    def setUp(self):
+        self.office = make_member("segreteria", role=Member.Role.STAFF)
+        self.client.force_login(self.office)
+        self.member = make_member("rossi")
+        self.fitness = Sector.objects.create(name="FITNESS")
+        self.karate = Sector.objects.create(name="KARATE")
+        self.monthly = Package.objects.create(
+            name="Mensile Fitness", sector=self.fitness, package_type="MONTHLY", price=Decimal("40"),
+        )
+        self.karate_monthly = Package.objects.create(
+            name="Mensile Karate", sector=self.karate, package_type="MONTHLY", price=Decimal("35"),
+        )
+        self.current = Subscription.objects.create(
+            member=self.member, package=self.monthly, start_date=date(2025, 1, 1),
+        )  # 01/01 - 01/02
+
+    def post_new(self, package, start):
+        return self.client.post(
+            reverse('members:add_subscription_with_payment', args=[self.member.pk]),
+            {'package': package.pk, 'start_date': start, 'discount': '0'},
+        )
+
+    def test_overlap_rejected_in_same_sector_only(self):
+        response = self.post_new(self.monthly, '2025-01-15')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("stesso settore", str(response.context['form'].errors['start_date']))
+        self.assertEqual(self.post_new(self.monthly, '2025-02-02').status_code, 302)
+        self.assertEqual(self.post_new(self.karate_monthly, '2025-01-15').status_code, 302)
+
+    def test_edit_checks_recomputed_period(self):
+        later = Subscription.objects.create(
+            member=self.member, package=self.monthly, start_date=date(2025, 3, 1),
+        )
+        url = reverse('members:subscription_edit', args=[later.pk])
+        response = self.client.post(url, {'package': self.monthly.pk, 'start_date': '2025-01-20'})
+        self.assertEqual(response.status_code, 200)
+        response = self.client.post(url, {'package': self.monthly.pk, 'start_date': '2025-03-10'})
+        self.assertEqual(response.status_code, 302)  # si confronta solo con gli altri
+
+    def test_model_clean_for_admin(self):
+        sub = Subscription(
+            member=self.member, sector=self.fitness, subscription_type="MONTHLY",
+            start_date=date(2024, 12, 1), end_date=None,
+        )
+        with self.assertRaises(ValidationError):
+            sub.full_clean()
+
+    def test_batch_check_in_one_query(self):
+        candidates = [
+            Subscription(member=self.member, sector=self.fitness, start_date=date(2025, 1, 20), end_date=date(2025, 2, 20)),
+            Subscription(member=self.member, sector=self.fitness, start_date=date(2025, 2, 2), end_date=date(2025, 3, 2)),
+            Subscription(member=self.member, sector=self.fitness, start_date=date(2025, 2, 15), end_date=date(2025, 3, 15)),
+            Subscription(member=self.member, sector=self.karate, start_date=date(2025, 1, 1), end_date=None),
+        ]
+        with self.assertNumQueries(1):
+            clashes = Subscription.objects.overlaps_in_batch(candidates)
+        self.assertEqual(clashes, {0, 2})
+
+
+class ProfilingTests(TestCase):
+
+    def setUp(self):
+        self.office = make_member("segreteria", role=Member.Role.STAFF)
+        self.client.force_login(self.office)
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.log = os.path.join(tmp.name, 'perf.log')
+
+    def test_repeated_sql_flagged(self):
+        profile = RequestProfile()
+        with connection.execute_wrapper(profile):
+            for member in Member.objects.all()[:1]:
+                for _ in range(6):
+                    list(Member.objects.filter(pk=member.pk))
+        self.assertEqual(profile.queries, 7)
+        self.assertEqual(profile.n_plus_one()[0]['count'], 6)
+
+    def test_disabled_by_default(self):
+        response = self.client.get(reverse('dashboard'))
+        self.assertFalse(response.has_header('Server-Timing'))
+
+    def test_slow_requests_logged_and_reported(self):
+        with override_settings(SGS_PROFILING=True, SGS_PROFILING_SLOW_MS=0, SGS_PROFILING_LOG=self.log):
+            response = self.client.get(reverse('dashboard'))
+            self.client.get(reverse('dashboard'))
+        self.assertIn('db;desc=', response['Server-Timing'])
+
+        with open(self.log, encoding='utf-8') as fh:
+            records = [json.loads(line) for line in fh]
+        self.assertEqual(len(records), 2)
+        self.assertEqual(records[0]['url_name'], 'dashboard')
+        self.assertGreater(records[0]['queries'], 0)
+        self.assertGreater(records[0]['template_ms'], 0)
+
+        out = StringIO()
+        call_command('perf_report', log=self.log, stdout=out)
+        self.assertRegex(out.getvalue(), r'dashboard\s+2\s')
+
+
+class SyntheticDataTests(TestCase):
+
+    def test_generate_is_reproducible_and_consistent(self):
+        totals = SyntheticData(seed=1).generate(40)
+        self.assertEqual(totals['members'], 40)
+        self.assertEqual(totals['subscriptions'], totals['payments'])
+        first = list(Member.objects.filter(username__startswith='syn').values_list('last_name', 'date_of_birth'))
+        minors = Member.objects.filter(username__startswith='syn', guardian__isnull=False)
+        self.assertTrue(all(m.is_minor for m in minors))
+        self.assertEqual(MemberStatus.objects.count(), 40)
+        self.assertTrue(DailyStats.objects.exists())
+
+        Member.objects.filter(username__startswith='syn').delete()
+        SyntheticData(seed=1).generate(40, first=1)
+        again = list(Member.objects.filter(username__startswith='syn').values_list('last_name', 'date_of_birth'))
+        self.assertEqual(first, again)
+
+    def test_benchmark_run_and_compare(self):
+        document = benchmarks.run(
+            [15], repeat=1, only={'dashboard', 'payment_due', 'chart_revenue'}, log=lambda line: None,
+        )
+        self.assertEqual([r['status'] for r in document['results']], [200, 200, 200])
+        slower = {'results': [dict(r, median_ms=r['median_ms'] * 2) for r in document['results']]}
+        self.assertEqual(benchmarks.compare(document, document), [])
+        self.assertEqual(len(benchmarks.compare(slower, document)), 3)
+
+
+
+class QueryCountTests(TestCase):
+    """Nessuna pagina di segreteria deve fare piu' query con piu' righe."""
+
+    def test_query_count_does_not_grow_with_rows(self):
+        problems, counts = check_query_counts()
+        self.assertIn('members:payment_due', counts)
+        self.assertIn('members:chart_data revenue', counts)
+        self.assertFalse(problems, '\n\n' + '\n\n'.join(problems))
+
+    def test_report_points_at_template_line(self):
+        sector = Sector.objects.create(name="KARATE")
+        template = Template("{% for m in members %}\n{{ m.sector.name }}{% endfor %}")
+
+        def render(n):
+            for i in range(n):
+                make_member(f"n{n}_{i}", sector=sector)
+            log = QueryLog()
+            with connection.execute_wrapper(log):
+                template.render(Context({'members': Member.objects.filter(username__startswith=f"n{n}_")}))
+            return log
+
+        report = format_growth('prova', render(2), render(5))
+        self.assertIn('prova: 3 -> 6 query', report)
+        self.assertIn('"members_sector"', report)
+        self.assertIn('<unknown source>:2', report)
+
+
+class DocumentDownloadTests(TempMediaMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.member = make_member("titolare")
+        self.document = MemberDocument.objects.create(
+            member=self.member, file=SimpleUploadedFile("referto.pdf", b"%PDF-0123456789"),
+        )
+        self.url = reverse('members:download_member_document', args=[self.document.pk])
+        self.client.force_login(self.member)
+
+    def test_permissions(self):
+        response = self.client.get(self.url)
+        self.assertEqual(b''.join(response.streaming_content), b"%PDF-0123456789")
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+        self.client.force_login(make_member("genitore"))
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.member.guardian = Member.objects.get(username="genitore")
+        self.member.save()
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+        self.client.force_login(make_member("segreteria", role=Member.Role.STAFF))
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.client.logout()
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+
+    def test_type_from_content_not_from_name(self):
+        disguised = MemberDocument.objects.create(
+            member=self.member, file=SimpleUploadedFile("x.html", b"%PDF-<script>alert(1)</script>"),
+        )
+        self.assertTrue(disguised.file.name.endswith('.pdf'))
+        response = self.client.get(reverse('members:download_member_document', args=[disguised.pk]))
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(response['X-Content-Type-Options'], 'nosniff')
+        self.assertEqual(response['Content-Disposition'], 'inline; filename="x.pdf"')
+
+        unknown = MemberDocument.objects.create(
+            member=self.member, file=SimpleUploadedFile("y.svg", b"<svg onload=alert(1)>"),
+        )
+        self.assertFalse(unknown.file.name.endswith('.svg'))
+        response = self.client.get(reverse('members:download_member_document', args=[unknown.pk]))
+        self.assertEqual(response['Content-Type'], 'application/octet-stream')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="y.svg"')
+
+    def test_range_requests(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=5-8')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 5-8/15')
+        self.assertEqual(b''.join(response.streaming_content), b"0123")
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-3')
+        self.assertEqual(b''.join(response.streaming_content), b"789")
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=50-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */15')
+
+        # file cambiato rispetto all'If-Range: si invia tutto
+        response = self.client.get(self.url, HTTP_RANGE='bytes=5-8', HTTP_IF_RANGE='"vecchio"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_conditional_request(self):
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    @override_settings(SGS_SENDFILE='nginx', SGS_SENDFILE_URL='/protected/')
+    def test_delegated_to_web_server(self):
+        response = self.client.get(self.url, {'download': 1})
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected/{self.document.file.name}')
+        self.assertEqual(response.content, b'')
+        self.assertTrue(response['Content-Disposition'].startswith('attachment'))
+
+
+class DocumentStoreTests(TempMediaMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.member = make_member("titolare")
+
+    def upload(self, name, content):
+        return MemberDocument.objects.create(member=self.member, file=SimpleUploadedFile(name, content))
+
+    def gc(self, *args):
+        out = StringIO()
+        call_command('gc_documents', *args, stdout=out, stderr=StringIO())
+        return out.getvalue()
+
+    def test_identical_uploads_stored_once(self):
+        first = self.upload("certificato 2024.PDF", b"%PDF-scansione")
+        second = self.upload("certificato 2025.pdf", b"%PDF-scansione")
+        other = self.upload("contratto.pdf", b"%PDF-altro")
+        self.assertEqual(first.file.name, second.file.name)
+        self.assertEqual(first.checksum, hashlib.sha256(b"%PDF-scansione").hexdigest())
+        self.assertEqual(first.file.name, f'documents/sha256/{first.checksum[:2]}/{first.checksum}.pdf')
+        self.assertEqual((second.filename, second.size), ("certificato 2025.pdf", 14))
+        self.assertNotEqual(other.file.name, first.file.name)
+
+        # dal download l'ETag e' il checksum
+        self.client.force_login(self.member)
+        response = self.client.get(reverse('members:download_member_document', args=[second.pk]))
+        self.assertEqual(response['ETag'], f'"{second.checksum}"')
+        self.assertIn("certificato 2025.pdf", response['Content-Disposition'])
+
+    def test_gc_removes_only_unreferenced_files(self):
+        first = self.upload("a.pdf", b"scansione")
+        second = self.upload("b.pdf", b"scansione")
+        other = self.upload("c.pdf", b"altro")
+        path, other_path = first.file.path, other.file.path
+        first.delete()
+        other.delete()
+
+        self.assertIn("Eliminati: 0 file", self.gc())  # periodo di grazia
+        self.assertIn("Da eliminare: 1 file", self.gc('--grace-hours=0', '--dry-run'))
+        self.assertTrue(os.path.exists(other_path))
+        self.gc('--grace-hours=0')
+        self.assertFalse(os.path.exists(other_path))
+        self.assertTrue(os.path.exists(path))  # ancora usato da `second`
+        second.delete()
+        self.gc('--grace-hours=0')
+        self.assertFalse(os.path.exists(path))
+
+    def test_verify_and_adopt_legacy(self):
+        document = self.upload("a.pdf", b"scansione")
+        self.assertIn("Checksum verificati", self.gc('--verify'))
+        with open(document.file.path, 'wb') as fh:
+            fh.write(b"alterato")
+        with self.assertRaises(CommandError):
+            self.gc('--verify')
+
+        legacy_dir = os.path.join(self.media, 'documents', f'member_{self.member.pk}')
+        os.makedirs(legacy_dir)
+        with open(os.path.join(legacy_dir, 'vecchio.pdf'), 'wb') as fh:
+            fh.write(b"vecchio upload")
+        legacy = MemberDocument.objects.create(
+            member=self.member, file=f'documents/member_{self.member.pk}/vecchio.pdf',
+        )
+        self.assertEqual(legacy.checksum, '')
+        self.gc('--adopt-legacy', '--grace-hours=0')
+        legacy.refresh_from_db()
+        self.assertEqual(legacy.checksum, hashlib.sha256(b"vecchio upload").hexdigest())
+        self.assertEqual(legacy.filename, 'vecchio.pdf')
+        self.assertFalse(os.path.exists(os.path.join(legacy_dir, 'vecchio.pdf')))
+
+
+class ChunkedUploadTests(TempMediaMixin, TestCase):
+
+    PDF = b"%PDF-1.7\n" + b"x" * 100
+
+    def setUp(self):
+        super().setUp()
+        self.member = make_member("titolare")
+        self.client.force_login(make_member("segreteria", role=Member.Role.STAFF))
+
+    def start(self, size, filename="scansione.pdf"):
+        response = self.client.post(reverse('members:upload_start'), {
+            'member': self.member.pk, 'document_type': 'MEDICAL_CERTIFICATE',
+            'filename': filename, 'size': size, 'expiration_date': '2030-01-01',
+        })
+        return response
+
+    def send(self, url, offset, data, **headers):
+        return self.client.patch(
+            url, data, content_type='application/offset+octet-stream',
+            headers={'Upload-Offset': str(offset), **headers},
+        )
+
+    def test_resumable_upload_creates_document(self):
+        response = self.start(len(self.PDF))
+        self.assertEqual(response.status_code, 201)
+        url = response.json()['url']
+
+        self.assertEqual(self.send(url, 0, self.PDF[:8]).json()['offset'], 8)
+        # offset sbagliato (es. blocco rinviato): si riparte da quello del server
+        response = self.send(url, 0, self.PDF[:40])
+        self.assertEqual((response.status_code, response.json()['offset']), (409, 8))
+        self.assertEqual(self.client.get(url)['Upload-Offset'], '8')
+
+        response = self.send(url, 8, self.PDF[8:60])
+        self.assertEqual(response.json()['content_type'], 'application/pdf')
+        response = self.send(url, 60, self.PDF[60:])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['redirect'], reverse('members:edit_member', args=[self.member.pk]))
+
+        document = MemberDocument.objects.get(member=self.member)
+        self.assertEqual(document.checksum, hashlib.sha256(self.PDF).hexdigest())
+        self.assertEqual((document.filename, document.size), ("scansione.pdf", len(self.PDF)))
+        with document.file.open('rb') as fh:
+            self.assertEqual(fh.read(), self.PDF)
+        self.assertEqual(self.send(url, len(self.PDF), b"x").status_code, 409)
+
+    def test_chunk_checksum_and_declared_size(self):
+        url = self.start(len(self.PDF)).json()['url']
+        wrong = base64.b64encode(hashlib.sha256(b"altro").digest()).decode()
+        response = self.send(url, 0, self.PDF[:50], **{'Upload-Checksum': f'sha256 {wrong}'})
+        self.assertEqual((response.status_code, response.json()['offset']), (400, 0))
+        right = base64.b64encode(hashlib.sha256(self.PDF[:50]).digest()).decode()
+        response = self.send(url, 0, self.PDF[:50], **{'Upload-Checksum': f'sha256 {right}'})
+        self.assertEqual(response.json()['offset'], 50)
+        self.assertEqual(self.send(url, 50, self.PDF[50:] + b"troppo").status_code, 413)
+
+    def test_type_from_magic_bytes_and_limits(self):
+        url = self.start(100, filename="foto.pdf").json()['url']
+        response = self.send(url, 0, b"MZ\x90\x00" + b"\x00" * 96)
+        self.assertEqual(response.status_code, 415)
+        self.assertFalse(DocumentUpload.objects.exists())
+
+        with override_settings(SGS_UPLOAD_LIMITS={'image/png': 50}):
+            url = self.start(60, filename="foto.png").json()['url']
+            self.assertEqual(self.send(url, 0, b"\x89PNG\r\n\x1a\n" + b"\x00" * 52).status_code, 413)
+        self.assertEqual(self.start(10 ** 12).status_code, 400)
+
+    def test_plain_form_checks_magic_bytes(self):
+        url = reverse('members:add_member_document', args=[self.member.pk])
+        response = self.client.post(url, {
+            'document_type': 'OTHER', 'file': SimpleUploadedFile("finto.pdf", b"<html>"),
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Tipo di file non ammesso", response.content.decode())
+        response = self.client.post(url, {
+            'document_type': 'OTHER', 'file': SimpleUploadedFile("vero.pdf", self.PDF),
+        })
+        self.assertEqual(response.status_code, 302)
+
+    def test_abandoned_uploads_expire(self):
+        url = self.start(len(self.PDF)).json()['url']
+        self.send(url, 0, self.PDF[:20])
+        call_command('gc_documents', '--grace-hours=0', stdout=StringIO())
+        self.assertFalse(DocumentUpload.objects.exists())
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class MemberPhotoTests(TempMediaMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.office = make_member("segreteria", role=Member.Role.STAFF)
+        self.client.force_login(self.office)
+
+    def photo(self, color='red', size=(1200, 900)):
+        buffer = BytesIO()
+        Image.new('RGB', size, color).save(buffer, 'JPEG')
+        return SimpleUploadedFile("foto.jpg", buffer.getvalue(), content_type='image/jpeg')
+
+    def add_photo(self, member, **kwargs):
+        member.photo = self.photo(**kwargs)
+        with self.captureOnCommitCallbacks(execute=True):
+            member.save()
+        run_pending(worker='test')
+        member.refresh_from_db()
+
+    def test_variants_built_off_request_and_shared(self):
+        member = make_member("mario")
+        member.photo = self.photo()
+        with self.captureOnCommitCallbacks(execute=True):
+            member.save()
+        member.refresh_from_db()
+        self.assertEqual(member.photo_checksum, '')  # non ancora: ci pensa il worker
+        self.assertIn('hbs-avatar">MT<', Template("{% load member_images %}{% member_avatar m %}").render(Context({'m': member})))
+
+        run_pending(worker='test')
+        member.refresh_from_db()
+        self.assertEqual(len(member.photo_checksum), 64)
+        with default_storage.open(variant_name(member.photo_checksum, 96, 'webp')) as fh, Image.open(fh) as thumb:
+            self.assertEqual((thumb.format, thumb.size), ('WEBP', (96, 96)))
+
+        twin = make_member("gemello")
+        self.add_photo(twin)
+        self.assertEqual(twin.photo_checksum, member.photo_checksum)
+        self.assertNotEqual(twin.photo.name, member.photo.name)
+
+        # foto cambiata: miniature vecchie non piu' usate
+        self.add_photo(member, color='blue')
+        self.assertNotEqual(member.photo_checksum, twin.photo_checksum)
+        twin.photo = None
+        twin.save()
+        self.assertEqual(prune_variants(), 1)
+
+    def test_avatar_tag_and_thumbnail_download(self):
+        member = make_member("mario")
+        self.add_photo(member)
+        html = Template("{% load member_images %}{% member_avatar m 48 %}").render(Context({'m': member}))
+        self.assertIn('<source type="image/webp"', html)
+        self.assertIn('192w', html)
+        self.assertIn('width="48"', html)
+
+        url = reverse('members:member_photo', args=[member.pk])
+        response = self.client.get(url, {'size': 48, 'format': 'webp', 'v': member.photo_checksum[:12]})
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertIn('immutable', response['Cache-Control'])
+        thumb = b''.join(response.streaming_content)
+        self.assertLess(len(thumb), 2000)
+        self.assertEqual(self.client.get(url, {'size': 50}).status_code, 404)
+
+        response = self.client.get(reverse('dashboard'))
+        self.assertContains(response, f'{url}?size=96&amp;format=webp')
+        self.client.force_login(make_member("estraneo"))
+        self.assertEqual(self.client.get(url, {'size': 48}).status_code, 403)
+
+    def test_command_processes_missing_variants(self):
+        member = make_member("mario", photo=self.photo())
+        Member.objects.filter(pk=member.pk).update(photo_checksum='')
+        out = StringIO()
+        call_command('build_photo_variants', stdout=out)
+        self.assertIn("Foto elaborate: 1", out.getvalue())
+        member.refresh_from_db()
+        self.assertTrue(default_storage.exists(variant_name(member.photo_checksum, 192, 'jpeg')))
+
+
+class DocumentCompressionTests(TempMediaMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.member = make_member("titolare")
+
+    def scan(self, size=(3000, 2000)):
+        # rumore a qualita' 100: come una scansione a colori ad alta risoluzione
+        buffer = BytesIO()
+        Image.effect_noise(size, 40).convert('RGB').save(buffer, 'JPEG', quality=100)
+        return buffer.getvalue()
+
+    def upload(self, name, content):
+        with self.captureOnCommitCallbacks(execute=True):
+            document = MemberDocument.objects.create(member=self.member, file=SimpleUploadedFile(name, content))
+        run_pending(worker='test')
+        document.refresh_from_db()
+        return document
+
+    def test_image_recompressed_off_request(self):
+        content = self.scan()
+        document = self.upload("carta identita.jpg", content)
+        self.assertIsNotNone(document.compressed_at)
+        self.assertEqual(document.original_size, len(content))
+        self.assertLess(document.size, len(content) * 0.9)
+        self.assertEqual(document.saved_bytes, len(content) - document.size)
+        self.assertEqual(document.filename, "carta identita.jpg")
+        with document.file.open('rb') as fh, Image.open(fh) as image:
+            self.assertEqual(document.checksum, checksum_of(fh))
+            self.assertEqual((image.format, max(image.size)), ('JPEG', MAX_IMAGE_SIDE))
+
+        # senza SGS_DOCUMENT_KEEP_ORIGINALS l'originale e' orfano
+        call_command('gc_documents', '--grace-hours=0', stdout=StringIO())
+        self.assertEqual(len(list(stored_files())), 1)
+
+        # file che non si sa comprimere: elaborato, dimensione invariata
+        other = self.upload("note.pdf", b"non un pdf")
+        self.assertEqual((other.original_size, other.size, other.saved_bytes), (10, 10, 0))
+        self.assertIsNotNone(other.compressed_at)
+
+    @override_settings(SGS_DOCUMENT_KEEP_ORIGINALS=True)
+    def test_original_kept_on_request(self):
+        content = self.scan((2800, 1800))
+        document = self.upload("certificato.jpg", content)
+        checksum = hashlib.sha256(content).hexdigest()
+        self.assertEqual(document.original_file.name, f'documents/sha256/{checksum[:2]}/{checksum}.jpg')
+        call_command('gc_documents', '--grace-hours=0', stdout=StringIO())
+        self.assertTrue(document.original_file.storage.exists(document.original_file.name))
+
+        out = StringIO()
+        call_command('document_storage_report', '--top=1', stdout=out)
+        self.assertIn("Totale", out.getvalue())
+        self.assertIn("Originali conservati: 1", out.getvalue())
+        self.assertIn("certificato.jpg", out.getvalue())
+
+    def test_missing_pypdf_is_reported(self):
+        self.addCleanup(sys.modules.__setitem__, 'pypdf', sys.modules.get('pypdf'))
+        sys.modules['pypdf'] = None  # import pypdf -> ImportError
+        with self.assertLogs('members.compression', 'WARNING') as logs:
+            document = self.upload("referto.pdf", b"%PDF-1.4 scansione")
+        self.assertEqual(document.size, document.original_size)
+        self.assertIn("pypdf", logs.output[0])
+        out = StringIO()
+        call_command('document_storage_report', stdout=out)
+        self.assertIn("'pypdf' non installato", out.getvalue())
+
+    @skipUnless(pdf_available(), "pypdf non installato")
+    def test_scanned_pdf_downsampled(self):
+        from pypdf import PdfReader
+
+        buffer = BytesIO()
+        # 2400 px su una pagina di 4 pollici: 600 dpi
+        Image.effect_noise((2400, 2400), 40).convert('RGB').save(buffer, 'PDF', resolution=600, quality=95)
+        document = self.upload("certificato.pdf", buffer.getvalue())
+        self.assertLess(document.size, document.original_size * 0.5)
+        with document.file.open('rb') as fh:
+            image = PdfReader(fh).pages[0].images[0].image
+        self.assertEqual(image.size, (600, 600))
+
+    def test_pending_documents_compressed_by_command(self):
+        content = self.scan((2600, 1000))
+        document = MemberDocument.objects.create(member=self.member, file=SimpleUploadedFile("a.jpg", content))
+        self.assertIsNone(document.compressed_at)
+        out = StringIO()
+        call_command('gc_documents', '--compress', stdout=out)
+        self.assertIn("Documenti compressi: 1", out.getvalue())
+        document.refresh_from_db()
+        self.assertLess(document.size, len(content))
+
+
+class MemberArchiveTests(TempMediaMixin, TestCase):
+
+    temp_dirs = ('MEDIA_ROOT', 'SGS_ARCHIVE_ROOT')
+
+    def setUp(self):
+        super().setUp()
+        self.today = timezone.now().date()
+        self.long_ago = self.today - timedelta(days=6 * 366)
+
+    def photo(self):
+        buffer = BytesIO()
+        Image.new('RGB', (40, 40), 'red').save(buffer, 'JPEG')
+        return SimpleUploadedFile("foto.jpg", buffer.getvalue())
+
+    def archive(self, *args):
+        out = StringIO()
+        call_command('archive_members', *args, stdout=out)
+        return out.getvalue()
+
+    def test_archive_and_restore(self):
+        old = make_member("vecchio", is_dismissed=True, dismissed_on=self.long_ago, photo=self.photo())
+        sub = Subscription.objects.create(
+            member=old, subscription_type=Subscription.SubscriptionType.MONTHLY,
+            start_date=self.long_ago - timedelta(days=60),
+        )
+        payment = Payment.objects.create(
+            member=old, subscription=sub, payment_type="MONTHLY", amount=Decimal("50"),
+            payment_date=self.long_ago - timedelta(days=60),
+        )
+        document = MemberDocument.objects.create(member=old, file=SimpleUploadedFile("cert.pdf", b"%PDF-1.4 cert"))
+        make_member("recente", is_dismissed=True)
+        parent = make_member("genitore", is_dismissed=True, dismissed_on=self.long_ago)
+        make_member("figlio", guardian=parent)
+        stats = list(DailyStats.objects.order_by('day').values_list('day', 'revenue', 'new_subscriptions'))
+        photo = old.photo.name
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertIn("Archiviati: 1 soci", self.archive())
+        self.assertFalse(Member.objects.filter(pk=old.pk).exists())
+        self.assertFalse(Payment.objects.filter(pk=payment.pk).exists())
+        self.assertFalse(MemberDocument.objects.filter(pk=document.pk).exists())
+        self.assertFalse(default_storage.exists(photo))
+        self.assertEqual(
+            list(DailyStats.objects.order_by('day').values_list('day', 'revenue', 'new_subscriptions')), stats,
+        )  # la storia dei grafici non cambia
+        archived = ArchivedMember.objects.get(member_id=old.pk)
+        self.assertEqual(archived.tarball, f'{self.long_ago.year}.tar.gz')
+        with tarfile.open(archive_root() / archived.tarball) as tar:
+            self.assertEqual(set(tar.getnames()), {document.file.name, photo})
+
+        # il file del documento, orfano, se ne va con gc_documents
+        call_command('gc_documents', '--grace-hours=0', stdout=StringIO())
+        self.assertFalse(document.file.storage.exists(document.file.name))
+
+        self.assertIn("Ripristinati: 1", self.archive('--restore', str(old.pk)))
+        restored = MemberDocument.objects.get(pk=document.pk)
+        self.assertEqual(restored.checksum, document.checksum)
+        with restored.file.open('rb') as fh:
+            self.assertEqual(fh.read(), b"%PDF-1.4 cert")
+        self.assertEqual(Payment.objects.get(pk=payment.pk).subscription_id, sub.pk)
+        self.assertTrue(default_storage.exists(photo))
+        self.assertTrue(MemberStatus.objects.filter(member_id=old.pk, has_subscriptions=True).exists())
+        self.assertFalse(ArchivedMember.objects.exists())
+        with self.assertRaises(CommandError):
+            self.archive('--restore', str(old.pk))
+
+    def test_expired_documents_of_active_members(self):
+        member = make_member("attivo")
+        old = MemberDocument.objects.create(
+            member=member, document_type=MemberDocument.DocumentType.MEDICAL_CERTIFICATE,
+            file=SimpleUploadedFile("2018.pdf", b"%PDF-2018"), expiration_date=self.long_ago,
+        )
+        current = MemberDocument.objects.create(
+            member=member, document_type=MemberDocument.DocumentType.MEDICAL_CERTIFICATE,
+            file=SimpleUploadedFile("2026.pdf", b"%PDF-2026"), expiration_date=self.today,
+        )
+        # scaduto ma unico del suo tipo: resta
+        only_id = MemberDocument.objects.create(
+            member=member, document_type=MemberDocument.DocumentType.IDENTITY_CARD,
+            file=SimpleUploadedFile("ci.pdf", b"%PDF-ci"), expiration_date=self.long_ago,
+        )
+        # socio dimesso nello stesso anno: un solo tarball, riscritto con i file di entrambi
+        dismissed = make_member("vecchio", is_dismissed=True, dismissed_on=self.long_ago.replace(month=1, day=1))
+        MemberDocument.objects.create(member=dismissed, file=SimpleUploadedFile("v.pdf", b"%PDF-vecchio"))
+        self.archive()
+        self.assertIn("Archiviati: 0 documenti", self.archive())
+
+        self.assertEqual(set(MemberDocument.objects.values_list('pk', flat=True)), {current.pk, only_id.pk})
+        archived = ArchivedDocument.objects.get(document_id=old.pk)
+        self.assertEqual(archived.tarball, f'{self.long_ago.year}.tar.gz')
+        self.assertEqual(list(archive_root().glob('*.tar.gz')), [archive_root() / archived.tarball])
+        with tarfile.open(archive_root() / archived.tarball) as tar:
+            self.assertEqual(len(tar.getnames()), 2)
+            self.assertIn(old.file.name, tar.getnames())
+
+        call_command('gc_documents', '--grace-hours=0', stdout=StringIO())
+        self.assertIn("Ripristinati: 1 documenti", self.archive('--restore-document', str(old.pk)))
+        restored = MemberDocument.objects.get(pk=old.pk)
+        with restored.file.open('rb') as fh:
+            self.assertEqual(fh.read(), b"%PDF-2018")
+        self.assertEqual(MemberStatus.objects.get(member=member).certificate_expiry, self.today)
+
+    def test_leftover_archive_row_is_overwritten(self):
+        old = make_member("vecchio", is_dismissed=True, dismissed_on=self.long_ago)
+        # riga rimasta da un giro precedente il cui commit principale e' caduto
+        ArchivedMember.objects.create(member_id=old.pk, username="vecchio", data={}, files=[])
+        self.assertIn("Archiviati: 1 soci", self.archive())
+        archived = ArchivedMember.objects.get(member_id=old.pk)
+        self.assertEqual(archived.data['rows'][0]['pk'], old.pk)
+        self.assertFalse(Member.objects.filter(pk=old.pk).exists())
+
+    def test_dismissal_date_and_imported_members(self):
+        member = make_member("mario", is_dismissed=True)
+        self.assertEqual(member.dismissed_on, self.today)
+        member.is_dismissed = False
+        member.save()
+        self.assertIsNone(member.dismissed_on)
+
+        # importato gia' dimesso, senza data: fa fede l'ultima attivita'
+        imported = make_member("importato", registration_date=self.long_ago)
+        Member.objects.filter(pk=imported.pk).update(is_dismissed=True)
+        self.assertIn("Da archiviare: 1 soci", self.archive('--dry-run'))
+        self.assertIn("Da archiviare: 0 soci", self.archive('--dry-run', '--years=10'))
+        self.assertTrue(Member.objects.filter(pk=imported.pk).exists())
+
+    def test_router_keeps_archive_apart(self):
+        router = ArchiveRouter()
+        self.assertTrue(router.allow_migrate('archive', 'members', 'archivedmember'))
+        self.assertFalse(router.allow_migrate('archive', 'members', 'member'))
+        self.assertIsNone(router.allow_migrate('default', 'members', 'member'))
+        self.assertEqual(router.db_for_read(ArchivedMember), 'default')  # senza SGS_ARCHIVE_DB
 
-# Create your tests here.
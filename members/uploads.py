@@ -0,0 +1,203 @@
+# members/uploads.py
+# Caricamento a blocchi (riprendibile) dei documenti dei soci.
+#
+#   POST   /members/uploads/              metadati + dimensione -> id
+#   PATCH  /members/uploads/<id>/         un blocco: header Upload-Offset,
+#                                         facoltativo Upload-Checksum
+#                                         ("sha256 <base64>" del blocco)
+#   GET    /members/uploads/<id>/         byte ricevuti (per riprendere)
+#   DELETE /members/uploads/<id>/         annulla
+#
+# Il corpo della richiesta si legge a pezzi da 64 KB e si accoda al file
+# parziale su disco: nessun file intero in memoria, neanche da 40 MB.
+# Mentre scrive calcola lo SHA-256 del blocco, controlla di non superare
+# la dimensione dichiarata e, appena arrivati i primi byte, riconosce il
+# tipo dai "magic bytes" (non dall'estensione o dal Content-Type del
+# client) e applica il limite di dimensione di quel tipo. Completato il
+# file, lo si sposta nell'archivio per checksum (members/storage.py) e si
+# crea il MemberDocument.
+# Gli stessi controlli di tipo e dimensione valgono per i form classici
+# (validate_document_file).
+
+import base64
+import hashlib
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import locks
+from django.core.files.uploadedfile import UploadedFile
+from django.db import transaction
+from django.template.defaultfilters import filesizeformat
+from django.utils import timezone
+
+from .filetypes import SNIFF_BYTES, sniff
+from .models import DocumentUpload, MemberDocument
+from .storage import checksum_from_name, document_storage
+
+MB = 1024 * 1024
+BLOCK_SIZE = 64 * 1024
+
+# Limiti per tipo rilevato; SGS_UPLOAD_LIMITS li sovrascrive ({tipo: byte})
+DEFAULT_LIMITS = {
+    'application/pdf': 50 * MB,
+    'image/tiff': 50 * MB,
+    'image/jpeg': 25 * MB,
+    'image/png': 25 * MB,
+    'image/webp': 25 * MB,
+    'image/heic': 25 * MB,
+}
+
+
+class UploadRejected(Exception):
+    """
+    Caricamento rifiutato: `status` e' il codice HTTP da restituire;
+    `fatal` se il caricamento non puo' proseguire (tipo non ammesso...).
+    """
+
+    def __init__(self, message, status=400, fatal=False):
+        super().__init__(message)
+        self.status = status
+        self.fatal = fatal
+
+
+# ---------------------------------------------------------------------------
+#  TIPO E DIMENSIONE
+# ---------------------------------------------------------------------------
+def size_limits():
+    return {**DEFAULT_LIMITS, **getattr(settings, 'SGS_UPLOAD_LIMITS', {})}
+
+
+def max_size():
+    return max(size_limits().values())
+
+
+def check_type(head, size):
+    """Tipo rilevato da `head`; UploadRejected se non ammesso o oltre il limite del tipo."""
+    content_type = sniff(head)
+    if not content_type:
+        raise UploadRejected("Tipo di file non ammesso: sono accettati PDF e immagini.", 415, fatal=True)
+    limit = size_limits()[content_type]
+    if size > limit:
+        raise UploadRejected(
+            f"File troppo grande: per {content_type} il massimo e' {filesizeformat(limit)}.", 413, fatal=True,
+        )
+    return content_type
+
+
+def validate_document_file(file):
+    """Per i form con upload classico: stessi controlli, come ValidationError."""
+    if isinstance(file, UploadedFile):
+        file.seek(0)
+        head = file.read(SNIFF_BYTES)
+        file.seek(0)
+        try:
+            check_type(head, file.size)
+        except UploadRejected as e:
+            raise ValidationError(str(e))
+    return file
+
+
+# ---------------------------------------------------------------------------
+#  BLOCCHI
+# ---------------------------------------------------------------------------
+def _expected_digest(header):
+    """Upload-Checksum "sha256 <base64>" -> digest binario (None se assente)."""
+    if not header:
+        return None
+    algorithm, _, value = header.partition(' ')
+    if algorithm.lower() != 'sha256':
+        raise UploadRejected("Upload-Checksum: e' supportato solo sha256.")
+    try:
+        return base64.b64decode(value.strip(), validate=True)
+    except ValueError:
+        raise UploadRejected("Upload-Checksum non valido.")
+
+
+def append_chunk(upload, stream, offset, checksum=None):
+    """
+    Accoda al file parziale di `upload` i byte letti da `stream` (la
+    richiesta) a partire da `offset`, che deve coincidere con i byte gia'
+    ricevuti. Se il client si disconnette si tiene quanto arrivato (si
+    riprende da li'); un blocco rifiutato viene scartato per intero.
+    Restituisce i byte scritti.
+    """
+    if upload.is_complete:
+        raise UploadRejected("Caricamento gia' completato.", 409)
+    if offset != upload.received:
+        raise UploadRejected(f"Offset atteso {upload.received}, ricevuto {offset}.", 409)
+    expected = _expected_digest(checksum)
+    path = document_storage.path(upload.part_name)
+    if upload.received and not os.path.exists(path):
+        raise UploadRejected("Caricamento scaduto: ricominciare.", 410, fatal=True)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    digest, written = hashlib.sha256(), 0
+    with open(path, 'r+b' if os.path.exists(path) else 'w+b') as fh:
+        if not locks.lock(fh, locks.LOCK_EX | locks.LOCK_NB):
+            raise UploadRejected("Un altro blocco e' in corso di invio.", 409)
+        fh.seek(offset)
+        fh.truncate()
+        try:
+            while True:
+                try:
+                    block = stream.read(BLOCK_SIZE)
+                except OSError:
+                    break  # client disconnesso: si riprende da quanto scritto
+                if not block:
+                    break
+                if offset + written + len(block) > upload.size:
+                    raise UploadRejected("Il blocco supera la dimensione dichiarata.", 413)
+                digest.update(block)
+                fh.write(block)
+                written += len(block)
+                if not upload.content_type and offset + written >= min(SNIFF_BYTES, upload.size):
+                    fh.flush()
+                    fh.seek(0)
+                    upload.content_type = check_type(fh.read(SNIFF_BYTES), upload.size)
+                    fh.seek(offset + written)
+            if expected is not None and digest.digest() != expected:
+                raise UploadRejected("Checksum del blocco non corrispondente: rinviarlo.", 400)
+        except UploadRejected:
+            fh.seek(offset)
+            fh.truncate()
+            raise
+        finally:
+            locks.unlock(fh)
+    upload.received = offset + written
+    upload.save(update_fields=['received', 'content_type', 'updated_at'])
+    return written
+
+
+def finish(upload):
+    """File completo: nell'archivio per checksum e come MemberDocument."""
+    name = document_storage.adopt(document_storage.path(upload.part_name), upload.filename)
+    with transaction.atomic():
+        upload.document = MemberDocument.objects.create(
+            member_id=upload.member_id, document_type=upload.document_type,
+            file=name, checksum=checksum_from_name(name), size=upload.size,
+            original_name=upload.filename, expiration_date=upload.expiration_date,
+            description=upload.description,
+        )
+        upload.save(update_fields=['document', 'updated_at'])
+    return upload.document
+
+
+def discard(upload):
+    """Annulla un caricamento: file parziale e riga."""
+    path = document_storage.path(upload.part_name)
+    if os.path.exists(path):
+        os.unlink(path)
+    upload.delete()
+
+
+def expire_uploads(grace_seconds=24 * 3600, dry_run=False):
+    """Caricamenti fermi da piu' di `grace_seconds` (completati o no). Restituisce quanti."""
+    stale = DocumentUpload.objects.filter(updated_at__lt=timezone.now() - timedelta(seconds=grace_seconds))
+    count = 0
+    for upload in stale.iterator():
+        if not dry_run:
+            discard(upload)
+        count += 1
+    return count
@@ -2,8 +2,10 @@
 from django.urls import path
 from . import views
 from . import views_config
+from . import views_exports
 from . import views_payments
 from . import views_subscriptions
+from . import views_uploads
 
 
 app_name = "members"
@@ -17,6 +19,11 @@ urlpatterns = [
 
     path("document/<int:document_id>/edit/", views.edit_member_document, name="edit_member_document"),
     path("document/<int:document_id>/delete/", views.delete_member_document, name="delete_member_document"),
+    path("document/<int:document_id>/download/", views.download_member_document, name="download_member_document"),
+    path("photo/<int:member_id>/", views.member_photo, name="member_photo"),
+    # caricamento a blocchi (riprendibile) dei documenti
+    path("uploads/", views_uploads.upload_start, name="upload_start"),
+    path("uploads/<uuid:upload_id>/", views_uploads.upload_chunk, name="upload_chunk"),
     path("password/change/", views.change_own_password, name="change_own_password"),
     path("profile/", views.profile, name="profile"),
 
@@ -35,6 +42,9 @@ urlpatterns = [
     path('subscriptions/new/',
          views_subscriptions.add_subscription_with_payment_admin,
          name='add_subscription_with_payment_admin'),
+    path('subscriptions/renewals/',
+         views_subscriptions.subscription_renewals,
+         name='subscription_renewals'),
     path('subscription/<int:pk>/edit/',
          views_subscriptions.subscription_edit,
          name='subscription_edit'),
@@ -62,6 +72,12 @@ urlpatterns = [
     path('payments/', views_payments.payment_all, name='payment_all'),
     path('payments-due/', views_payments.payment_due, name='payment_due'),
 
+# Serie per i grafici (JSON, con ETag)
+    path('charts/<slug:series>/', views.chart_data, name='chart_data'),
+
+# Esportazioni (CSV / XLSX)
+    path('export/<slug:dataset>/', views_exports.export_dataset, name='export_dataset'),
+
 # Listino pacchetti
     path('config/pacchetti/', views_config.package_list, name='package_list'),
     path('config/pacchetti/nuovo/', views_config.package_add, name='package_add'),
@@ -7,17 +7,23 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages as django_messages
 from django.core.exceptions import PermissionDenied
+from django.core.files.storage import default_storage
 from django.core.paginator import Paginator
-from django.db.models import Q, Max, Count
-from django.db.models.functions import TruncDay
 from django.forms import modelformset_factory
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse
 from django.utils import timezone
-from django.utils.dateparse import parse_date
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 from django.contrib.auth import update_session_auth_hash
 from django.contrib.auth.forms import PasswordChangeForm
 
+from .downloads import serve_file
+from .exports import xlsx_available
+from .images import FORMATS, THUMB_SIZES, variant_name
+from .charts import SERIES, chart_series, parse_range, series_etag, series_last_modified
 from .models import Member, MemberDocument, Subscription
+from .pagination import keyset_paginate
+from .stats import dashboard_counters
 from .forms import (
     MemberCreationForm, MemberChangeForm, MemberDocumentForm,
     MemberDocumentFormSet, SubscriptionForm, AdminMemberDocumentForm,
@@ -58,119 +64,27 @@ def dashboard(request):
     if _is_office(user):
         search_query = request.GET.get('q', '')
 
-        members_qs = Member.objects.all()
+        members_qs = Member.objects.select_related('sector').order_by('last_name', 'first_name')
         if search_query:
-            members_qs = members_qs.filter(
-                Q(first_name__icontains=search_query) |
-                Q(last_name__icontains=search_query) |
-                Q(email__icontains=search_query)
-            )
+            members_qs = members_qs.search_ranked(search_query)
 
-        paginator = Paginator(members_qs.order_by('last_name', 'first_name'), 10)
+        paginator = Paginator(members_qs, 10)
         page_number = request.GET.get('page')
         members = paginator.get_page(page_number)
 
-        total_members = Member.objects.count()
-        active_members = Member.objects.filter(is_active=True).count()
-        total_documents = MemberDocument.objects.count()
-
-        today = timezone.now().date()
-        expired_certificates = 0
-        active_certificates = 0
-
-        expired_certificates = 0
-        active_certificates = 0
-        suspended_certificates = 0
-
-        for member in Member.objects.prefetch_related('documents', 'subscriptions'):
-            latest_cert = (
-                member.documents
-                .filter(document_type='MEDICAL_CERTIFICATE')
-                .order_by('-expiration_date')
-                .first()
-            )
-            if latest_cert:
-                if latest_cert.expiration_date and latest_cert.expiration_date < today:
-                    expired_certificates += 1
-                else:
-                    active_certificates += 1
-            else:
-                # Nessun certificato caricato: "sospeso" SOLO se ha almeno un abbonamento
-                if member.subscriptions.exists():
-                    suspended_certificates += 1
-
-        from collections import defaultdict
-
-        start_date = request.GET.get('start_date')
-        end_date = request.GET.get('end_date')
-
-        SCADENZA_GIORNI = 30  # soglia "in scadenza" (configurabile in futuro)
-        limite = today + timedelta(days=SCADENZA_GIORNI)
-
-        active_subscriptions = 0
-        expired_subscriptions = 0
-        expiring_subscriptions = 0
-
-        for sub in Subscription.objects.all():
-            if sub.start_date and sub.start_date > today:
-                continue  # non ancora attivo
-            if sub.end_date and sub.end_date < today:
-                expired_subscriptions += 1
-            else:
-                active_subscriptions += 1
-                # in scadenza: attivo e fine entro la soglia
-                if sub.end_date and today <= sub.end_date <= limite:
-                    expiring_subscriptions += 1
-
-        total_subscriptions = Subscription.objects.count()
-
-        member_stats = (
-            Member.objects
-            .annotate(day=TruncDay('date_joined'))
-            .values('day')
-            .annotate(count=Count('id'))
-            .order_by('day')
-        )
-        labels = [m['day'].strftime('%d %b %Y') for m in member_stats if m['day']]
-        data = [m['count'] for m in member_stats if m['day']]
-
-        subs = Subscription.objects.all()
-        if start_date:
-            subs = subs.filter(start_date__gte=parse_date(start_date))
-        if end_date:
-            subs = subs.filter(start_date__lte=parse_date(end_date))
-
-        subscription_stats = (
-            subs
-            .annotate(date=TruncDay('start_date'))
-            .values('date')
-            .annotate(count=Count('id'))
-            .order_by('date')
-        )
-        sub_labels = [s['date'].strftime('%d %b %Y') for s in subscription_stats if s['date']]
-        sub_data = [s['count'] for s in subscription_stats if s['date']]
+        counters = dashboard_counters()
 
-        category_stats = (
-            Subscription.objects
-            .values('sector__name')
-            .annotate(count=Count('id'))
-        )
-        cat_labels = [c['sector__name'] or '—' for c in category_stats]
-        cat_data = [c['count'] for c in category_stats]
+        # Serie dei grafici: dalla cache, ricalcolate solo dopo una modifica
+        start, end = parse_range(request.GET)
+        member_series = chart_series('members')
+        sub_series = chart_series('subscriptions', start, end)
+        cat_series = chart_series('subscriptions_by_sector')
+        labels, data = member_series['labels'], member_series['data']
+        sub_labels, sub_data = sub_series['labels'], sub_series['data']
+        cat_labels, cat_data = cat_series['labels'], cat_series['data']
 
         context = {
             'members': members,
-            'total_members': total_members,
-            'active_members': active_members,
-            'total_documents': total_documents,
-            'expired_certificates': expired_certificates,
-            'active_certificates': active_certificates,
-            'total_subscriptions': total_subscriptions,
-            'active_subscriptions': active_subscriptions,
-            'expired_subscriptions': expired_subscriptions,
-            'expiring_subscriptions': expiring_subscriptions,
-            'total_subscriptions': total_subscriptions,
-            'scadenza_giorni': SCADENZA_GIORNI,
             'labels': json.dumps(labels),
             'data': json.dumps(data),
             'sub_labels': sub_labels,
@@ -178,12 +92,17 @@ def dashboard(request):
             'cat_labels': cat_labels,
             'cat_data': cat_data,
             'request': request,
-            'suspended_certificates': suspended_certificates,
         }
+        context.update(counters)
         return render(request, 'dashboard.html', context)
 
     # 🟦 CASO 2: Socio
-    subscriptions = Subscription.objects.filter(member=user).order_by("-start_date")
+    subscriptions = (
+        Subscription.objects.filter(member=user)
+        .select_related('sector')
+        .with_payment_state()
+        .order_by("-start_date")
+    )
     today = date.today()
     return render(request, "user_dashboard.html", {
         "member": user,
@@ -211,18 +130,8 @@ def profile(request):
     else:
         password_form = PasswordChangeForm(user)
 
-    today = timezone.now().date()
     subscriptions = Subscription.objects.filter(member=user).order_by('-start_date')
-
-    subscriptions_list = []
-    for sub in subscriptions:
-        if sub.start_date and sub.start_date > today:
-            status = "Non ancora attivo"
-        elif sub.end_date and sub.end_date < today:
-            status = "Scaduto"
-        else:
-            status = "Attivo"
-        subscriptions_list.append({'subscription': sub, 'status': status})
+    subscriptions_list = [{'subscription': sub, 'status': sub.status} for sub in subscriptions]
 
     context = {
         'user': user,
@@ -346,6 +255,48 @@ def delete_member_document(request, document_id):
     return redirect("members:edit_member", member_id=member_id)
 
 
+# ---------------------------------------------------------------------------
+#  DOWNLOAD DEI FILE (documenti e foto)
+#  Segreteria, il socio stesso o il suo genitore/tutore. Il trasferimento
+#  puo' essere delegato al server web: vedi members/downloads.py.
+# ---------------------------------------------------------------------------
+YEAR = 365 * 24 * 3600
+
+
+def _can_access_member(user, member):
+    return _is_office(user) or user.pk in (member.pk, member.guardian_id)
+
+
+@login_required
+def download_member_document(request, document_id):
+    document = get_object_or_404(MemberDocument.objects.select_related('member'), id=document_id)
+    if not _can_access_member(request.user, document.member):
+        raise PermissionDenied
+    return serve_file(
+        request, document.file.name, document.file.storage, as_attachment='download' in request.GET,
+        filename=document.filename, checksum=document.checksum,
+    )
+
+
+@login_required
+def member_photo(request, member_id):
+    """Foto originale, o una miniatura con ?size=96&format=webp (members/images.py)."""
+    member = get_object_or_404(Member, id=member_id)
+    if not _can_access_member(request.user, member):
+        raise PermissionDenied
+    size, fmt = request.GET.get('size'), request.GET.get('format', 'jpeg')
+    if size is None:
+        return serve_file(request, member.photo.name, member.photo.storage)
+    if not member.photo_checksum or fmt not in FORMATS or size not in map(str, THUMB_SIZES):
+        raise Http404("Miniatura non disponibile")
+    # l'URL del tag porta ?v=<checksum>: cambia con la foto, cache lunga
+    return serve_file(
+        request, variant_name(member.photo_checksum, size, fmt), default_storage,
+        checksum=f'{member.photo_checksum}-{size}-{fmt}',
+        max_age=YEAR if request.GET.get('v') == member.photo_checksum[:12] else None,
+    )
+
+
 @office_required
 def add_document_admin(request):
     if request.method == 'POST':
@@ -365,44 +316,41 @@ def add_document_admin(request):
 # ---------------------------------------------------------------------------
 @office_required
 def medical_certificate_status(request):
-    members = Member.objects.all().prefetch_related('documents')
+    """
+    Stato del certificato medico di ogni socio. L'ultimo certificato e' una
+    subquery annotata sul socio: ricerca, filtro di stato e paginazione
+    avvengono in SQL e si caricano solo i certificati della pagina.
+    """
     today = timezone.now().date()
-    search_query = request.GET.get('q', '').lower()
+    search_query = request.GET.get('q', '').strip()
     status_filter = request.GET.get('status', '')
 
-    members_status = []
-    for member in members:
-        if search_query:
-            haystack = " ".join([
-                member.first_name or "", member.last_name or "",
-                member.email or "", member.username or "",
-            ]).lower()
-            if search_query not in haystack:
-                continue
-
-        medical_docs = [d for d in member.documents.all()
-                        if d.document_type == 'MEDICAL_CERTIFICATE']
-        if medical_docs:
-            medical_docs_sorted = sorted(
-                medical_docs,
-                key=lambda d: d.expiration_date if d.expiration_date else date.min,
-                reverse=True,
-            )
-            doc = medical_docs_sorted[0]
-            if doc.expiration_date and doc.expiration_date < today:
-                status = "Scaduto"
-            else:
-                status = "Attivo"
-        else:
-            doc = None
-            status = "Assente"
+    members = Member.objects.with_latest_certificate().search(search_query)
+    if status_filter:
+        members = members.with_certificate_status(status_filter, today)
 
-        if status_filter and status != status_filter:
-            continue
+    page = keyset_paginate(
+        members, ['last_name', 'first_name', 'id'], cursor=request.GET.get('after'),
+    )
+    documents = MemberDocument.objects.in_bulk(
+        [m.latest_certificate_id for m in page if m.latest_certificate_id]
+    )
 
+    members_status = []
+    for member in page:
+        doc = documents.get(member.latest_certificate_id)
+        if doc is None:
+            status = "Assente"
+        elif doc.expiration_date and doc.expiration_date < today:
+            status = "Scaduto"
+        else:
+            status = "Attivo"
         members_status.append({'member': member, 'document': doc, 'cert_status': status})
 
-    return render(request, 'medical_certificate_status.html', {'members_status': members_status})
+    return render(request, 'medical_certificate_status.html', {
+        'members_status': members_status,
+        'page': page,
+    })
 
 
 # ---------------------------------------------------------------------------
@@ -411,7 +359,11 @@ def medical_certificate_status(request):
 @office_required
 def subscription_list(request, member_id):
     member = get_object_or_404(Member, id=member_id)
-    subscriptions = member.subscriptions.all().order_by('-end_date')
+    subscriptions = (
+        member.subscriptions.select_related('sector')
+        .with_payment_state()
+        .order_by('-end_date')
+    )
     return render(request, 'subscription_list.html',
                   {'member': member, 'subscriptions': subscriptions})
 
@@ -420,11 +372,9 @@ def subscription_list(request, member_id):
 def add_subscription(request, member_id):
     member = get_object_or_404(Member, id=member_id)
     if request.method == 'POST':
-        form = SubscriptionForm(request.POST)
+        form = SubscriptionForm(request.POST, instance=Subscription(member=member))
         if form.is_valid():
-            subscription = form.save(commit=False)
-            subscription.member = member
-            subscription.save()
+            form.save()
             return redirect('members:subscription_list', member_id=member.id)
     else:
         form = SubscriptionForm()
@@ -433,48 +383,41 @@ def add_subscription(request, member_id):
 
 @office_required
 def subscription_status(request):
-    today = timezone.now().date()
-    search_query = request.GET.get('q', '').lower()
+    """
+    Tutti gli abbonamenti, piu' recenti per primi. Ricerca e filtro di stato
+    sono condizioni SQL; la paginazione e' a cursore su (end_date, id).
+    """
+    search_query = request.GET.get('q', '').strip()
     status_filter = request.GET.get('status', '')
 
-    subscriptions_status = []
-    subscriptions = Subscription.objects.select_related('member').all()
-    for sub in subscriptions:
-        member = sub.member
-        if search_query:
-            haystack = " ".join([
-                member.first_name or "", member.last_name or "",
-                member.email or "", member.username or "",
-            ]).lower()
-            if search_query not in haystack:
-                continue
-
-        if sub.start_date and sub.start_date > today:
-            status = "Non ancora attivo"
-        elif sub.end_date and sub.end_date < today:
-            status = "Scaduto"
-        else:
-            status = "Attivo"
-
-        if status_filter and status != status_filter:
-            continue
-
-        subscriptions_status.append({'subscription': sub, 'member': member, 'status': status})
+    subscriptions = Subscription.objects.select_related('member', 'sector').search(search_query)
+    if status_filter:
+        subscriptions = subscriptions.with_status(status_filter)
 
-    return render(request, 'subscription_status.html',
-                  {'subscriptions_status': subscriptions_status})
+    page = keyset_paginate(
+        subscriptions, ['-end_date', '-id'], cursor=request.GET.get('after'),
+    )
+    subscriptions_status = [
+        {'subscription': sub, 'member': sub.member, 'status': sub.status}
+        for sub in page
+    ]
+
+    return render(request, 'subscription_status.html', {
+        'subscriptions_status': subscriptions_status,
+        'page': page,
+        'xlsx_available': xlsx_available(),
+    })
 
 
 @office_required
 def add_subscription_admin(request):
     if request.method == "POST":
-        form = SubscriptionForm(request.POST)
         selected_member_id = request.POST.get("member")
-        if form.is_valid() and selected_member_id:
-            member = get_object_or_404(Member, id=selected_member_id)
-            subscription = form.save(commit=False)
-            subscription.member = member
-            subscription.save()
+        member = get_object_or_404(Member, id=selected_member_id) if selected_member_id else None
+        # con il socio gia' sull'istanza il form controlla le sovrapposizioni
+        form = SubscriptionForm(request.POST, instance=Subscription(member=member))
+        if form.is_valid() and member:
+            form.save()
             django_messages.success(request, f"Abbonamento aggiunto con successo per {member}.")
             return redirect("dashboard")
     else:
@@ -487,50 +430,43 @@ def add_subscription_admin(request):
 # ---------------------------------------------------------------------------
 #  ENDPOINT JSON PER I GRAFICI  (solo segreteria)
 # ---------------------------------------------------------------------------
+def _chart_etag(name):
+    def etag(request):
+        start, end = parse_range(request.GET)
+        return series_etag(request, name, start, end, request.GET.get('bucket'))
+    return etag
+
+
+def _chart_response(request, name):
+    start, end = parse_range(request.GET)
+    series = chart_series(name, start, end, request.GET.get('bucket'))
+    return JsonResponse(series)
+
+
 @office_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_chart_etag('subscriptions'), last_modified_func=series_last_modified)
 def subscription_data(request):
-    start_date = request.GET.get('start_date')
-    end_date = request.GET.get('end_date')
-
-    subs = Subscription.objects.all()
-    if start_date:
-        subs = subs.filter(start_date__gte=parse_date(start_date))
-    if end_date:
-        subs = subs.filter(start_date__lte=parse_date(end_date))
-
-    subscription_stats = (
-        subs
-        .annotate(date=TruncDay('start_date'))
-        .values('date')
-        .annotate(count=Count('id'))
-        .order_by('date')
-    )
-    labels = [s['date'].strftime('%b %Y') for s in subscription_stats if s['date']]
-    data = [s['count'] for s in subscription_stats if s['date']]
-    return JsonResponse({'labels': labels, 'data': data})
+    return _chart_response(request, 'subscriptions')
 
 
 @office_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_chart_etag('subscriptions_by_sector'), last_modified_func=series_last_modified)
 def subscriptions_by_category(request):
-    start_date = request.GET.get('start_date')
-    end_date = request.GET.get('end_date')
-
-    qs = Subscription.objects.all()
-    if start_date and 'to' in start_date:
-        parts = start_date.split('to')
-        start_date = parts[0].strip()
-        end_date = parts[1].strip() if len(parts) > 1 else None
-
-    if start_date:
-        qs = qs.filter(start_date__gte=parse_date(start_date))
-    if end_date:
-        qs = qs.filter(start_date__lte=parse_date(end_date))
-
-    stats = (
-        qs.values('sector__name')
-        .annotate(count=Count('id'))
-        .order_by('sector__name')
-    )
-    labels = [item['sector__name'] or '—' for item in stats]
-    data = [item['count'] for item in stats]
-    return JsonResponse({'labels': labels, 'data': data})
+    return _chart_response(request, 'subscriptions_by_sector')
+
+
+def _any_chart_etag(request, series):
+    start, end = parse_range(request.GET)
+    return series_etag(request, series, start, end, request.GET.get('bucket'))
+
+
+@office_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_any_chart_etag, last_modified_func=series_last_modified)
+def chart_data(request, series):
+    """Qualsiasi serie di members/charts.py (incassi, scadenze, ...)."""
+    if series not in SERIES:
+        raise Http404("Serie sconosciuta")
+    return _chart_response(request, series)
@@ -7,8 +7,10 @@ from django.contrib import messages
 from functools import wraps
 from django.contrib.auth.decorators import login_required
 from django.core.exceptions import PermissionDenied
+from django.db.models import ProtectedError, RestrictedError
 
 from .models import Sector, Instructor
+from .config_cache import config_snapshot
 from .forms import SectorForm, InstructorForm, Package, PackageForm
 
 
@@ -29,11 +31,12 @@ def office_required(view_func):
 # ---------------------------------------------------------------------------
 @office_required
 def config_home(request):
+    snapshot = config_snapshot()  # conteggi dalla cache di configurazione
     context = {
         'active_nav': 'config',
-        'sector_count': Sector.objects.count(),
-        'instructor_count': Instructor.objects.count(),
-        'package_count': Package.objects.count(),   # <-- AGGIUNTO
+        'sector_count': len(snapshot['sectors']),
+        'instructor_count': len(snapshot['instructors']),
+        'package_count': len(snapshot['packages']),
     }
     return render(request, 'config/config_home.html', context)
 
@@ -88,8 +91,8 @@ def sector_delete(request, pk):
         try:
             sector.delete()
             messages.success(request, f"Settore «{name}» eliminato.")
-        except Exception:
-            messages.error(request, f"Impossibile eliminare «{name}»: è usato da soci o abbonamenti.")
+        except (ProtectedError, RestrictedError):
+            messages.error(request, f"Impossibile eliminare «{name}»: è usato da abbonamenti o pacchetti.")
         return redirect('members:sector_list')
     return render(request, 'config/confirm_delete.html', {
         'object': sector, 'object_type': 'settore',
@@ -0,0 +1,51 @@
+# members/views_exports.py
+# Esportazioni CSV / XLSX in streaming. Protetto da office_required.
+#   /members/export/pagamenti/?format=csv&status=overdue&q=rossi
+# Accetta gli stessi parametri GET della lista a video corrispondente.
+
+import tempfile
+from functools import wraps
+
+from django.contrib.auth.decorators import login_required
+from django.core.exceptions import PermissionDenied
+from django.http import FileResponse, Http404, StreamingHttpResponse
+from django.utils import timezone
+
+from .exports import DATASETS, FORMATS, iter_csv, write_xlsx, xlsx_available
+
+
+def office_required(view_func):
+    @wraps(view_func)
+    @login_required
+    def _wrapped(request, *args, **kwargs):
+        u = request.user
+        if u.is_staff or u.is_superuser or getattr(u, "is_office", False):
+            return view_func(request, *args, **kwargs)
+        raise PermissionDenied
+    return _wrapped
+
+
+@office_required
+def export_dataset(request, dataset):
+    export = DATASETS.get(dataset)
+    fmt = request.GET.get('format', 'csv')
+    if export is None or fmt not in FORMATS:
+        raise Http404("Esportazione non disponibile")
+    today = timezone.now().date()
+    filename = f"{export.name}_{today:%Y%m%d}.{fmt}"
+
+    if fmt == 'xlsx':
+        if not xlsx_available():
+            raise Http404("Esportazione XLSX non disponibile (manca openpyxl)")
+        # Lo zip dell'XLSX si chiude solo alla fine: si scrive su file
+        # temporaneo (memoria costante) e lo si invia a blocchi.
+        tmp = tempfile.TemporaryFile()
+        write_xlsx(export, request.GET, tmp, today)
+        tmp.seek(0)
+        return FileResponse(tmp, as_attachment=True, filename=filename)
+
+    response = StreamingHttpResponse(
+        iter_csv(export, request.GET, today), content_type='text/csv; charset=utf-8',
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -7,11 +7,12 @@ from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.core.exceptions import PermissionDenied
 
+from .exports import xlsx_available
 from .models import Member, Payment, Subscription
 from .forms import PaymentForm
+from .pagination import keyset_paginate
 from datetime import timedelta
 from django.utils import timezone
-from django.db.models import Q#, Sum
 
 def office_required(view_func):
     @wraps(view_func)
@@ -32,15 +33,14 @@ def payment_list(request, member_id):
     member = get_object_or_404(Member, id=member_id)
     payments = member.payments.all().order_by('-due_date', '-payment_date')
 
-    # Totali utili in testa alla pagina
-    total_paid = sum((p.net_amount for p in payments if p.is_paid), 0)
-    total_due = sum((p.net_amount for p in payments if not p.is_paid), 0)
+    # Totali utili in testa alla pagina (una query di aggregazione)
+    totals = payments.totals()
 
     return render(request, 'payments/payment_list.html', {
         'member': member,
         'payments': payments,
-        'total_paid': total_paid,
-        'total_due': total_due,
+        'total_paid': totals['paid'],
+        'total_due': totals['unpaid'],
     })
 
 
@@ -107,36 +107,30 @@ def payment_all(request):
     status = request.GET.get('status', '')      # paid / unpaid / overdue
     q = request.GET.get('q', '').strip()
 
-    payments = Payment.objects.select_related('member', 'subscription').all()
-
-    if q:
-        payments = payments.filter(
-            Q(member__first_name__icontains=q) |
-            Q(member__last_name__icontains=q) |
-            Q(member__card_number__icontains=q)
-        )
-
-    if status == 'paid':
-        payments = payments.filter(is_paid=True)
-    elif status == 'unpaid':
-        payments = payments.filter(is_paid=False)
-    elif status == 'overdue':
-        payments = payments.filter(is_paid=False, due_date__lt=today)
+    payments = (
+        Payment.objects.select_related('member')
+        .search(q)
+        .with_state(status, today)
+    )
 
-    payments = payments.order_by('-due_date', '-payment_date')
+    # Totali (sull'intero filtro corrente), calcolati dal database
+    totals = payments.totals()
 
-    # Totali (sull'intero filtro corrente)
-    tot_paid = sum((p.net_amount for p in payments if p.is_paid), 0)
-    tot_unpaid = sum((p.net_amount for p in payments if not p.is_paid), 0)
+    # Pagina a cursore: la pagina N costa come la prima
+    page = keyset_paginate(
+        payments, ['-due_date', '-payment_date', '-id'], cursor=request.GET.get('after'),
+    )
 
     return render(request, 'payments/payment_all.html', {
-        'payments': payments,
-        'tot_paid': tot_paid,
-        'tot_unpaid': tot_unpaid,
+        'payments': page,
+        'page': page,
+        'tot_paid': totals['paid'],
+        'tot_unpaid': totals['unpaid'],
         'status': status,
         'q': q,
         'active_nav': 'payments',
         'today': today,
+        'xlsx_available': xlsx_available(),
     })
 
 
@@ -158,7 +152,7 @@ def payment_due(request):
     # Abbonamenti in scadenza entro N giorni
     subs_in_scadenza = Subscription.objects.select_related('member', 'package').filter(
         end_date__gte=today, end_date__lte=limite
-    ).order_by('end_date')
+    ).with_payment_state().order_by('end_date')
 
     return render(request, 'payments/payment_due.html', {
         'insoluti': insoluti,
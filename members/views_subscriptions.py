@@ -12,6 +12,11 @@ from .forms import SubscriptionWithPaymentForm
 from .forms import SubscriptionWithPaymentAndMemberForm
 
 from .forms import SubscriptionForm
+from .charts import parse_range
+from .config_cache import sector_choices
+from .renewals import plan_renewals, renew, renewal_candidates
+from datetime import timedelta
+from django.utils import timezone
 
 def office_required(view_func):
     @wraps(view_func)
@@ -34,7 +39,7 @@ def add_subscription_with_payment(request, member_id):
     member = get_object_or_404(Member, id=member_id)
 
     if request.method == 'POST':
-        form = SubscriptionWithPaymentForm(request.POST)
+        form = SubscriptionWithPaymentForm(request.POST, member=member)
         if form.is_valid():
             cd = form.cleaned_data
             package = cd['package']
@@ -66,7 +71,7 @@ def add_subscription_with_payment(request, member_id):
             )
             return redirect('members:subscription_list', member_id=member.id)
     else:
-        form = SubscriptionWithPaymentForm()
+        form = SubscriptionWithPaymentForm(member=member)
 
     return render(request, 'subscriptions/subscription_with_payment_form.html', {
         'form': form, 'member': member,
@@ -140,3 +145,39 @@ def subscription_edit(request, pk):
     return render(request, 'subscriptions/subscription_edit_form.html', {
         'form': form, 'member': member, 'subscription': subscription,
     })
+
+
+# ---------------------------------------------------------------------------
+#  RINNOVO IN BLOCCO  (anteprima + conferma, vedi members/renewals.py)
+# ---------------------------------------------------------------------------
+@office_required
+def subscription_renewals(request):
+    """
+    Abbonamenti che scadono nell'intervallo scelto (default: prossimi 30
+    giorni, come in payment_due), con il periodo rinnovato in anteprima.
+    La conferma crea abbonamenti e pagamenti selezionati in un colpo solo.
+    """
+    if request.method == 'POST':
+        ids = [pk for pk in request.POST.getlist('renew') if pk.isdigit()]
+        created = renew(ids)
+        messages.success(request, f"Rinnovati {len(created)} abbonamenti (pagamenti da saldare).")
+        return redirect(request.get_full_path())
+
+    today = timezone.now().date()
+    start, end = parse_range(request.GET)
+    start = start or today
+    end = end or start + timedelta(days=30)
+    sector = request.GET.get('sector', '')
+    sector = int(sector) if sector.isdigit() else None
+
+    renewals = plan_renewals(renewal_candidates(start, end, sector))
+    return render(request, 'subscriptions/subscription_renewals.html', {
+        'renewals': renewals,
+        'renewable': sum(1 for r in renewals if r.ok),
+        'start': start,
+        'end': end,
+        'sector': sector,
+        'sectors': sector_choices(active_only=False),
+        'active_nav': 'subscriptions',
+    })
+
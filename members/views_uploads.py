@@ -0,0 +1,89 @@
+# members/views_uploads.py
+# Caricamento a blocchi dei documenti (protocollo in members/uploads.py).
+# Risposte JSON; lo stato e' anche negli header Upload-Offset / Upload-Length.
+# Usato da static/js/chunked-upload.js nella pagina "Aggiungi documento".
+
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponse, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.views.decorators.http import require_http_methods, require_POST
+
+from .forms import DocumentUploadForm
+from .models import DocumentUpload
+from .uploads import UploadRejected, append_chunk, discard, finish
+
+
+def office_required(view_func):
+    @wraps(view_func)
+    @login_required
+    def _wrapped(request, *args, **kwargs):
+        u = request.user
+        if u.is_staff or u.is_superuser or getattr(u, "is_office", False):
+            return view_func(request, *args, **kwargs)
+        raise PermissionDenied
+    return _wrapped
+
+
+def _state(upload, status=200):
+    data = {
+        'id': str(upload.pk),
+        'url': reverse('members:upload_chunk', args=[upload.pk]),
+        'offset': upload.received,
+        'size': upload.size,
+        'content_type': upload.content_type,
+        'chunk_size': getattr(settings, 'SGS_UPLOAD_CHUNK_SIZE', 5 * 1024 * 1024),
+        'document': upload.document_id,
+    }
+    if upload.is_complete:
+        data['redirect'] = reverse('members:edit_member', args=[upload.member_id])
+    response = JsonResponse(data, status=status)
+    response['Upload-Offset'] = upload.received
+    response['Upload-Length'] = upload.size
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
+@office_required
+@require_POST
+def upload_start(request):
+    form = DocumentUploadForm(request.POST)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    upload = form.save(commit=False)
+    upload.created_by = request.user
+    upload.save()
+    return _state(upload, status=201)
+
+
+@office_required
+@require_http_methods(['GET', 'HEAD', 'PATCH', 'DELETE'])
+def upload_chunk(request, upload_id):
+    upload = get_object_or_404(DocumentUpload, pk=upload_id)
+    if request.method == 'DELETE':
+        discard(upload)
+        return HttpResponse(status=204)
+    if request.method in ('GET', 'HEAD'):
+        return _state(upload)
+
+    try:
+        offset = int(request.headers.get('Upload-Offset', ''))
+    except ValueError:
+        return JsonResponse({'error': "Header Upload-Offset mancante."}, status=400)
+    try:
+        # il corpo si legge dallo stream a blocchi, mai tutto in memoria
+        append_chunk(upload, request, offset, checksum=request.headers.get('Upload-Checksum'))
+    except UploadRejected as e:
+        if e.fatal:
+            discard(upload)
+        response = JsonResponse({'error': str(e), 'offset': upload.received}, status=e.status)
+        response['Upload-Offset'] = upload.received
+        return response
+    if upload.received == upload.size:
+        finish(upload)
+        return _state(upload, status=201)
+    return _state(upload)
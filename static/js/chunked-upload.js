@@ -0,0 +1,102 @@
+// static/js/chunked-upload.js
+// Caricamento a blocchi dei documenti (members/uploads.py).
+// Il file parte a pezzi (PATCH con Upload-Offset); se la connessione cade
+// basta premere di nuovo "Salva": si riprende dai byte gia' ricevuti,
+// anche dopo aver ricaricato la pagina (l'indirizzo resta in localStorage).
+// Senza fetch/Blob il form viene inviato normalmente.
+document.addEventListener("DOMContentLoaded", function () {
+    const form = document.querySelector("form[data-chunked-upload]");
+    if (!form || !window.fetch || !window.Blob) return;
+    const input = form.querySelector("input[type=file]");
+    const csrf = form.querySelector("[name=csrfmiddlewaretoken]").value;
+    const button = form.querySelector("button[type=submit]");
+
+    const box = document.createElement("div");
+    box.className = "hbs-field";
+    box.hidden = true;
+    const progress = document.createElement("progress");
+    progress.max = 1;
+    progress.value = 0;
+    progress.style.width = "100%";
+    const message = document.createElement("div");
+    box.append(progress, message);
+    button.parentNode.before(box);
+
+    function storageKey(file, member) {
+        return ["sgs-upload", member, file.name, file.size, file.lastModified].join(":");
+    }
+
+    function describe(error) {
+        if (error && error.error) return error.error;
+        if (error && error.errors) return Object.values(error.errors).flat().join(" ");
+        return "Connessione interrotta: premi di nuovo Salva per riprendere.";
+    }
+
+    async function resume(url) {
+        const response = await fetch(url, { headers: { "Accept": "application/json" } });
+        return response.ok ? response.json() : null;
+    }
+
+    async function start(file, member) {
+        const data = new FormData(form);
+        data.delete(input.name);
+        data.set("member", member);
+        data.set("filename", file.name);
+        data.set("size", file.size);
+        const response = await fetch(form.dataset.chunkedUpload, {
+            method: "POST", body: data, headers: { "X-CSRFToken": csrf },
+        });
+        const state = await response.json();
+        if (!response.ok) throw state;
+        return state;
+    }
+
+    form.addEventListener("submit", async function (event) {
+        const file = input.files[0];
+        const member = form.dataset.member || (form.querySelector("[name=member]") || {}).value;
+        if (!file || !member) return;  // il form classico mostra gli errori
+        event.preventDefault();
+        const key = storageKey(file, member);
+        button.disabled = true;
+        box.hidden = false;
+        message.className = "";
+        message.textContent = "Caricamento in corso…";
+        try {
+            const saved = localStorage.getItem(key);
+            let state = saved ? await resume(saved) : null;
+            if (!state) {
+                state = await start(file, member);
+                localStorage.setItem(key, state.url);
+            }
+            while (!state.document) {
+                progress.value = state.offset / state.size;
+                const response = await fetch(state.url, {
+                    method: "PATCH",
+                    body: file.slice(state.offset, state.offset + state.chunk_size),
+                    headers: {
+                        "X-CSRFToken": csrf,
+                        "Upload-Offset": state.offset,
+                        "Content-Type": "application/offset+octet-stream",
+                    },
+                });
+                const body = await response.json();
+                if (response.status === 409 && body.offset !== undefined) {
+                    state.offset = body.offset;  // il server ha gia' questi byte
+                    continue;
+                }
+                if (!response.ok) {
+                    if (response.status !== 400) localStorage.removeItem(key);
+                    throw body;
+                }
+                state = body;
+            }
+            progress.value = 1;
+            localStorage.removeItem(key);
+            window.location = state.redirect;
+        } catch (error) {
+            message.className = "hbs-alert hbs-alert--danger";
+            message.textContent = describe(error);
+            button.disabled = false;
+        }
+    });
+});